@@ -0,0 +1,356 @@
+#! /bin/env python
+"""Offline benchmark of profile extraction of every source.
+
+Pages are replayed from saved fixtures (benchmarks/fixtures) through the page archive, as with extractor.py --replay,
+so the network layer is never used. For every source and html parser it reports pages per second, time of every
+declarative field (FieldSpec) and peak memory allocated while extracting one page. Results can be saved as a baseline,
+later runs are compared with it and fail if a source got slower or allocates more.
+
+Run from the root of the project, as configs.ini is read from the current directory:
+
+    python -m benchmarks.run [--sources icobench trackico] [--parsers lexbor lxml] [--save-baseline]
+    python benchmarks/run.py [...]
+
+The baseline is saved in benchmarks/baseline.json, it is specific to the machine and is not a part of the project.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import tempfile
+import sys
+import time
+import tracemalloc
+
+# root of the project, so the benchmark runs as a script (python benchmarks/run.py) as well as a module
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from scrapers.base_scraper import ScraperBase
+from scrapers.bitcointalk import activity_of
+from scrapers.data_keys import DataKeys
+from scrapers.icobazaar import IcoBazaar
+from scrapers.icobench import IcoBench
+from scrapers.icodrops import IcoDrops
+from scrapers.icomarks import IcoMarks
+from scrapers.icorating import IcoRating
+from scrapers.reddit import Reddit
+from scrapers.telegram import subscribers_of
+from scrapers.tokentops import TokenTops
+from scrapers.trackico import TrackIco
+from utilities.logging import configure_logging
+from utilities.page_archive import PageArchive
+from utilities.utils import Configs
+from utilities.utils import load_page_as_text
+from utilities.utils import set_replay_archive
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+fixtures_path = os.path.join(dir_path, 'fixtures')
+baseline_file = os.path.join(dir_path, 'baseline.json')
+
+PARSERS = ('lexbor', 'lxml', 'html.parser', 'html5lib')
+
+
+class Case:
+    """Extraction path of one source.
+
+    `pages` maps urls to fixture files which are put to the replayed archive. `load()` reads the inputs of the runs
+    from the archive and is not timed, `run(input)` extracts one profile. Cases which do not parse html (`parsers` is
+    False) are run once instead of once per parser.
+    """
+
+    parsers = True
+
+    def __init__(self, source, pages):
+        self.source = source
+        self.pages = pages
+
+    def load(self):
+        return [None]
+
+    def prepare(self, loaded):
+        # fresh input of a run, e.g. raw pages are emptied by parsing
+        return loaded
+
+    def run(self, input_):
+        raise NotImplementedError
+
+    def time_fields(self, input_, timings):
+        pass
+
+
+class ProfileCase(Case):
+    """parse_profile of scrapers which separate loading and parsing, the page is loaded before timing."""
+
+    def __init__(self, scraper_class, pages, urls=None):
+        super(ProfileCase, self).__init__(scraper_class.__name__.lower(), pages)
+        self.scraper_class = scraper_class
+        self.urls = urls or list(pages)[:1]
+
+    def load(self):
+        # scrapers are created after the parser of the source is set, parse_regions is read in __init__
+        self.scraper = self.scraper_class()
+        self.scraper.use_proxies = False
+        return [(url, self.scraper.fetch_profile(url)) for url in self.urls]
+
+    def prepare(self, loaded):
+        url, page = loaded
+        return url, page.copy() if hasattr(page, 'copy') else page
+
+    def run(self, input_):
+        return self.scraper.parse_profile(*input_)
+
+    def time_fields(self, input_, timings):
+        fields = getattr(self.scraper, 'fields', None)
+        if fields is not None:
+            url, page = input_
+            fields.extract(self.scraper.make_soup(page), DataKeys.initialize(), url, timings=timings)
+
+
+class ScrapeCase(Case):
+    """scrape_profile of scrapers which load their pages themselves, reading pages from the archive is timed too."""
+
+    def __init__(self, scraper_class, pages):
+        super(ScrapeCase, self).__init__(scraper_class.__name__.lower(), pages)
+        self.scraper_class = scraper_class
+        self.url = list(pages)[0]
+
+    def load(self):
+        self.scraper = self.scraper_class()
+        return [None]
+
+    def run(self, input_):
+        return self.scraper.scrape_profile(self.url)
+
+
+class TextCase(Case):
+    """Sources which extract data from page text with regular expressions."""
+
+    parsers = False
+
+    def __init__(self, source, pages, extract):
+        super(TextCase, self).__init__(source, pages)
+        self.extract = extract
+
+    def load(self):
+        return [load_page_as_text(url) for url in self.pages if self.pages[url].endswith('.html')]
+
+    def run(self, input_):
+        return self.extract(input_)
+
+
+class RedditCase(Case):
+    """Posts, comments and users of a subreddit, then karma of the users, as Reddit.exctract_reddit does."""
+
+    def __init__(self, pages):
+        super(RedditCase, self).__init__('reddit', pages)
+        self.url = list(pages)[0]
+
+    def run(self, input_):
+        _, _, users = Reddit.scrape_listings(self.url)
+        return [Reddit.scrap_user_karma(user) for user in users]
+
+
+def fixture_cases():
+    logo = 'logo.png'
+    return [
+        ProfileCase(IcoBench, {'https://icobench.com/ico/benchcoin': 'icobench.html'}),
+        ProfileCase(TrackIco, {'https://www.trackico.io/ico/benchcoin/': 'trackico.html'}),
+        ProfileCase(IcoDrops, {'https://icodrops.com/benchcoin/': 'icodrops.html'}),
+        ProfileCase(TokenTops, {'https://tokentops.com/ico/benchcoin/': 'tokentops.html'}),
+        ProfileCase(IcoMarks, {'https://icomarks.com/ico/benchcoin': 'icomarks.html'}),
+        ScrapeCase(IcoRating, {'https://icorating.com/ico/benchcoin-bnc': 'icorating.html',
+                               'https://icorating.com/ico/benchcoin-bnc/details': 'icorating_details.html',
+                               'https://icorating.com/upload/logo/benchcoin.png': logo}),
+        ScrapeCase(IcoBazaar, {'https://icobazaar.com/v2/benchcoin': 'icobazaar.html',
+                               'https://icobazaar.com/v2/benchcoin/community': 'icobazaar_community.html',
+                               'https://icobazaar.com/storage/logos/benchcoin.png': logo}),
+        TextCase('telegram', {'https://t.me/benchcoin': 'telegram.html'}, subscribers_of),
+        TextCase('bitcointalk', {'https://bitcointalk.org/index.php?topic=123456.0': 'bitcointalk.html'},
+                 activity_of),
+        RedditCase({'https://www.reddit.com/r/benchcoin': 'reddit.html',
+                    'https://www.reddit.com/user/bench_user': 'reddit_user_1.html',
+                    'https://www.reddit.com/user/satoshi_fan': 'reddit_user_2.html',
+                    'https://www.reddit.com/user/hodler2018': 'reddit_user_3.html'}),
+    ]
+
+
+def archive_cases(archive):
+    # profile pages of a real run, only scrapers which separate loading and parsing can be replayed page by page
+    cases = []
+    for scraper_class in IcoBench, TrackIco, IcoDrops, TokenTops, IcoMarks:
+        urls = archive.profiles(scraper_class.__name__)
+        if urls:
+            cases.append(ProfileCase(scraper_class, {}, urls))
+    return cases
+
+
+def archive_fixtures(cases, path):
+    archive = PageArchive(path)
+    for case in cases:
+        for url, name in case.pages.items():
+            with open(os.path.join(fixtures_path, name), 'rb') as f:
+                content_type = 'image/png' if name.endswith('.png') else 'text/html; charset=utf-8'
+                archive.record(url, content_type, f.read())
+    archive.close()
+
+
+def measure(case, repeat):
+    loaded = case.load()
+    # warm up, selectors are compiled and caches are filled on the first run
+    for item in loaded:
+        case.run(case.prepare(item))
+
+    elapsed = 0
+    for _ in range(repeat):
+        for item in loaded:
+            input_ = case.prepare(item)
+            started = time.perf_counter()
+            case.run(input_)
+            elapsed += time.perf_counter() - started
+    pages = repeat * len(loaded)
+
+    timings = {}
+    for _ in range(repeat):
+        for item in loaded:
+            case.time_fields(case.prepare(item), timings)
+
+    # peak of memory allocated while extracting one page, tracing is restarted to measure every page alone
+    peak = 0
+    for item in loaded:
+        input_ = case.prepare(item)
+        tracemalloc.start()
+        case.run(input_)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return {'pages_per_sec': pages / elapsed,
+            'ms_per_page': elapsed / pages * 1000,
+            'peak_kib': peak / 1024,
+            'fields': {name: spent / pages * 1000 for name, spent in timings.items()}}
+
+
+def set_parser(source, parser):
+    # 'parser' option of the source overrides the parser chosen by scrapers, see [sources] in configs.ini
+    options = Configs.config['sources'].setdefault(source, {})
+    if parser is None:
+        options.pop('parser', None)
+    else:
+        options['parser'] = parser
+
+
+def compare(key, result, baseline, tolerance):
+    # returns descriptions of regressions against the baseline result
+    if baseline is None:
+        return []
+
+    regressions = []
+    if result['pages_per_sec'] < baseline['pages_per_sec'] * (1 - tolerance):
+        regressions.append('{}: {:.1f} pages/sec, baseline {:.1f}'.format(key, result['pages_per_sec'],
+                                                                         baseline['pages_per_sec']))
+    if result['peak_kib'] > baseline['peak_kib'] * (1 + tolerance):
+        regressions.append('{}: {:.0f} KiB peak, baseline {:.0f}'.format(key, result['peak_kib'],
+                                                                        baseline['peak_kib']))
+    for name, spent in result['fields'].items():
+        expected = baseline['fields'].get(name)
+        # fast fields jitter by more than the tolerance, only changes over 0.05 ms are reported
+        if expected is not None and spent > expected * (1 + tolerance) and spent - expected > 0.05:
+            regressions.append('{}: field {} takes {:.3f} ms, baseline {:.3f}'.format(key, name, spent, expected))
+    return regressions
+
+
+def report(key, result, baseline):
+    change = ''
+    if baseline is not None:
+        change = '{:+.1f}%'.format((result['pages_per_sec'] / baseline['pages_per_sec'] - 1) * 100)
+    print('{:<28} {:>10.1f} {:>10.3f} {:>10.0f} {:>10}'.format(key, result['pages_per_sec'], result['ms_per_page'],
+                                                              result['peak_kib'], change))
+    for name, spent in sorted(result['fields'].items(), key=lambda item: -item[1]):
+        print('    {:<40} {:>10.3f} ms'.format(name, spent))
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, baseline, results):
+    # only measured entries are replaced, so baseline of one source can be updated alone
+    baseline.update(results)
+    baseline['_machine'] = {'python': platform.python_version(), 'platform': platform.platform(),
+                            'processor': platform.processor(), 'saved': time.strftime('%Y-%m-%d %H:%M:%S')}
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def parse_command_line():
+    parser = argparse.ArgumentParser(description='Offline benchmark of profile extraction')
+    parser.add_argument('--sources', nargs='+', metavar='SOURCE', help='sources to run, all by default')
+    parser.add_argument('--parsers', nargs='+', default=PARSERS, choices=PARSERS, help='html parsers to compare')
+    parser.add_argument('--repeat', type=int, default=20, help='runs of every page')
+    parser.add_argument('--full-pages', action='store_true', help='parse whole pages instead of scraper regions')
+    parser.add_argument('--archive', metavar='ARCHIVE',
+                        help='replay profile pages of a real run (data/archive/<run>) instead of the fixtures')
+    parser.add_argument('--baseline', default=baseline_file, help='baseline file, benchmarks/baseline.json by default')
+    parser.add_argument('--save-baseline', action='store_true', help='save results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='allowed slowdown or growth of memory against the baseline, 0.15 by default')
+    parser.add_argument('--verbose', action='store_true', help='show logs of the scrapers')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_command_line()
+    if not Configs.parsed:
+        Configs.parse_config_file()
+
+    configure_logging('stream')
+    # missing fields and failed logo downloads are logged by scrapers on every run
+    logging.getLogger().setLevel(logging.DEBUG if args.verbose else logging.CRITICAL)
+
+    tmp_path = tempfile.mkdtemp(prefix='benchmark')
+    # logos of scrapers which download them in scrape_profile
+    ScraperBase.logo_tmp_path = os.path.join(tmp_path, 'logos')
+    try:
+        if args.archive:
+            cases = archive_cases(set_replay_archive(args.archive))
+        else:
+            cases = fixture_cases()
+            archive_fixtures(cases, os.path.join(tmp_path, 'archive'))
+            set_replay_archive(os.path.join(tmp_path, 'archive'))
+
+        if args.sources:
+            cases = [case for case in cases if case.source in [source.lower() for source in args.sources]]
+
+        baseline = load_baseline(args.baseline)
+        results = {}
+        regressions = []
+        print('{:<28} {:>10} {:>10} {:>10} {:>10}'.format('source/parser', 'pages/sec', 'ms/page', 'peak KiB',
+                                                         'baseline'))
+        for case in cases:
+            Configs.config['sources'].setdefault(case.source, {})['parse_regions'] = not args.full_pages
+            for parser in args.parsers if case.parsers else [None]:
+                set_parser(case.source, parser)
+                key = '{}/{}'.format(case.source, parser or 'regex')
+                results[key] = measure(case, args.repeat)
+                report(key, results[key], baseline.get(key))
+                regressions += compare(key, results[key], baseline.get(key), args.tolerance)
+    finally:
+        set_replay_archive(None)
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, baseline, results)
+        print('Baseline is saved to {}'.format(args.baseline))
+        return 0
+
+    for regression in regressions:
+        print('REGRESSION ' + regression)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -3,9 +3,11 @@ import argparse
 import os
 import time
 import sys
+import threading
 import traceback
 import logging
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 from utilities.logging import configure_logging
 from utilities.utils import Configs
@@ -13,7 +15,16 @@ from utilities.utils import write_to_csv
 from utilities.utils import write_to_excel
 from utilities.utils import clean_db_records
 from utilities.utils import write_data_to_db
+from utilities.utils import browser_pool
+from utilities.utils import concurrency_controller
+from utilities.utils import http_client
+from utilities.utils import memory_usage
+from utilities.utils import parse_pool
+from utilities.utils import proxy_pool
+from utilities.utils import retry_policy
+from utilities.utils import set_replay_archive
 from utilities.utils import MySQL
+from utilities.proxy_generator import validate_paid_proxies
 
 from scrapers.icodrops import ScraperBase
 from scrapers.icorating import IcoRating
@@ -37,6 +48,17 @@ sys.path.append(os.path.join(dir_path, "scrapers"))
 sys.path.append(os.path.join(dir_path, "utilities"))
 
 
+def parse_command_line():
+    parser = argparse.ArgumentParser(description='ICO profiles scraper')
+    parser.add_argument('--replay', metavar='ARCHIVE',
+                        help='scrape profiles from pages archive (data/archive/<run>) without network, '
+                             'results are written to csv files only')
+    parser.add_argument('--check-parsers', metavar='ARCHIVE',
+                        help='parse archived profile pages (data/archive/<run>) with every html parser and report '
+                             'fields which differ from html5lib')
+    return parser.parse_args()
+
+
 def parse_arguments():
     host = Configs.get('host')
     port = Configs.get('port')
@@ -107,24 +129,114 @@ def telegram_runner(profiles):
     logging.info('Totally {} telegram profiles has been extracted in {} sec'.format(len(profiles), time.time() - t))
 
 
+def scraper_runner(scraper, threads, all_profiles, lock):
+    # scrapes one source, its failure does not stop other sources
+    tm = time.time()
+    folder = ScraperBase.csv_data_path + os.sep + scraper.__name__
+    os.makedirs(folder, exist_ok=True)
+
+    try:
+        extractor = scraper(threads)
+        __data = extractor.scrape_website()
+        with lock:
+            all_profiles += __data
+
+        # csv of the source is written as soon as it is done, not after all sources
+        write_to_csv(folder + os.sep + time.strftime("%Y_%b_%d-%H%M%S") + '.csv', __data)
+        logging.info('{} profiles of {} has been extracted in {} sec'.format(len(__data), scraper.__name__,
+                                                                              time.time() - tm))
+    except:
+        logging.error('{} scraper failed: \n {}'.format(scraper.__name__, traceback.format_exc()))
+
+
+def wait_for_memory(futures):
+    # next source waits while running ones use more than 'memory_budget', at least one source is always running
+    budget = Configs.get('memory_budget')
+    if not budget or memory_usage() is None:
+        return
+
+    waiting = False
+    while memory_usage() > budget and not all(future.done() for future in futures):
+        if not waiting:
+            logging.info('{} MB of memory is used, waiting for running scrapers'.format(int(memory_usage())))
+            waiting = True
+        time.sleep(1)
+
+
 def scrapers_runner(all_profiles, scrapers):
+    # sources are different sites, so they are scraped at once, up to 'parallel_sources' of them
     t = time.time()
-    for scraper in scrapers:
+    parallel = min(Configs.get('parallel_sources'), len(scrapers)) or 1
+    threads = max(1, min(Configs.get('max_threads'), Configs.get('total_threads') // parallel))
+    if Configs.get('memory_budget') and memory_usage() is None:
+        logging.warning('psutil is not installed, memory_budget is ignored')
+
+    lock = threading.Lock()
+    slots = threading.BoundedSemaphore(parallel)
+    futures = []
+    with ThreadPoolExecutor(parallel) as executor:
+        for scraper in scrapers:
+            slots.acquire()
+            wait_for_memory(futures)
+            future = executor.submit(scraper_runner, scraper, threads, all_profiles, lock)
+            future.add_done_callback(lambda _: slots.release())
+            futures.append(future)
+
+    logging.info('Totally {} profiles has been extracted in {} sec'.format(len(all_profiles), time.time() - t))
+
 
+def replay_runner(archive_path, scrapers):
+    t = time.time()
+    archive = set_replay_archive(archive_path)
+    total = 0
+    for scraper in scrapers:
         extractor = scraper(Configs.get('max_threads'))
+        # async engine loads pages by itself, archive is replayed only through page loaders
+        extractor.fetch_engine = 'thread'
+        pages = archive.profiles(extractor.whoami())
+        if not pages:
+            logging.info('No archived profiles for {}'.format(extractor.whoami()))
+            continue
+
         folder = ScraperBase.csv_data_path + os.sep + extractor.whoami()
-        if not os.path.exists(folder):
-            os.makedirs(folder)
+        os.makedirs(folder, exist_ok=True)
 
         try:
-            __data = extractor.scrape_website()
-            all_profiles += __data
-
-            write_to_csv(folder + os.sep + time.strftime("%Y_%b_%d-%H%M%S") + '.csv', __data)
+            tm = time.time()
+            __data = [data for data in extractor.scrape_profiles(pages) if data is not None]
+            logging.info('{} profiles of {} replayed in {} sec'.format(len(__data), extractor.whoami(), time.time() - tm))
+            total += len(__data)
+            if __data:
+                write_to_csv(folder + os.sep + 'replay-' + time.strftime("%Y_%b_%d-%H%M%S") + '.csv', __data)
         except:
-            logging.error('{} scraper failed: \n {}'.format(extractor.whoami(), traceback.format_exc()))
+            logging.error('{} replay failed: \n {}'.format(extractor.whoami(), traceback.format_exc()))
 
-    logging.info('Totally {} profiles has been extracted in {} sec'.format(len(all_profiles), time.time() - t))
+    logging.info('Totally {} profiles has been replayed in {} sec'.format(total, time.time() - t))
+
+
+def parsers_check_runner(archive_path, scrapers):
+    archive = set_replay_archive(archive_path)
+    for scraper in scrapers:
+        extractor = scraper(Configs.get('max_threads'))
+        if not extractor.splits_profile_parsing():
+            logging.info('{} does not separate loading and parsing of profiles, skipped'.format(extractor.whoami()))
+            continue
+
+        checked = mismatches = 0
+        for url in archive.profiles(extractor.whoami()):
+            try:
+                content = extractor.fetch_profile(url)
+            except Exception as e:
+                logging.warning('Could not load archived page {}: {}'.format(url, str(e)))
+                continue
+
+            checked += 1
+            for parser, keys in extractor.check_parsers(url, content).items():
+                if keys:
+                    mismatches += 1
+                    logging.warning('{}: {} parser gives different {}'.format(url, parser, ', '.join(keys)))
+
+        logging.info('{}: {} pages checked, {} mismatches'.format(extractor.whoami(), checked, mismatches))
 
 
 def reddit_runner(profiles):
@@ -184,20 +296,41 @@ def run_db_writer(profiles, host, port, user, password, db):
 
 
 def main():
+    args = parse_command_line()
+
     # setup logging
     log_dir = os.path.join(dir_path, Configs.get('logging_directory'))
     os.makedirs(log_dir, exist_ok=True)
     configure_logging(Configs.get('logging_handler'), log_dir)
 
+    scrapers = [IcoDrops, IcoBench, IcoMarks, IcoRating, TokenTops, TrackIco]
+    if args.replay:
+        try:
+            replay_runner(args.replay, scrapers)
+        finally:
+            parse_pool().shutdown()
+        return
+
+    if args.check_parsers:
+        parsers_check_runner(args.check_parsers, scrapers)
+        return
+
     host, port, user, password, db = parse_arguments()
 
+    if Configs.get('validate_proxies'):
+        validate_paid_proxies(timeout=Configs.get('proxy_check_timeout'))
+
     # remove old tmp icons
     shutil.rmtree(ScraperBase.logo_tmp_path, ignore_errors=True)
 
     # scrap ico websites
     all_profiles = []
-    scrapers = [IcoDrops, IcoBench, IcoMarks, IcoRating, TokenTops, TrackIco]
-    scrapers_runner(all_profiles, scrapers)
+    try:
+        scrapers_runner(all_profiles, scrapers)
+    finally:
+        # browsers and parse processes are needed only for scraping of sources, not for the later phases
+        browser_pool().close()
+        parse_pool().shutdown()
 
     # process initial data
     processed_data = processor_runner(all_profiles)
@@ -218,6 +351,11 @@ def main():
     make_backup_into_csv(processed_data)
     run_db_writer(processed_data, host, port, user, password, db)
 
+    http_client().proxies.log_stats()
+    proxy_pool().log_stats()
+    logging.info('Adaptive concurrency per domain: {}'.format(concurrency_controller().stats()))
+    retry_policy().log_stats()
+
 
 if __name__ == "__main__":
     sys.exit(main())
@@ -1,15 +1,233 @@
 import logging
+import math
+import queue
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 from multiprocessing import Lock
 from multiprocessing.pool import ThreadPool
 
+import bs4
 import tqdm
 import os
+from urllib.parse import urljoin
 
 from scrapers.data_keys import DataKeys
 from scrapers.data_keys import BOOL_VALUES
 from scrapers.dataprocessor import process_time_period_status
 from scrapers.dataprocessor import process_date_type
+from utilities.async_fetcher import AsyncFetcher
+from utilities.raw_page import RawPage
 from utilities.utils import Configs
+from utilities.utils import configure_source
+from utilities.utils import http_client
+from utilities.utils import make_soup
+from utilities.utils import load_image
+from utilities.utils import load_page_raw
+from utilities.utils import load_page_via_proxies_raw
+from utilities.utils import page_archive
+from utilities.utils import parse_pool
+from utilities.utils import proxy_pool
+
+
+# scrapers of parse pool processes, one of each class per process
+worker_scrapers = {}
+
+
+def parse_profile_in_worker(scraper_class, url, content):
+    scraper = worker_scrapers.get(scraper_class)
+    if scraper is None:
+        scraper = worker_scrapers[scraper_class] = scraper_class()
+    return scraper.parse_profile(url, content)
+
+
+class Paginator:
+    """Pages of a listing loaded concurrently, iterating it gives listing urls as pages arrive.
+
+    page_url(n) is the url of page n, load(url) returns listing urls of the page, an empty list on a page after the
+    last one and None if the page could not be loaded. The number of pages is taken from `pages` or `total` listings
+    by `per_page`, otherwise it is found by probing pages 1, 2, 4, 8, ... and searching between the last page with
+    listings and the first without them. Pages are then loaded in `threads` threads and iteration stops on the first
+    page without new listings.
+    """
+
+    def __init__(self, page_url, load, threads=1, pages=None, total=None, per_page=None, first=1, max_pages=500,
+                 loaded=None):
+        self.page_url = page_url
+        self.load = load
+        self.threads = max(1, threads)
+        self.first = first
+        # last page to load, listings with more pages are cut
+        self.last = first + max_pages - 1
+
+        if pages is None and total is not None and per_page:
+            pages = int(math.ceil(total / per_page))
+        self.pages = pages
+
+        # page number -> listing urls of pages which are already loaded, e.g. the first page with the count of pages
+        self.loaded = dict(loaded or {})
+
+    def load_page(self, number):
+        if number in self.loaded:
+            return self.loaded.pop(number)
+
+        url = self.page_url(number)
+        try:
+            return self.load(url)
+        except Exception as e:
+            logging.error('Could not load listings page {}: {}'.format(url, str(e)))
+            return None
+
+    def load_pages(self, numbers, pool):
+        # pages which could not be loaded are tried once more, None is left for pages failed twice
+        pages = dict(zip(numbers, pool.map(self.load_page, numbers)))
+        failed = [number for number in numbers if pages[number] is None]
+        if failed:
+            pages.update(zip(failed, pool.map(self.load_page, failed)))
+        return [pages[number] for number in numbers]
+
+    def probe(self, numbers, pool, first_urls):
+        # True for pages with listings; sites may answer pages after the last one with the first page
+        found = []
+        for number, urls in zip(numbers, self.load_pages(numbers, pool)):
+            if urls is None:
+                # a failed page is not the end of the listing, the search goes past it and iteration stops on the
+                # first empty page anyway
+                logging.warning('Could not probe listings page {}, counted as a page with listings'.format(
+                    self.page_url(number)))
+                found.append(True)
+                continue
+
+            if urls:
+                self.loaded[number] = urls
+            found.append(bool(urls) and not set(urls) <= first_urls)
+        return found
+
+    def search(self, probes, pool, first_urls, low, high):
+        # probes pages in batches of 'threads', returns the last probed page with listings and the first without them
+        for start in range(0, len(probes), self.threads):
+            batch = probes[start:start + self.threads]
+            for number, found in zip(batch, self.probe(batch, pool, first_urls)):
+                if not found:
+                    return low, number
+                low = number
+        return low, high
+
+    def count_pages(self, pool):
+        # returns number of the last page, the probed pages are kept in 'loaded' and are not loaded again
+        if self.pages is not None:
+            return min(self.first + self.pages - 1, self.last)
+
+        first_urls = self.loaded.get(self.first)
+        if first_urls is None:
+            first_urls = self.load_pages([self.first], pool)[0]
+        if not first_urls:
+            return self.first - 1
+        self.loaded[self.first] = first_urls
+        first_urls = set(first_urls)
+
+        probes = []
+        step = 1
+        while self.first + step <= self.last:
+            probes.append(self.first + step)
+            step *= 2
+        low, high = self.search(probes, pool, first_urls, self.first, self.last + 1)
+
+        # the last page is between low (has listings) and high (has not), with more threads the range is split into
+        # more parts on every step
+        while high - low > 1:
+            step = max(1, (high - low) // (self.threads + 1))
+            low, high = self.search(list(range(low + step, high, step))[:self.threads], pool, first_urls, low, high)
+        return low
+
+    def __iter__(self):
+        pool = ThreadPool(self.threads)
+        try:
+            last = self.count_pages(pool)
+            numbers = range(self.first, last + 1)
+            seen = set()
+            for number, urls in tqdm.tqdm(zip(numbers, pool.imap(self.load_page, numbers)), total=len(numbers)):
+                if urls is None:
+                    continue
+
+                new = [url for url in urls if url not in seen]
+                if not new:
+                    # the listing is shorter than it was counted, e.g. listings were removed meanwhile
+                    break
+                seen.update(new)
+                yield from new
+        finally:
+            # pages after the last one may be still loading
+            pool.terminate()
+            pool.join()
+
+
+class ListingStream:
+    """Profile urls of all listings of a scraper given while the listings are scraped.
+
+    Listings of every url of the scraper are scraped in their own thread and found urls are put to a queue, iterating
+    the stream gives them without duplicates as soon as they are found, so profiles are loaded meanwhile. Iteration
+    ends when all listings are scraped or after `limit` urls (-1 for all of them).
+    """
+
+    def __init__(self, scraper, limit=-1):
+        self.scraper = scraper
+        self.limit = limit
+        # number of urls given so far, total of the progress bar of profiles
+        self.found = 0
+        self.progress = None
+
+        self.__queue = queue.Queue()
+        self.__stop = threading.Event()
+
+    def __scrape(self, url, done):
+        try:
+            for listing in self.scraper.scrape_listings(url) or []:
+                if self.__stop.is_set():
+                    break
+                self.__queue.put(listing)
+        except Exception:
+            logging.error('Could not scrape listings from {}: \n {}'.format(url, traceback.format_exc()))
+        finally:
+            self.__queue.put(done)
+
+    def __iter__(self):
+        done = object()
+        for url in self.scraper.urls:
+            logging.debug('Scraping data from {}'.format(url))
+            threading.Thread(target=self.__scrape, args=(url, done), daemon=True).start()
+
+        archive = page_archive()
+        running = len(self.scraper.urls)
+        seen = set()
+        try:
+            while running and self.found != self.limit:
+                listing = self.__queue.get()
+                if listing is done:
+                    running -= 1
+                    continue
+                if listing in seen:
+                    continue
+
+                seen.add(listing)
+                if archive is not None:
+                    archive.record_profiles(self.scraper.whoami(), [listing])
+                self.found += 1
+                if self.progress is not None:
+                    self.progress.total = self.found
+                    self.progress.refresh()
+                yield listing
+        finally:
+            # listings left after the limit are not scraped
+            self.__stop.set()
+
+
+def progress_bar(pages, iterable=None):
+    # total of a listing stream grows while its listings are found
+    if isinstance(pages, ListingStream):
+        pages.progress = tqdm.tqdm(iterable, total=pages.found)
+        return pages.progress
+    return tqdm.tqdm(iterable, total=len(pages))
 
 
 # Abstract class
@@ -21,6 +239,13 @@ class ScraperBase:
     scale_A = 0
     scale_B = 10
 
+    # parse_profile puts logo url under this key, the logo is downloaded after parsing
+    LOGO_URL = 'logo_url'
+    # logos of sites behind Cloudflare are loaded with load_image(anti_bot=True)
+    anti_bot_logos = False
+    # css selectors of the parts of profile pages which parse_profile reads, only they are parsed, see PageRegions
+    regions = None
+
     def whoami(self):
         return str(type(self).__name__)
 
@@ -44,23 +269,212 @@ class ScraperBase:
         assert (self.max_threads < 60)
         assert (self.max_threads >= self.max_browsers)
 
+        # should be 'thread' or 'async', see [sources] section in configs.ini
+        self.fetch_engine = Configs.get_source(self.whoami(), 'engine', 'thread')
+        # should be 'thread' or 'process', pool which parses pages loaded by fetch engine
+        self.parse_pool = Configs.get_source(self.whoami(), 'parse_pool', Configs.get('parse_pool'))
+
+        # load pages through proxies from the shared proxy pool
+        self.use_proxies = False
+        self.sticky_proxy = Configs.get_source(self.whoami(), 'sticky_proxy', False)
+
+        self.__html_parser = 'lxml'
+        self.parse_regions = Configs.get_source(self.whoami(), 'parse_regions', Configs.get('parse_regions'))
+
         self.domain = ''
 
+    @property
+    def html_parser(self):
+        # 'parser' option of the source in configs.ini overrides the parser chosen by the scraper
+        return Configs.get_source(self.whoami(), 'parser', self.__html_parser)
+
+    @html_parser.setter
+    def html_parser(self, parser):
+        self.__html_parser = parser
+
     def scrape_listings(self, url):
         raise NotImplementedError('scrap_listings not implemented yet')
 
+    def paginate(self, page_url, load, **kwargs):
+        # listing urls of all pages of a listing, see Paginator
+        return Paginator(page_url, load, self.max_threads, **kwargs)
+
+    def next_proxy(self):
+        # proxy for the next request, None to load pages directly
+        if not self.use_proxies:
+            return None
+
+        # sticky proxy is kept by the thread until it fails, for sites which bind sessions to ip
+        session = (self.whoami(), threading.get_ident()) if self.sticky_proxy else None
+        return proxy_pool().get(session)
+
+    def make_soup(self, content, parser=None):
+        # content may be already parsed page, e.g. in check_parsers
+        if isinstance(content, bs4.BeautifulSoup):
+            return content
+        return make_soup(content, parser or self.html_parser, self.regions if self.parse_regions else None)
+
+    def fetch_profile(self, url):
+        # pages are returned as RawPage, they are decoded by the parser
+        proxy = self.next_proxy()
+        if proxy is None:
+            return load_page_raw(url)
+        # failed attempts are retried through the next proxies
+        return load_page_via_proxies_raw(url, proxy, self.next_proxy)
+
+    # scrapers may implement parse_profile instead of scrape_profile, then loading and parsing of the profile page
+    # are separated and the scraper can be run with 'async' engine
+    def parse_profile(self, url, content):
+        raise NotImplementedError('parse_profile not implemented yet')
+
     def scrape_profile(self, url):
-        raise NotImplementedError('scrap_profile not implemented yet')
+        if not self.splits_profile_parsing():
+            raise NotImplementedError('scrap_profile not implemented yet')
+
+        try:
+            content = self.fetch_profile(url)
+        except Exception as e:
+            self.logger.error('Could not scrape profile {}: {}'.format(url, str(e)))
+            return
+
+        return self.process_profile(url, content)
+
+    def process_profile(self, url, content):
+        data = self.parse_profile(url, content)
+        if data is not None:
+            self.download_logo(data)
+        return data
+
+    def download_logo(self, data):
+        logo_url = data.pop(self.LOGO_URL, None)
+        if not logo_url:
+            return
+
+        try:
+            # logo url may be relative to the site or data: uri, urljoin keeps the latter as is
+            data[DataKeys.LOGO_PATH] = load_image(urljoin(self.domain, logo_url), ScraperBase.logo_tmp_path,
+                                                  anti_bot=self.anti_bot_logos)
+        except Exception as e:
+            self.logger.error('could not download {} logo with: {}'.format(data[DataKeys.PROFILE_URL], str(e)))
+
+    def splits_profile_parsing(self):
+        return type(self).parse_profile is not ScraperBase.parse_profile
+
+    def check_parsers(self, url, content, parsers=('html5lib', 'lxml', 'lexbor')):
+        # parses the page with every parser, returns {parser: keys with values different from the first parser};
+        # html5lib always parses whole page, so with it first this also checks the regions of the scraper
+        # parsing takes the bytes out of raw page, so every parser gets its own copy of it
+        copy = (lambda: content.copy()) if isinstance(content, RawPage) else (lambda: content)
+        records = {parser: self.parse_profile(url, self.make_soup(copy(), parser)) for parser in parsers}
+        expected = records[parsers[0]] or {}
+        return {parser: sorted(key for key in set(expected) | set(record or {})
+                               if expected.get(key) != (record or {}).get(key))
+                for parser, record in records.items() if parser != parsers[0]}
 
     def scrape_profiles(self, pages):
+        configure_source(self.whoami(), self.domain)
+
+        # listing stream records urls by itself while they are found
+        archive = page_archive()
+        if archive is not None and not isinstance(pages, ListingStream):
+            archive.record_profiles(self.whoami(), pages)
+
+        if self.fetch_engine == 'async':
+            if not self.splits_profile_parsing():
+                logging.warning('{} does not support async engine, using threads'.format(self.whoami()))
+            elif not AsyncFetcher.available():
+                logging.warning('aiohttp is not installed, using threads for {}'.format(self.whoami()))
+            else:
+                return self.scrape_profiles_async(pages)
+
+        if self.splits_profile_parsing():
+            return self.scrape_profiles_pipeline(pages)
+
         logging.debug("Scraping profiles from {}".format(self.domain))
         pool = ThreadPool(self.max_threads)
-        profile_data = list(tqdm.tqdm(pool.imap(self.scrape_profile, pages), total=len(pages)))
+        profile_data = list(progress_bar(pages, pool.imap(self.scrape_profile, pages)))
         pool.close()
         pool.join()
         return profile_data
 
+    def submit_parse(self, url, content, executor):
+        # parse pool processes get the class of the scraper, so the scraper itself is not pickled
+        if self.parse_pool == 'process':
+            return parse_pool().submit(parse_profile_in_worker, type(self), url, content)
+        return executor.submit(self.parse_profile, url, content)
+
+    def finish_profile(self, url, future):
+        try:
+            data = future.result()
+        except Exception as e:
+            self.logger.error('Could not parse profile {}: {}'.format(url, str(e)))
+            return
+
+        if data is not None:
+            self.download_logo(data)
+        return data
+
+    def scrape_profiles_pipeline(self, pages):
+        # fetching threads only load pages and hand them to the parse pool, other threads wait for parsed profiles
+        # and download logos, so network threads do not wait for parsing
+        logging.debug("Scraping profiles from {}".format(self.domain))
+        executor = ThreadPoolExecutor(self.max_threads)
+        # loaded pages which are not parsed yet, fetching threads wait when there are 'parse_queue' of them
+        backlog = threading.BoundedSemaphore(Configs.get('parse_queue'))
+
+        def fetch(url):
+            backlog.acquire()
+            try:
+                # page loaders take the adaptive limit of the domain for every request
+                content = self.fetch_profile(url)
+                future = self.submit_parse(url, content, executor)
+            except Exception as e:
+                backlog.release()
+                self.logger.error('Could not scrape profile {}: {}'.format(url, str(e)))
+                return url, None
+
+            future.add_done_callback(lambda _: backlog.release())
+            return url, future
+
+        def finish(fetched):
+            url, future = fetched
+            return None if future is None else self.finish_profile(url, future)
+
+        fetch_pool = ThreadPool(self.max_threads)
+        finish_pool = ThreadPool(self.max_threads)
+        try:
+            return list(progress_bar(pages, finish_pool.imap(finish, fetch_pool.imap(fetch, pages))))
+        finally:
+            for pool in fetch_pool, finish_pool:
+                pool.close()
+                pool.join()
+            executor.shutdown()
+
+    def process_profile_in_pool(self, url, content):
+        # thread of async engine waits for the parse pool, the event loop keeps loading pages meanwhile
+        return self.finish_profile(url, self.submit_parse(url, content, None))
+
+    def scrape_profiles_async(self, pages):
+        logging.debug("Scraping profiles from {} with async engine".format(self.domain))
+        fetcher = AsyncFetcher(Configs.get('async_concurrency'),
+                               Configs.get_source(self.whoami(), 'domain_concurrency',
+                                                  Configs.get('domain_concurrency')),
+                               max_body_size=http_client().max_body_size)
+
+        # proxies of a stream are taken when its urls are found
+        requests = ((url, self.next_proxy()) for url in pages)
+        handle = self.process_profile_in_pool if self.parse_pool == 'process' else self.process_profile
+        with ThreadPoolExecutor(self.max_threads) as executor, progress_bar(pages) as progress:
+            return fetcher.run(requests, handle, executor, self.next_proxy, progress)
+
     def scrape_website(self):
+        configure_source(self.whoami(), self.domain)
+
+        if Configs.get('stream_listings'):
+            # profiles are scraped while listings are, instead of after all of them
+            return [data for data in self.scrape_profiles(ListingStream(self, Configs.get('max_items')))
+                    if data is not None]
+
         listings = []
         for url in self.urls:
             logging.debug('Scraping data from {}'.format(url))
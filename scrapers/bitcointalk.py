@@ -1,8 +1,6 @@
 import logging
 import random
 import re
-import time
-import traceback
 from multiprocessing.dummy import Lock
 from multiprocessing.pool import ThreadPool
 
@@ -10,23 +8,23 @@ import tqdm
 
 from scrapers.data_keys import BOOL_VALUES
 from scrapers.data_keys import DataKeys
-from utilities.proxy_generator import get_paied_proxies
+from utilities.utils import concurrency_controller
+from utilities.utils import configure_source
 from utilities.utils import load_page
 from utilities.utils import load_page_via_proxies_as_text
+from utilities.utils import proxy_pool
+from utilities.utils import source_parser
+from utilities.retry import RequestError
 
 __html_parser = 'html5lib'
 __max_threads = 10
 __mutex = Lock()
 __logger = logging
-__proxies = get_paied_proxies()
-__pr_len = len(__proxies)
-__proxy_id = 0
-__max_recursion = 30
 
 
 def __scrape_listings(url):
     try:
-        bs = load_page(url, __html_parser)
+        bs = load_page(url, source_parser('bitcointalk', __html_parser))
     except:
         __logger.warning('Could not load bitcointalk page')
         return
@@ -62,40 +60,36 @@ def __scrape_listings(url):
     return random.sample(urls_, len(urls_))
 
 
-def __scrape_profile(url, rec=0):
+def __scrape_profile(url):
+    def check_activity(page):
+        # bitcointalk returns pages without posts to bots
+        if not re.search('Activity:\s*\d+', page):
+            __logger.warning('Bot detection reject in {}'.format(url))
+            concurrency_controller().report_blocked(url)
+            raise RequestError('Bot detection reject in {}'.format(url))
+
     try:
-        global __proxy_id
         # bs = load_page_as_text(url)
-        ip = __proxies[__proxy_id % __pr_len]
-        with __mutex:
-            __proxy_id += 1
-        if __proxy_id > 1000000:
-            with __mutex:
-                __proxy_id = 0
-
-        bs = load_page_via_proxies_as_text(url, ip)
-        # bs = load_page_via_proxies_as_text(url, random.choice(__proxies))
-    except:
-        print(traceback.format_exc())
+        bs = load_page_via_proxies_as_text(url, proxy_pool().get(), proxy_pool().get, validate=check_activity)
+    except Exception as e:
+        __logger.error('Could not scrape {}: {}'.format(url, str(e)))
         return -1, -1
 
-    activities = re.findall('Activity:\s*\d+', bs)
-    if activities:
-        total_activity = sum(int(act.split(':')[1]) for act in activities)
-        total_comments = len(activities)
-    else:
-        __logger.critical('Bot detection reject in {}'.format(ip))
-        time.sleep(5)
-        rec += 1
-        if rec < __max_recursion:
-            return __scrape_profile(url, rec)
-        else:
-            return -1, -1
+    return activity_of(bs)
+
+
+def activity_of(page):
+    # (average activity of commenters, number of comments) of the topic page
+    activities = re.findall('Activity:\s*\d+', page)
+    total_activity = sum(int(act.split(':')[1]) for act in activities)
+    total_comments = len(activities)
 
     return total_activity // total_comments, total_comments
 
 
 def extract_bitcointalk(data):
+    configure_source('bitcointalk', 'https://bitcointalk.org')
+
     for d in data[:100]:
         if d[DataKeys.BITCOINTALK_URL] != BOOL_VALUES.NOT_AVAILABLE:
             __logger.info(
@@ -0,0 +1,158 @@
+import logging
+import re
+import time
+
+import soupsieve
+
+# errors of value getters which mean that the field is not in the page
+NOT_FOUND_ERRORS = (AttributeError, IndexError, KeyError, TypeError, ValueError)
+
+# 'tag' or 'tag.class' selectors are searched with bs4 filters, they are much faster than css matching of every tag
+SIMPLE_SELECTOR = re.compile(r'^([a-z][a-z0-9]*)(?:\.([\w-]+))?$')
+
+
+def text_of(tag):
+    return tag.text.strip()
+
+
+def assign(data, key, value):
+    # key may be a tuple of keys, then value is a tuple of values
+    if value is None:
+        return
+    if isinstance(key, tuple):
+        for key_, value_ in zip(key, value):
+            data[key_] = value_
+    else:
+        data[key] = value
+
+
+class Field:
+    """Value of the first element matching css `selector` inside the first `within` element (the whole page if None).
+
+    The value is `value(tag)` if given, else the `attr` attribute of the element or its stripped text, then it is
+    passed through `process`. `text` filters elements by their string as soup.find(name, text=text) does: exact
+    string, compiled regex or True. Fields which are not found are logged as `name` at `missing` level.
+    """
+
+    def __init__(self, key, selector, attr=None, value=None, process=None, text=None, within=None, name=None,
+                 missing=logging.WARNING):
+        self.key = key
+        self.selector = selector
+        self.attr = attr
+        self.value_of = value
+        self.process = process
+        self.text = text
+        self.within = within
+        self.name = name or str(key)
+        self.missing = missing
+
+        simple = SIMPLE_SELECTOR.match(selector)
+        if simple:
+            self.__filters = (simple.group(1), {'class': simple.group(2)} if simple.group(2) else {})
+            self.__pattern = None
+        else:
+            self.__filters = None
+            self.__pattern = soupsieve.compile(selector)
+
+    def matches(self, tag):
+        if self.text is None:
+            return True
+        string = tag.string
+        if self.text is True:
+            return string is not None
+        if hasattr(self.text, 'search'):
+            return string is not None and self.text.search(string) is not None
+        return string == self.text
+
+    def find(self, scope, limit=None):
+        if self.__filters:
+            name, attrs = self.__filters
+            return scope.find_all(name, attrs, string=self.text, limit=limit)
+
+        tags = []
+        for tag in self.__pattern.iselect(scope):
+            if self.matches(tag):
+                tags.append(tag)
+                if len(tags) == limit:
+                    break
+        return tags
+
+    def value(self, tag):
+        if self.value_of:
+            value = self.value_of(tag)
+        else:
+            value = tag[self.attr] if self.attr else tag.text.strip()
+        return self.process(value) if self.process else value
+
+    def extract(self, scope, data):
+        tags = self.find(scope, limit=1)
+        if not tags:
+            raise AttributeError(self.selector)
+        assign(data, self.key, self.value(tags[0]))
+
+
+class Labels(Field):
+    """Label/value rows, e.g. table headers with values in the next cells.
+
+    Every element matching `selector` is a label, its text (`label(tag)`, upper case text by default) is looked up in
+    `mapping` of labels to DataKeys keys and `value(tag)` of it is written to the key. Mapping values may also be
+    [key, process] lists, as a key itself may be a tuple of keys. As in plain loops over rows, the last row with the
+    same label wins.
+    """
+
+    def __init__(self, selector, mapping, value, label=None, text=None, within=None, name=None,
+                 missing=logging.DEBUG):
+        super(Labels, self).__init__(None, selector, value=value, text=text, within=within, name=name or selector,
+                                     missing=missing)
+        self.mapping = mapping
+        self.label = label or (lambda tag: tag.text.strip().upper())
+
+    def extract(self, scope, data):
+        tags = self.find(scope)
+        if not tags:
+            raise AttributeError(self.selector)
+
+        for tag in tags:
+            try:
+                target = self.mapping.get(self.label(tag))
+                if target is None:
+                    continue
+
+                key, process = target if isinstance(target, list) else (target, None)
+                value = self.value_of(tag)
+                assign(data, key, process(value) if process else value)
+            except NOT_FOUND_ERRORS:
+                continue
+
+
+class FieldSpec:
+    """Fields of a profile page compiled once per scraper class.
+
+    Selectors are compiled when the spec is created instead of on every profile. Fields are searched only inside
+    their `within` regions, each region is found once per page and shared by all of its fields.
+    """
+
+    def __init__(self, *fields):
+        self.fields = fields
+        self.__regions = {field.within: soupsieve.compile(field.within) for field in fields if field.within}
+
+    def extract(self, soup, data, url, logger=logging, timings=None):
+        # timings: if given, seconds spent on each field are added to it by field name, finding a region is counted
+        # to the first field in it
+        regions = {None: soup}
+        for field in self.fields:
+            started = time.perf_counter() if timings is not None else 0
+            try:
+                if field.within not in regions:
+                    regions[field.within] = self.__regions[field.within].select_one(soup)
+                scope = regions[field.within]
+                if scope is None:
+                    raise AttributeError(field.within)
+                field.extract(scope, data)
+            except NOT_FOUND_ERRORS:
+                logger.log(field.missing, 'From {}: could not find {}'.format(url, field.name))
+
+            if timings is not None:
+                timings[field.name] = timings.get(field.name, 0) + time.perf_counter() - started
+
+        return data
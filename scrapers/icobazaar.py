@@ -7,8 +7,8 @@ from scrapers.dataprocessor import convert_scale
 from scrapers.data_keys import DataKeys
 from scrapers.data_keys import BOOL_VALUES
 from scrapers.data_keys import SOURCES
+from utilities.utils import browser_pool
 from utilities.utils import load_page
-from utilities.utils import setup_browser
 from utilities.utils import load_image
 
 
@@ -27,7 +27,7 @@ class IcoBazaar(ScraperBase):
         self.__browser_name = 'firefox'
 
         # should be 'html5lib', 'lxml' or 'html.parser'
-        self.__html_parser = 'lxml'
+        self.html_parser = 'lxml'
 
         self.NOT_FOUND_MSG = "From {}: could not find {}"
 
@@ -37,21 +37,18 @@ class IcoBazaar(ScraperBase):
 
     def scrape_listings(self, url):
 
-        driver = setup_browser(self.__browser_name)
+        with browser_pool().browser(self.__browser_name) as driver:
+            driver.get(self.urls[0])
+            time.sleep(1)
+            # TODO: #need to refactor
+            driver.find_element_by_xpath(
+                '/html/body/div[1]/div[2]/div/main/section/div[1]/div[2]/ul/li[5]/label/div').click()
 
-        driver.get(self.urls[0])
-        time.sleep(1)
-        # TODO: #need to refactor
-        driver.find_element_by_xpath(
-            '/html/body/div[1]/div[2]/div/main/section/div[1]/div[2]/ul/li[5]/label/div').click()
+            elements = driver.find_elements_by_class_name("cell-link")
 
-        elements = driver.find_elements_by_class_name("cell-link")
-
-        urls = []
-        for element in elements:
-            urls.append(element.get_property('href'))
-
-        driver.quit()
+            urls = []
+            for element in elements:
+                urls.append(element.get_property('href'))
 
         return urls
 
@@ -61,7 +58,7 @@ class IcoBazaar(ScraperBase):
         data[DataKeys.SOURCE] = SOURCES.ICOBAZAAR
 
         try:
-            bs_ = load_page(url, self.__html_parser)
+            bs_ = load_page(url, self.html_parser)
         except:
             self.logger.error('Could not scrape profile {}'.format(url))
             return
@@ -89,7 +86,7 @@ class IcoBazaar(ScraperBase):
             data[DataKeys.OVERALL_SCORE] = bs_.find('div', {'class': 'ico-rating'})['rating']
         except:
             try:
-                bs_ = load_page(url, self.__html_parser)
+                bs_ = load_page(url, self.html_parser)
                 data[DataKeys.OVERALL_SCORE] = bs_.find('div', {'class': 'ico-rating'})['rating']
             except (AttributeError, KeyError):
                 self.logger.error(self.NOT_FOUND_MSG.format(url, 'Rating'))
@@ -122,7 +119,7 @@ class IcoBazaar(ScraperBase):
 
         # scrap data from "community" tab of particular listing
         try:
-            bs__ = load_page(url + '/community', self.__html_parser)
+            bs__ = load_page(url + '/community', self.html_parser)
         except AttributeError:
             self.logger.error('Could not scrape community of profile {}'.format(url))
             return
@@ -1,25 +1,62 @@
+import logging
 import re
-import sys
 import traceback
-from multiprocessing.pool import ThreadPool
 from urllib.request import URLError
 from urllib.request import urljoin
 
-import tqdm
-
 from scrapers.base_scraper import ScraperBase
 from scrapers.dataprocessor import convert_scale
 from scrapers.data_keys import BOOL_VALUES
 from scrapers.data_keys import DataKeys
 from scrapers.data_keys import ICO_STATUS
 from scrapers.data_keys import SOURCES
-from utilities.utils import load_page
+from scrapers.field_spec import Field
+from scrapers.field_spec import FieldSpec
+from scrapers.field_spec import Labels
+from scrapers.field_spec import text_of
 from utilities.utils import load_page_via_proxies
-from utilities.utils import load_image
-from utilities.proxy_generator import get_paied_proxies
 
 
 class IcoBench(ScraperBase):
+    SCORE_MAPPING = {'ICO PROFILE': DataKeys.ICO_PROFILE_SCORE,
+                     'VISION': DataKeys.VISION_SCORE,
+                     'TEAM': DataKeys.TEAM_SCORE,
+                     'PRODUCT': DataKeys.PRODUCT_SCORE}
+
+    FINANCIAL_INFO_KEYS = {'TOKEN': DataKeys.TOKEN_NAME,
+                           'PREICO PRICE': DataKeys.PRE_ICO_PRICE,
+                           'PRICE': DataKeys.ICO_PRICE,
+                           'PRICE IN ICO': DataKeys.ICO_PRICE,
+                           'PLATFORM': DataKeys.PLATFORM,
+                           'ACCEPTING': DataKeys.ACCEPTED_CURRENCIES,
+                           'SOFT CAP': DataKeys.SOFT_CAP,
+                           'HARD CAP': DataKeys.HARD_CAP,
+                           'COUNTRY': DataKeys.COUNTRY,
+                           'RESTRICTED AREAS': DataKeys.COUNTRIES_RESTRICTED}
+
+    SOC_MAPPING = {'FACEBOOK': DataKeys.FACEBOOK_URL, 'GITHUB': DataKeys.GITHUB_URL,
+                   'MEDIUM': DataKeys.MEDIUM_URL,
+                   'TELEGRAM': DataKeys.TELEGRAM_URL, 'REDDIT': DataKeys.REDDIT_URL,
+                   'BITCOINTALK': DataKeys.BITCOINTALK_URL,
+                   'WWW': DataKeys.WEBSITE, 'LINKEDIN': DataKeys.LINKEDIN_URL,
+                   'TWITTER': DataKeys.TWITTER_URL}
+
+    regions = ('div.ico_information', 'div.rating', 'div.financial_data', 'div.socials')
+
+    # profile fields, the date info and financial rows depend on each other so they are scraped in parse_profile
+    fields = FieldSpec(
+        Field(DataKeys.NAME, 'h1, h2, h3, h4, h5, h6', within='div.name', name='Name'),
+        Field(DataKeys.DESCRIPTION, 'div.name', value=lambda div: text_of(div.parent.find_next_sibling('p')),
+              name='Description'),
+        Labels('div', SCORE_MAPPING, within='div.rating div.distribution',
+               label=lambda div: div.find('label').text.strip().upper(),
+               value=lambda div: str(div.contents[0]).strip()),
+        Field(DataKeys.OVERALL_SCORE, 'div[itemprop=ratingValue]', attr='content', name='Experts score'),
+        Labels('a[title][href]', SOC_MAPPING, within='div.socials', value=lambda a: a['href'], name='Social links',
+               missing=logging.WARNING),
+        Field(ScraperBase.LOGO_URL, 'img', attr='src', within='div.image', name='Logo url'),
+    )
+
     def __init__(self, max_threads=1, max_browsers=0, ):
 
         super(IcoBench, self).__init__(max_threads, max_browsers)
@@ -30,9 +67,7 @@ class IcoBench(ScraperBase):
         # should be 'html5lib', 'lxml' or 'html.parser'
         self.html_parser = 'html5lib'
 
-        self.__proxies = get_paied_proxies()
-        self.__pr_len = len(self.__proxies)
-        self.__proxy_id = 0
+        self.use_proxies = True
 
         self.NOT_FOUND_MSG = "From {}: could not find {}"
 
@@ -40,78 +75,21 @@ class IcoBench(ScraperBase):
         self.urls = ['https://icobench.com/icos']
         self.domain = 'https://icobench.com'
 
+    def listings_of(self, bs):
+        return [urljoin(self.domain, tag['href']) for tag in bs.find_all('a', {'class': 'image'}, href=True)]
+
     def scrape_listings_from_page(self, url):
-        # next page url from 'Next 'pagination tag
         try:
-            ip = self.__proxies[self.__proxy_id % self.__pr_len]
-            with self.mutex:
-                self.__proxy_id += 1
-            if self.__proxy_id > 1000000:
-                with self.mutex:
-                    self.__proxy_id = 0
-            # bs = load_page(url.split('&')[0], self.html_parser)
-            bs = load_page_via_proxies(url.split('&')[0], self.html_parser, ip)
+            bs = load_page_via_proxies(url, self.html_parser, self.next_proxy(), self.next_proxy)
         except:
-            print(traceback.format_exc())
-            return
-
-        listings_tags = bs.find_all('a', {'class': 'image'}, href=True)
-        listings_urls = []
-        if listings_tags:
-            for listing_tag in listings_tags:
-                listings_urls.append(urljoin(self.domain, listing_tag['href']))
-
-        return listings_urls
-
-    def scrape_listings_via_queries(self, urls):
-        pool = ThreadPool(self.max_threads)
-        print('Scraping listings')
-        listings_urls = list(tqdm.tqdm(pool.imap(self.scrape_listings_from_page, urls), total=len(urls)))
-        flat_list = [item for sublist in listings_urls for item in sublist]
-
-        pool.close()
-        pool.join()
-        return flat_list
-
-    def scrape_listings_via_pagin_next(self, url, page_num=None):
-        # next page url from 'Next 'pagination tag
-        try:
-            bs = load_page(url.split('&')[0], self.html_parser)
-        except URLError:
-            self.logger.error('Timeout error while scraping listings from %s', url)
+            self.logger.error(traceback.format_exc())
             return
 
-        paging = bs.find('a', {'class': 'next'}, href=True)
-        next_page_url = None if not paging else urljoin(self.domain, paging['href'])
-
-        listing_urls = []
-        listings = bs.find_all('a', {'class': 'image'}, href=True)
-        if listings:
-            for profile in listings:
-                listing_urls.append(urljoin(self.domain, profile['href']))
-
-        # if next page is previous page (pagination ended) break recursion
-        if next_page_url or next_page_url == url:
-            page_num = 1 if page_num is None else page_num + 1
-            sys.stdout.write('\r[Scraping listing urls: {}]'.format(page_num))
-            sys.stdout.flush()
-            if page_num < 2:
-                listing_urls += self.scrape_listings_via_pagin_next(next_page_url, page_num)
-        sys.stdout.write('\r')
-
-        return listing_urls
+        return self.listings_of(bs)
 
     def scrape_listings(self, url):
-        # next page url from 'Next 'pagination tag
         try:
-            ip = self.__proxies[self.__proxy_id % self.__pr_len]
-            with self.mutex:
-                self.__proxy_id += 1
-            if self.__proxy_id > 1000000:
-                with self.mutex:
-                    self.__proxy_id = 0
-            bs = load_page_via_proxies(url.split('&')[0], self.html_parser, ip)
-            # bs = load_page(url.split('&')[0], self.html_parser)
+            bs = load_page_via_proxies(url.split('&')[0], self.html_parser, self.next_proxy(), self.next_proxy)
         except URLError:
             self.logger.critical('Timeout error while scraping listings from %s', url)
             return
@@ -119,83 +97,26 @@ class IcoBench(ScraperBase):
             self.logger.error(traceback.format_exc())
             return
 
+        # number of the last page is before 'Next' pagination tag, otherwise the pages are probed
         paging = bs.find('a', {'class': 'next'}, href=True)
-        max_url_id = None
+        pages = None
         try:
-            max_url_id = int(paging.find_previous_sibling().text)
+            pages = int(paging.find_previous_sibling().text)
         except:
             pass
 
-        if max_url_id:
-            # uncomment for single page debug
-            # return self.scrape_listings_via_pagin_next(url)
-
-            url_query = self.urls[0] + '?page='
-
-            # from [1-max_url_id) to [1-max_url_id]
-            max_url_id += 1
-
-            pages_urls = []
-            for num in range(1, max_url_id):
-                pages_urls.append(url_query + str(num))
-            return self.scrape_listings_via_queries(pages_urls)
-        else:
-            return self.scrape_listings_via_pagin_next(url)
+        url_query = self.urls[0] + '?page={}'
+        return self.paginate(url_query.format, self.scrape_listings_from_page, pages=pages,
+                             loaded={1: self.listings_of(bs)})
 
-    def scrape_profile(self, url):
+    def parse_profile(self, url, content):
         data = DataKeys.initialize()
         data[DataKeys.PROFILE_URL] = url
         data[DataKeys.SOURCE] = SOURCES.ICOBENCH
-        try:
-            ip = self.__proxies[self.__proxy_id % self.__pr_len]
-            with self.mutex:
-                self.__proxy_id += 1
-            if self.__proxy_id > 1000000:
-                with self.mutex:
-                    self.__proxy_id = 0
-            bs = load_page_via_proxies(url, self.html_parser, ip)
-            # bs = load_page(url, self.html_parser)
-        except:
-            print(traceback.format_exc())
-            self.logger.error('Error while scraping profile {}'.format(url))
-            return
-
-        try:
-            description_tag = bs.find('div', {'class': 'name'})
-            name_and_description = description_tag.findChildren(re.compile('h\d'))
-            data[DataKeys.NAME] = name_and_description[0].text.strip()
-            # data[DataKeys.DESCRIPTION] = name_and_description[1].text.strip()
-        except:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'Name and/or Description'))
-
-        try:
-            data[DataKeys.DESCRIPTION] = bs.find('div', {'class': 'name'}).parent.find_next_sibling('p').text.strip()
-        except:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'Name and/or Description'))
 
-        ######################### Score Fileds #########################
-        score_divs = bs.find('div', {'class': 'rating'}).find('div', {'class': 'distribution'}).findAll('div')
+        bs = self.make_soup(content)
 
-        # todo decide what to do in case of DATA_KEYS
-        data_mapping = {'ICO PROFILE': DataKeys.ICO_PROFILE_SCORE,
-                        'VISION': DataKeys.VISION_SCORE,
-                        'TEAM': DataKeys.TEAM_SCORE,
-                        'PRODUCT': DataKeys.PRODUCT_SCORE}
-
-        for div in score_divs:
-            label = str(div.find('label').text).strip()
-            key = data_mapping.get(label.upper())
-            try:
-                data[key] = str(div.contents[0]).strip()
-            except AttributeError:
-                data[key] = BOOL_VALUES.NOT_AVAILABLE
-
-        rate_div = bs.find('div', {'itemprop': 'ratingValue'})
-        if rate_div:
-            data[DataKeys.OVERALL_SCORE] = str(rate_div['content'])
-        else:
-            self.NOT_FOUND_MSG.format(url, 'Experts score')
-        ###############################################################
+        self.fields.extract(bs, data, url, self.logger)
 
         financial_divs = bs.find('div', {'class': 'financial_data'})
         if financial_divs:
@@ -235,17 +156,6 @@ class IcoBench(ScraperBase):
             #################### Overall information #####################
             financial_divs_ = financial_divs.findAll('div', {'class': 'data_row'})
             if financial_divs_:
-                financial_info_keys = {'TOKEN': DataKeys.TOKEN_NAME,
-                                       'PREICO PRICE': DataKeys.PRE_ICO_PRICE,
-                                       'PRICE': DataKeys.ICO_PRICE,
-                                       'PRICE IN ICO': DataKeys.ICO_PRICE,
-                                       'PLATFORM': DataKeys.PLATFORM,
-                                       'ACCEPTING': DataKeys.ACCEPTED_CURRENCIES,
-                                       'SOFT CAP': DataKeys.SOFT_CAP,
-                                       'HARD CAP': DataKeys.HARD_CAP,
-                                       'COUNTRY': DataKeys.COUNTRY,
-                                       'RESTRICTED AREAS': DataKeys.COUNTRIES_RESTRICTED}
-
                 for financial_div in financial_divs_:
                     try:
                         info_ = financial_div.findAll('div')
@@ -272,10 +182,10 @@ class IcoBench(ScraperBase):
                             data[DataKeys.WHITELIST] = BOOL_VALUES.YES if 'WHITELIST' in text else BOOL_VALUES.NO
                             continue
 
-                        if key in financial_info_keys:
+                        if key in self.FINANCIAL_INFO_KEYS:
                             text = info_[1].text.strip()
                             if text:
-                                data[financial_info_keys[key]] = text
+                                data[self.FINANCIAL_INFO_KEYS[key]] = text
                     except:
                         pass
 
@@ -288,33 +198,6 @@ class IcoBench(ScraperBase):
         else:
             self.logger.warning(self.NOT_FOUND_MSG.format(url, 'financial data'))
 
-        # get links
-        try:
-            soc_mapping = {'FACEBOOK': DataKeys.FACEBOOK_URL, 'GITHUB': DataKeys.GITHUB_URL,
-                           'MEDIUM': DataKeys.MEDIUM_URL,
-                           'TELEGRAM': DataKeys.TELEGRAM_URL, 'REDDIT': DataKeys.REDDIT_URL,
-                           'BITCOINTALK': DataKeys.BITCOINTALK_URL,
-                           'WWW': DataKeys.WEBSITE, 'LINKEDIN': DataKeys.LINKEDIN_URL,
-                           'TWITTER': DataKeys.TWITTER_URL}
-
-            link_tags = bs.find('div', {'class': 'socials'}).findAll('a')
-            for link_tag in link_tags:
-                if link_tag.has_attr('title') and link_tag.has_attr('href'):
-                    soc = link_tag.text.strip()
-                    if soc.upper() in soc_mapping:
-                        data[soc_mapping[soc.upper()]] = link_tag['href']
-
-        except AttributeError:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'Social links'))
-
-        try:
-            logo_link = bs.find('div', {'class': 'image'}).find('img')
-            data[DataKeys.LOGO_PATH] = load_image(urljoin(self.domain, logo_link['src']), ScraperBase.logo_tmp_path)
-        except (AttributeError, KeyError):
-            self.logger.warning(self.NOT_FOUND_MSG.format('Logo url'))
-        except Exception as e:
-            self.logger.error('could not download {} logo with: {}'.format(url, str(e)))
-
         IcoBench.process(data)
 
         return data
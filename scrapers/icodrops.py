@@ -1,3 +1,4 @@
+import logging
 import re
 import traceback
 from urllib.request import urljoin
@@ -10,12 +11,80 @@ from scrapers.data_keys import ICO_STATUS
 from scrapers.data_keys import SOURCES
 from scrapers.dataprocessor import process_date_type_without_year
 from scrapers.dataprocessor import date_format
-from utilities.utils import load_image
 from utilities.utils import load_page_via_csf
+from utilities.utils import load_page_via_csf_raw
 from scrapers.dataprocessor import convert_scale
+from scrapers.field_spec import Field
+from scrapers.field_spec import FieldSpec
+from scrapers.field_spec import Labels
+
+
+def icon_of(link):
+    # font awesome icon of the link, e.g. 'fa-telegram' from <i class="fa fa-telegram">
+    return [c for c in link.find('i')['class'] if c.startswith('fa-')][0]
+
+
+def sale_status(text):
+    if 'ended' in text:
+        return ICO_STATUS.ENDED
+    elif 'starts' in text:
+        return ICO_STATUS.UPCOMING
+    elif 'ends in' in text:
+        return ICO_STATUS.ACTIVE
+
+
+def sale_dates(text):
+    dates = text.replace('Token Sale:', '').strip().split('–')
+    if len(dates) != 2:
+        raise ValueError(text)
+    return dates[0].strip(), dates[1].strip()
+
+
+def rating_name(box):
+    hh = box.find_all('p')
+    if len(hh) != 2:
+        return None
+    return hh[0].text.strip().split('\n')[0].upper()
 
 
 class IcoDrops(ScraperBase):
+    anti_bot_logos = True
+
+    SOC_ICONS = {'fa-facebook-square': DK.FACEBOOK_URL, 'fa-telegram': DK.TELEGRAM_URL, 'fa-medium': DK.MEDIUM_URL,
+                 'fa-twitter': DK.TWITTER_URL, 'fa-github': DK.GITHUB_URL, 'fa-btc': DK.BITCOINTALK_URL,
+                 'fa-reddit-alien': DK.REDDIT_URL, 'fa-youtube': DK.YOUTUBE_URL}
+
+    SCORE_MAP = {'HYPE RATE': DK.HYPE_SCORE,
+                 'RISK RATE': DK.RISK_SCORE,
+                 'ROI RATE': DK.ROI_SCORE,
+                 'ICO DRPS SCORE': DK.OVERALL_SCORE}
+
+    INFO_MAP = {'TICKER:': DK.TOKEN_NAME, 'TOKEN TYPE:': DK.TOKEN_STANDARD,
+                'ICO TOKEN PRICE:': DK.ICO_PRICE, 'FUNDRAISING GOAL:': DK.SOFT_CAP,
+                'WHITELIST:': DK.WHITELIST, 'KNOW YOUR CUSTOMER (KYC):': DK.KYC,
+                'ACCEPTS:': DK.ACCEPTED_CURRENCIES, 'СAN\'T PARTICIPATE:': DK.COUNTRIES_RESTRICTED}
+
+    fields = FieldSpec(
+        Field(DK.NAME, 'h3', within='div.ico-main-info', name='ICO name', missing=logging.ERROR),
+        Field(DK.WHITEPAPER, 'div.button', text='WHITEPAPER', value=lambda div: div.parent['href'],
+              name='ICO whitepaper', missing=logging.ERROR),
+        Field(DK.WEBSITE, 'div.button', text='WEBSITE', value=lambda div: div.parent['href'],
+              name='ICO website', missing=logging.ERROR),
+        Field(DK.DESCRIPTION, 'div.ico-description', name='description'),
+        Field(ScraperBase.LOGO_URL, 'div.ico-main-info', value=lambda div: div.parent.find('img')['data-src'],
+              name='logo url', missing=logging.ERROR),
+        Labels('a[href]', SOC_ICONS, within='div.soc_links', label=icon_of, value=lambda a: a['href'],
+               name='soc_links', missing=logging.WARNING),
+        Labels('div.rating-box', SCORE_MAP, within='div.rating-field', label=rating_name,
+               value=lambda box: box.find_all('p')[1].text.strip(), name='rating'),
+        Field(DK.STATUS, 'strong', text=True, within='div.token-sale', process=sale_status, name='status',
+              missing=logging.DEBUG),
+        Field((DK.ICO_START, DK.ICO_END), 'h4', text=re.compile('Token Sale:*'), process=sale_dates,
+              name='Token date', missing=logging.DEBUG),
+        Labels('span.grey', INFO_MAP, text=True, value=lambda span: span.parent.text.split(':')[1].strip(),
+               name='info'),
+    )
+
     def __init__(self, max_threads=1, max_browsers=0):
 
         super(IcoDrops, self).__init__(max_threads, max_browsers)
@@ -48,135 +117,17 @@ class IcoDrops(ScraperBase):
 
         return urls
 
-    def scrape_profile(self, url):
+    def fetch_profile(self, url):
+        return load_page_via_csf_raw(url)
+
+    def parse_profile(self, url, content):
         data = DK.initialize()
         data[DK.PROFILE_URL] = url
         data[DK.SOURCE] = SOURCES.ICODROPS
 
-        try:
-            bs = load_page_via_csf(url, self.html_parser)
-        except:
-            print(traceback.format_exc())
-            return
-
-        # name
-        try:
-            text = bs.find('div', {'class': 'ico-main-info'}).find('h3').text
-            # from "ICO NAME (ICN)" to "ICO NAME"
-            data[DK.NAME] = text.strip()
-        except AttributeError:
-            self.logger.error(self.NOT_FOUND_MSG.format(url, 'ICO name'))
-
-        # whitepaper
-        try:
-            data[DK.WHITEPAPER] = bs.find('div', {'class': 'button'}, text='WHITEPAPER').parent['href']
-        except AttributeError:
-            self.logger.error(self.NOT_FOUND_MSG.format(url, 'ICO whitepaper'))
-
-        # website url
-        try:
-            data[DK.WEBSITE] = bs.find('div', {'class': 'button'}, text='WEBSITE').parent['href']
-        except AttributeError:
-            self.logger.error(self.NOT_FOUND_MSG.format(url, 'ICO website'))
-
-        # description
-        try:
-            data[DK.DESCRIPTION] = bs.find('div', {'class': 'ico-description'}).text.strip()
-        except AttributeError:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'description'))
+        bs = self.make_soup(content)
 
-        # logo
-        try:
-            url_ = bs.select_one('div.ico-main-info').parent.find('img')['data-src']
-            data[DK.LOGO_PATH] = load_image(urljoin(self.domain, url_), ScraperBase.logo_tmp_path, anti_bot=True)
-        except AttributeError:
-            self.logger.error(self.NOT_FOUND_MSG.format(url, 'could not get logo url'))
-        except Exception as e:
-            self.logger.error('could not download {} logo with: {}'.format(url, str(e)))
-
-        # soc links
-        try:
-            soc_links = bs.find('div', {'class': 'soc_links'}).find_all('a')
-            for soc in soc_links:
-                if not soc.has_attr('href'):
-                    continue
-                if soc.find('i', {'class': 'fa-facebook-square'}):
-                    data[DK.FACEBOOK_URL] = soc['href']
-                if soc.find('i', {'class': 'fa-telegram'}):
-                    data[DK.TELEGRAM_URL] = soc['href']
-                if soc.find('i', {'class': 'fa-medium'}):
-                    data[DK.MEDIUM_URL] = soc['href']
-                if soc.find('i', {'class': 'fa-twitter'}):
-                    data[DK.TWITTER_URL] = soc['href']
-                if soc.find('i', {'class': 'fa-github'}):
-                    data[DK.GITHUB_URL] = soc['href']
-                if soc.find('i', {'class': 'fa-btc'}):
-                    data[DK.BITCOINTALK_URL] = soc['href']
-                if soc.find('i', {'class': 'fa-reddit-alien'}):
-                    data[DK.REDDIT_URL] = soc['href']
-                if soc.find('i', {'class': 'fa-youtube'}):
-                    data[DK.YOUTUBE_URL] = soc['href']
-        except AttributeError:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'soc_links'))
-
-        try:
-            rating_fields = bs.find('div', {'class': 'rating-field'}).find_all('div', {'class': 'rating-box'})
-            score_map = {'HYPE RATE': DK.HYPE_SCORE,
-                         'RISK RATE': DK.RISK_SCORE,
-                         'ROI RATE': DK.ROI_SCORE,
-                         'ICO DRPS SCORE': DK.OVERALL_SCORE}
-
-            for rating in rating_fields:
-                hh = rating.findAll('p')
-                if len(hh) == 2:
-                    key = hh[0].text.strip().split('\n')[0].upper()
-                    if key in score_map:
-                        data[score_map[key]] = hh[1].text.strip()
-        except (AttributeError, TypeError):
-            self.logger.debug(self.NOT_FOUND_MSG.format(url, 'rating'))
-
-        # status
-        token_sale = bs.select_one('div.token-sale')
-        if token_sale:
-            status_tag = token_sale.find('strong', text=True)
-            if status_tag:
-                status = status_tag.text.strip()
-                if 'ended' in status:
-                    data[DK.STATUS] = ICO_STATUS.ENDED
-                elif 'starts' in status:
-                    data[DK.STATUS] = ICO_STATUS.UPCOMING
-                elif 'ends in' in status:
-                    data[DK.STATUS] = ICO_STATUS.ACTIVE
-
-        # date
-        date = bs.find('h4', text=re.compile('Token Sale:*'))
-        if date:
-            dates = date.text.replace('Token Sale:', '').strip().split('–')
-            if len(dates) == 2:
-                data[DK.ICO_START] = dates[0].strip()
-                data[DK.ICO_END] = dates[1].strip()
-            else:
-                self.logger.debug(self.NOT_FOUND_MSG.format(url, 'Token date'))
-        else:
-            self.logger.debug(self.NOT_FOUND_MSG.format(url, 'Token date'))
-
-        # info
-        try:
-            info_map = {'TICKER:': DK.TOKEN_NAME, 'TOKEN TYPE:': DK.TOKEN_STANDARD,
-                        'ICO TOKEN PRICE:': DK.ICO_PRICE, 'FUNDRAISING GOAL:': DK.SOFT_CAP,
-                        'WHITELIST:': DK.WHITELIST, 'KNOW YOUR CUSTOMER (KYC):': DK.KYC,
-                        'ACCEPTS:': DK.ACCEPTED_CURRENCIES, 'СAN\'T PARTICIPATE:': DK.COUNTRIES_RESTRICTED}
-
-            infos = bs.findAll('span', {'class': 'grey'}, text=True)
-            for info in infos:
-                key = info.text.upper().strip()
-                if key in info_map:
-                    try:
-                        data[info_map[key]] = info.parent.text.split(':')[1].strip()
-                    except AttributeError:
-                        self.logger.error('Could not find existing info')
-        except (TypeError, AttributeError):
-            self.logger.debug(self.NOT_FOUND_MSG.format(url, 'info'))
+        self.fields.extract(bs, data, url, self.logger)
 
         IcoDrops.__process(data)
 
@@ -1,5 +1,12 @@
+import json
+import logging
 import re
 from multiprocessing.dummy import Lock
+from urllib.parse import parse_qs
+from urllib.parse import parse_qsl
+from urllib.parse import urlencode
+from urllib.parse import urlsplit
+from urllib.parse import urlunsplit
 from urllib.request import urljoin
 
 from selenium.webdriver.common.by import By
@@ -10,13 +17,119 @@ from scrapers.base_scraper import ScraperBase
 from scrapers.data_keys import BOOL_VALUES
 from scrapers.data_keys import DataKeys
 from scrapers.data_keys import SOURCES
+from scrapers.field_spec import Field
+from scrapers.field_spec import FieldSpec
+from scrapers.field_spec import Labels
+from scrapers.field_spec import text_of
+from utilities.retry import RequestError
+from utilities.utils import Configs
+from utilities.utils import browser_pool
 from utilities.utils import click
-from utilities.utils import load_page
-from utilities.utils import load_image
-from utilities.utils import setup_browser
+from utilities.utils import load_page_raw
+from utilities.utils import make_soup
+
+
+SOC_LINK = re.compile(r'^(https?(://)?(www)?.?)?(bitcointalk\.org|facebook\.com|twitter\.com|t\.me|reddit\.com|'
+                      r'github\.com|medium\.com|linkedin\.com)/')
+
+
+def sale_dates(text):
+    dates = text.upper().split('-')
+    return dates[0].strip(), dates[1].strip()
+
+
+# attributes of 'show more' buttons which may hold the url of the next page
+ENDPOINT_ATTRS = ('data-url', 'data-href', 'data-link', 'data-action', 'data-source', 'href')
+
+
+def show_more_endpoint(url, button):
+    # returns (url of listings pages, name of page number parameter, number of the next page); without url in the
+    # button pages of the listing itself are loaded, e.g. /icos?sort=rating-desc&page=2
+    endpoint = url
+    for attr in ENDPOINT_ATTRS:
+        value = button.get(attr)
+        if value and not value.startswith(('#', 'javascript:')):
+            endpoint = urljoin(url, value)
+            break
+
+    param = button.get('data-param') or 'page'
+    query = parse_qs(urlsplit(endpoint).query)
+    if button.get('data-next-page'):
+        first = int(button['data-next-page'])
+    elif button.get('data-page'):
+        # number of the loaded page
+        first = int(button['data-page']) + 1
+    elif param in query:
+        first = int(query[param][0])
+    else:
+        first = 2
+    return endpoint, param, first
+
+
+def with_query(url, param, value):
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != param] + [(param, str(value))]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def fragment_of(page):
+    # 'show more' endpoints return html of the next listings or json with it, e.g. {"html": "...", "more": true}
+    if not page.data.lstrip().startswith(b'{'):
+        return page
+    data = json.loads(page.text())
+    for key in ('html', 'content', 'data', 'items', 'view'):
+        if isinstance(data.get(key), str):
+            return data[key]
+    return next((value for value in data.values() if isinstance(value, str) and '<' in value), '')
+
+
+def kyc_whitelist(text):
+    text = text.upper()
+    return BOOL_VALUES.YES if 'KYC' in text else BOOL_VALUES.NO, \
+        BOOL_VALUES.YES if 'WHITELIST' in text else BOOL_VALUES.NO
 
 
 class IcoMarks(ScraperBase):
+    SCORE_MAPPING = {'ICO PROFILE': DataKeys.ICO_PROFILE_SCORE, 'TEAM & ADVISORS': DataKeys.TEAM_SCORE}
+
+    DETAILS_MAPPING = {'COUNTRY:': DataKeys.COUNTRY, 'PRICE:': DataKeys.ICO_PRICE,
+                       'ACCEPTING:': DataKeys.ACCEPTED_CURRENCIES, 'SOFT CAP:': DataKeys.SOFT_CAP,
+                       'HARD CAP:': DataKeys.HARD_CAP, 'TICKER:': DataKeys.TOKEN_NAME,
+                       'PLATFORM:': DataKeys.PLATFORM, 'TOKEN TYPE:': DataKeys.TOKEN_STANDARD,
+                       'PRE-SALE TIME:': [(DataKeys.PRE_ICO_START, DataKeys.PRE_ICO_END), sale_dates],
+                       'ICO TIME:': [(DataKeys.ICO_START, DataKeys.ICO_END), sale_dates],
+                       'WHITELIST/KYC:': [(DataKeys.KYC, DataKeys.WHITELIST), kyc_whitelist]}
+
+    SOC_MAPPING = {'bitcointalk.org': DataKeys.BITCOINTALK_URL, 'facebook.com': DataKeys.FACEBOOK_URL,
+                   'twitter.com': DataKeys.TWITTER_URL, 't.me': DataKeys.TELEGRAM_URL,
+                   'reddit.com': DataKeys.REDDIT_URL, 'github.com': DataKeys.GITHUB_URL,
+                   'medium.com': DataKeys.MEDIUM_URL, 'linkedin.com': DataKeys.LINKEDIN_URL}
+
+    regions = ('h1[itemprop=name]', 'img[itemprop=url]', 'div.ico-rating-overall', 'div.ico-rating', 'div.icoinfo',
+               'div.company-description')
+
+    fields = FieldSpec(
+        Field(DataKeys.NAME, 'h1[itemprop=name]', name='ICO name'),
+        Field(ScraperBase.LOGO_URL, 'img[itemprop=url]', attr='src', name='ICO logo'),
+        Field(DataKeys.OVERALL_SCORE, 'div.ico-rating-overall', name='ICO score'),
+        Labels('div.ico-rating__title', SCORE_MAPPING, text=True,
+               value=lambda title: text_of(title.find_parent('div', class_='ico-rating__item').parent.find(
+                   'div', class_='ico-rating__circle')),
+               name='ICO scores'),
+        # the value of a row is the text after the label, e.g. <span>Country:</span> Malta
+        Labels('span', DETAILS_MAPPING, text=True, within='div.icoinfo',
+               value=lambda span: span.parent.text.split(':')[1].strip(), name='detail rows'),
+        Field(DataKeys.WEBSITE, 'span', text='Website:', within='div.icoinfo',
+              value=lambda span: span.find_next_sibling('a')['href'], name='website', missing=logging.DEBUG),
+        Labels('a.icoinfo-block__view[href]', SOC_MAPPING, within='div.icoinfo',
+               label=lambda a: SOC_LINK.match(a['href']).group(4), value=lambda a: a['href'], name='Soc links',
+               missing=logging.WARNING),
+        Field(DataKeys.DESCRIPTION, 'div.company-description', name='Description'),
+    )
+
+    # titles of listings on the listings page, waited for after every 'show more' click
+    LISTING_ITEMS = '.icoListItem__title'
+
     def __init__(self, max_threads=1, max_browsers=0):
 
         super(IcoMarks, self).__init__(max_threads, max_browsers)
@@ -37,35 +150,76 @@ class IcoMarks(ScraperBase):
         self.domain = 'https://www.icomarks.com/'
 
     def scrape_listings(self, url):
+        # 'listings' option of the source: 'http' loads pages behind 'show more' directly, the browser is used if it
+        # fails; 'browser' clicks 'show more' in selenium
+        if Configs.get_source(self.whoami(), 'listings', 'http') == 'http':
+            try:
+                return self.scrape_listings_http(url)
+            except Exception as e:
+                self.logger.warning('Could not load listings of {} over http, using browser: {}'.format(url, str(e)))
+
+        return self.scrape_listings_with_browser(url)
+
+    def listing_urls(self, bs):
+        return [urljoin(self.domain, a['href']) for a in bs.select(self.LISTING_ITEMS) if a.has_attr('href')]
+
+    def listings_page(self, url):
+        return self.listing_urls(make_soup(fragment_of(load_page_raw(url)), self.html_parser))
+
+    def scrape_listings_http(self, url):
+        bs = make_soup(load_page_raw(url), self.html_parser)
+        urls = self.listing_urls(bs)
+        if not urls:
+            raise RequestError('No listings in {}'.format(url))
+
+        button = bs.find(id='show-more')
+        if button is None:
+            return urls
+
+        # the first page of the endpoint decides between http and browser, other pages are streamed by paginator
+        endpoint, param, first = show_more_endpoint(url, button)
+        next_urls = self.listings_page(with_query(endpoint, param, first))
+        if not set(next_urls) - set(urls):
+            # 'show more' works, but the endpoint gives nothing, so it is not the right one
+            raise RequestError('No listings in {}'.format(with_query(endpoint, param, first)))
+
+        # the loaded page is the one before the first page of the endpoint
+        return self.paginate(lambda page: with_query(endpoint, param, page), self.listings_page, first=first - 1,
+                             max_pages=self.max_pagination + 1, loaded={first - 1: urls, first: next_urls})
+
+    def scrape_listings_with_browser(self, url):
         try:
-            driver = setup_browser(self.browser_name)
+            with browser_pool().browser(self.browser_name) as driver:
+                driver.get(url)
+                wait = WebDriverWait(driver, Configs.get('browser_wait_timeout'))
+                # page is loaded 'eager', listings are there when the first of them is
+                items = Configs.get_source(self.whoami(), 'wait_for', self.LISTING_ITEMS)
+                try:
+                    wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, items)))
+                    for _ in range(0, self.max_pagination):
+                        next_ = wait.until(EC.presence_of_element_located((By.ID, 'show-more')))
+                        if next_:
+                            count = len(driver.find_elements_by_css_selector(items))
+                            driver.execute_script("arguments[0].scrollIntoView();", next_)
+                            click(driver, next_)
+                            # the next page is loaded when new listings are added, not when the whole page is loaded
+                            wait.until(lambda d: len(d.find_elements_by_css_selector(items)) > count)
+                        else:
+                            break
+                except:
+                    self.logger.debug('Could not click next pagin in {}'.format(url))
+
+                listings = driver.find_elements_by_css_selector(self.LISTING_ITEMS)
+                urls = []
+                for listing in listings:
+                    urls.append(urljoin(self.domain, listing.get_attribute('href')))
         except:
             self.logger.critical('Error while scraping listings from %s', url)
             return
 
-        driver.get(url)
-        wait = WebDriverWait(driver, 5)
-        try:
-            for _ in range(0, self.max_pagination):
-                next_ = wait.until(EC.presence_of_element_located((By.ID, 'show-more')))
-                if next_:
-                    driver.execute_script("arguments[0].scrollIntoView();", next_)
-                    click(driver, next_)
-                else:
-                    break
-        except:
-            self.logger.debug('Could not click next pagin in {}'.format(url))
-
-        listings = driver.find_elements_by_css_selector('.icoListItem__title')
-        urls = []
-        for listing in listings:
-            urls.append(urljoin(self.domain, listing.get_attribute('href')))
-
         if len(urls) == 0:
             self.logger.critical('Could not extract listings from'.format(url))
 
-        driver.quit()
-
         # bs = load_page(url, self.html_parser)
         # tags = bs.find('div', {'class': 'upcoming-sec__main'}).findAll('a', {'target': '_blank'})
         # urls = []
@@ -74,149 +228,14 @@ class IcoMarks(ScraperBase):
 
         return urls
 
-    def scrape_profile(self, url):
+    def parse_profile(self, url, content):
         data = DataKeys.initialize()
         data[DataKeys.PROFILE_URL] = url
         data[DataKeys.SOURCE] = SOURCES.ICOMARKS
 
-        try:
-            bs = load_page(url, self.html_parser)
-        except:
-            self.logger.error('Could not extract {} page'.format(url))
-            return
+        bs = self.make_soup(content)
 
-        # name
-        try:
-            data[DataKeys.NAME] = bs.find('h1', {'itemprop': 'name'}).text.strip()
-        except:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'ICO name'))
-
-        # logo
-        try:
-            logo_path = bs.find('img', {'itemprop': 'url'})['src']
-            data[DataKeys.LOGO_PATH] = load_image(urljoin(self.domain, logo_path), ScraperBase.logo_tmp_path)
-        except (AttributeError, KeyError):
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'ICO logo'))
-        except Exception as e:
-            self.logger.error('could not download {} logo with: {}'.format(url, str(e)))
-
-        # overall scores
-        try:
-            data[DataKeys.OVERALL_SCORE] = bs.find('div', {'class': 'ico-rating-overall'}).text.strip()
-        except:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'ICO score'))
-
-        # other scores
-        score_mapping = {'ICO PROFILE': DataKeys.ICO_PROFILE_SCORE, 'TEAM & ADVISORS': DataKeys.TEAM_SCORE}
-        try:
-            ratings = bs.findAll('div', {'class': 'ico-rating__item'})
-            for rating in ratings:
-                title = rating.find('div', class_='ico-rating__title', text=True)
-                key = None if not title else title.text.strip().upper()
-                if key in score_mapping:
-                    value = rating.parent.find('div', class_='ico-rating__circle')
-                    data[score_mapping[key]] = value.text.strip()
-        except:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'ICO score'))
-
-        details_mapping = {'COUNTRY:': DataKeys.COUNTRY, 'PRICE:': DataKeys.ICO_PRICE,
-                           'ACCEPTING:': DataKeys.ACCEPTED_CURRENCIES, 'SOFT CAP:': DataKeys.SOFT_CAP,
-                           'HARD CAP:': DataKeys.HARD_CAP, 'TICKER:': DataKeys.TOKEN_NAME,
-                           'PLATFORM:': DataKeys.PLATFORM, 'TOKEN TYPE:': DataKeys.TOKEN_STANDARD}
-
-        details_info = bs.select_one('div.icoinfo')
-        try:
-            desks = details_info.select('div.icoinfo-block__item')
-            for detail in desks:
-                title = detail.find('span', text=True)
-                key = None if not title else title.text.strip().upper()
-                if key in details_mapping:
-                    value = title.parent.text.split(':')[1].strip()
-                    data[details_mapping[key]] = value
-        except:
-            self.logger.error('Someting went wrong in {}, when scraping detail rows'.format(url))
-
-        # pre ico time
-        try:
-            date = details_info.find('span', text='Pre-sale Time:')
-            if date:
-                value = date.parent.text.split(':')[1].upper()
-                dates = value.split('-')
-                data[DataKeys.PRE_ICO_START] = dates[0].strip()
-                data[DataKeys.PRE_ICO_END] = dates[1].strip()
-        except:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'Pre Date info'))
-
-        # ico time
-        try:
-            date = details_info.find('span', text='ICO Time:')
-            if date:
-                value = date.parent.text.split(':')[1].upper()
-                dates = value.split('-')
-                data[DataKeys.ICO_START] = dates[0].strip()
-                data[DataKeys.ICO_END] = dates[1].strip()
-        except:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'Date info'))
-
-        # website url
-        try:
-            title = details_info.find('span', text='Website:')
-            if title:
-                value = title.find_next_sibling('a')
-                data[DataKeys.WEBSITE] = value['href']
-        except:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'Date info'))
-
-        # KYC/Whitelist
-        try:
-            kyc_w = details_info.find('span', text='Whitelist/KYC:')
-            if kyc_w == 'WHITELIST/KYC':
-                text = kyc_w.parent.text.split(':')[1].upper()
-                data[DataKeys.KYC] = BOOL_VALUES.YES if 'KYC' in text else BOOL_VALUES.NO
-                data[DataKeys.WHITELIST] = BOOL_VALUES.YES if 'WHITELIST' in text else BOOL_VALUES.NO
-        except:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'KYC and whitelist'))
-
-        # soc links
-        try:
-            soc_links = details_info.findAll('a', {'class': 'icoinfo-block__view'})
-            for soc_link in soc_links:
-                if soc_link.has_attr('href'):
-                    if re.match('^(https?(:\/\/)?(www)?.?)?bitcointalk.org\/.*', soc_link['href']):
-                        data[DataKeys.BITCOINTALK_URL] = soc_link['href']
-                        continue
-                    if re.match('^(https?(:\/\/)?(www)?.?)?facebook.com\/.*', soc_link['href']):
-                        data[DataKeys.FACEBOOK_URL] = soc_link['href']
-                        continue
-                    if re.match('^(https?(:\/\/)?(www)?.?)?twitter.com\/.*', soc_link['href']):
-                        data[DataKeys.TWITTER_URL] = soc_link['href']
-                        continue
-                    if re.match('^(https?(:\/\/)?(www)?.?)?t.me\/.*', soc_link['href']):
-                        data[DataKeys.TELEGRAM_URL] = soc_link['href']
-                        continue
-                    if re.match('^(https?(:\/\/)?(www)?.?)?reddit.com\/.*', soc_link['href']):
-                        data[DataKeys.REDDIT_URL] = soc_link['href']
-                        continue
-                    if re.match('^(https?(:\/\/)?(www)?.?)?github.com\/.*', soc_link['href']):
-                        data[DataKeys.GITHUB_URL] = soc_link['href']
-                        continue
-                    if re.match('^(https?(:\/\/)?(www)?.?)?medium.com\/.*', soc_link['href']):
-                        data[DataKeys.MEDIUM_URL] = soc_link['href']
-                        continue
-                    if re.match('^(https?(:\/\/)?(www)?.?)?linkedin.com\/.*', soc_link['href']):
-                        data[DataKeys.LINKEDIN_URL] = soc_link['href']
-                        continue
-                    if re.match('^(https?(:\/\/)?(www)?.?)?linkedin.com\/.*', soc_link['href']):
-                        data[DataKeys.LINKEDIN_URL] = soc_link['href']
-                        continue
-        except:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'Soc links'))
-
-        # description
-        try:
-            data[DataKeys.DESCRIPTION] = bs.find('div', {'class', 'company-description'}).text.strip()
-        except:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'Description'))
+        self.fields.extract(bs, data, url, self.logger)
 
         IcoMarks.process(data)
 
@@ -6,12 +6,45 @@ from scrapers.data_keys import BOOL_VALUES
 from scrapers.data_keys import DataKeys
 from scrapers.data_keys import SOURCES
 from scrapers.dataprocessor import convert_scale
+from utilities.utils import Configs
 from utilities.utils import load_page
 from utilities.utils import load_page_with_selenium
 from utilities.utils import load_image
 
 
 class IcoRating(ScraperBase):
+    INVESTMENT_RATINGS = {'POSITIVE+': 8,
+                          'POSITIVE': 7,
+                          'STABLE+': 6,
+                          'STABLE': 5,
+                          'RISKY+': 4,
+                          'RISKY': 3,
+                          'RISKY-': 2,
+                          'NEGATIVE': 1,
+                          'NEGATIVE-': 0,
+                          'NA': BOOL_VALUES.NOT_AVAILABLE}
+
+    SOC_MAPPING = {'FACEBOOK': DataKeys.FACEBOOK_URL, 'GITHUB': DataKeys.GITHUB_URL,
+                   'MEDIUM': DataKeys.MEDIUM_URL, 'INSTAGRAM': DataKeys.INSTAGRAM_URL,
+                   'TELEGRAM': DataKeys.TELEGRAM_URL, 'REDDIT': DataKeys.REDDIT_URL,
+                   'BTCTALK': DataKeys.BITCOINTALK_URL,
+                   'WEBSITE': DataKeys.WEBSITE, 'LINKEDIN': DataKeys.LINKEDIN_URL,
+                   'TWITTER': DataKeys.TWITTER_URL}
+
+    INFO_MAP = {'Pre-ICO start date:': DataKeys.PRE_ICO_START,
+                'Pre-ICO end date:': DataKeys.PRE_ICO_END,
+                'Hard cap:': DataKeys.HARD_CAP,
+                'ICO start date:': DataKeys.ICO_START,
+                'ICO end date:': DataKeys.ICO_END,
+                'Soft cap:': DataKeys.SOFT_CAP,
+                'Ticker:': DataKeys.TOKEN_NAME,
+                'ICO Platform:': DataKeys.PLATFORM,
+                'Token price in USD:': DataKeys.ICO_PRICE,
+                'Accepted Currencies:': DataKeys.ACCEPTED_CURRENCIES,
+                'Country Limitations:': DataKeys.COUNTRIES_RESTRICTED,
+                'Token Standard:': DataKeys.TOKEN_STANDARD,
+                'Registration Country:': DataKeys.COUNTRY}
+
     def __init__(self, max_threads=1, max_browsers=0):
 
         super(IcoRating, self).__init__(max_threads, max_browsers)
@@ -28,7 +61,9 @@ class IcoRating(ScraperBase):
     def scrape_listings(self, url):
         # next page url from 'Next 'pagination tag
         try:
-            bs = load_page_with_selenium(url, self.html_parser)
+            # listings are added by scripts, 'wait_for' option of the source overrides the selector
+            bs = load_page_with_selenium(url, self.html_parser,
+                                         wait=Configs.get_source(self.whoami(), 'wait_for', 'tr[data-href]'))
         except:
             self.logger.critical('Error while scraping listings from %s', url)
             return
@@ -86,34 +121,18 @@ class IcoRating(ScraperBase):
                     inv = rating.parent.find('span', {'class': 'name'}, text=True)
                     if inv:
                         value = inv.text.upper()
-                        investment_ratings = {'POSITIVE+': 8,
-                                              'POSITIVE': 7,
-                                              'STABLE+': 6,
-                                              'STABLE': 5,
-                                              'RISKY+': 4,
-                                              'RISKY': 3,
-                                              'RISKY-': 2,
-                                              'NEGATIVE': 1,
-                                              'NEGATIVE-': 0,
-                                              'NA': BOOL_VALUES.NOT_AVAILABLE}
-                        rating = investment_ratings[value.upper()]
+                        rating = self.INVESTMENT_RATINGS[value.upper()]
                         if rating:
                             data[DataKeys.ROI_SCORE] = rating
         except:
             self.logger.warning('Exception while scraping {} from {}'.format('rating info', url))
 
         link_tags = bs.findAll('a', {'target': '_blank'}, text=False)
-        soc_mapping = {'FACEBOOK': DataKeys.FACEBOOK_URL, 'GITHUB': DataKeys.GITHUB_URL,
-                       'MEDIUM': DataKeys.MEDIUM_URL, 'INSTAGRAM': DataKeys.INSTAGRAM_URL,
-                       'TELEGRAM': DataKeys.TELEGRAM_URL, 'REDDIT': DataKeys.REDDIT_URL,
-                       'BTCTALK': DataKeys.BITCOINTALK_URL,
-                       'WEBSITE': DataKeys.WEBSITE, 'LINKEDIN': DataKeys.LINKEDIN_URL,
-                       'TWITTER': DataKeys.TWITTER_URL}
 
         for link_tag in link_tags:
             try:
                 text = link_tag.text.strip().upper()
-                key = soc_mapping[text]
+                key = self.SOC_MAPPING[text]
                 data[key] = link_tag['href']
             except (AttributeError, KeyError):
                 continue
@@ -143,27 +162,13 @@ class IcoRating(ScraperBase):
         except:
             self.logger.error(self.NOT_FOUND_MSG.format(url + '/details', 'info table'))
 
-        info_map = {'Pre-ICO start date:': DataKeys.PRE_ICO_START,
-                    'Pre-ICO end date:': DataKeys.PRE_ICO_END,
-                    'Hard cap:': DataKeys.HARD_CAP,
-                    'ICO start date:': DataKeys.ICO_START,
-                    'ICO end date:': DataKeys.ICO_END,
-                    'Soft cap:': DataKeys.SOFT_CAP,
-                    'Ticker:': DataKeys.TOKEN_NAME,
-                    'ICO Platform:': DataKeys.PLATFORM,
-                    'Token price in USD:': DataKeys.ICO_PRICE,
-                    'Accepted Currencies:': DataKeys.ACCEPTED_CURRENCIES,
-                    'Country Limitations:': DataKeys.COUNTRIES_RESTRICTED,
-                    'Token Standard:': DataKeys.TOKEN_STANDARD,
-                    'Registration Country:': DataKeys.COUNTRY}
-
         rows = bs.find_all('td', text=re.compile('.*:$'))
         for row in rows:
             try:
                 key = row.text.strip()
-                if key in info_map:
+                if key in self.INFO_MAP:
                     value = row.find_next_sibling().text.strip()
-                    data[info_map[key]] = value
+                    data[self.INFO_MAP[key]] = value
             except AttributeError:
                 continue
 
@@ -1,6 +1,5 @@
 import logging
 import re
-import time
 import traceback
 from multiprocessing.pool import ThreadPool
 
@@ -8,8 +7,11 @@ import tqdm
 
 from scrapers.data_keys import BOOL_VALUES
 from scrapers.data_keys import DataKeys
+from utilities.utils import configure_source
 from utilities.utils import load_page
 from utilities.utils import load_page_as_text
+from utilities.utils import source_parser
+from utilities.retry import RequestError
 
 
 class Reddit:
@@ -17,7 +19,7 @@ class Reddit:
     max_threads = 20
 
     @staticmethod
-    def scrape_listings(url, rec=True):
+    def scrape_listings(url):
 
         post_count = 0
         user_list = []
@@ -28,13 +30,9 @@ class Reddit:
 
         while True:
             try:
-                bs = load_page(url, Reddit.html_parser)
+                bs = load_page(url, source_parser('reddit', Reddit.html_parser))
             except Exception as e:
-                if rec:
-                    return Reddit.scrape_listings(url, rec=False)
-
-                logging.error(
-                    'Unable to scrap profile for {}, after retrying 2 time, the reason: {}'.format(url, str(e)))
+                logging.error('Unable to scrap profile for {}, the reason: {}'.format(url, str(e)))
                 break
 
             try:
@@ -55,48 +53,51 @@ class Reddit:
         return post_count, comment_count, user_list
 
     @staticmethod
-    def scrap_user_karma(user_name, rec=True):
-        user_redit_url = 'https://www.reddit.com/user/' + user_name
-
-        try:
-            text = load_page_as_text(user_redit_url, Reddit.html_parser)
-        except Exception as e:
-            logging.debug(traceback.format_exc())
-            logging.critical("Could not extract data from {} url, the reason is:{}".format(user_redit_url, str(e)))
-            return
-
+    def __parse_karma(text):
         try:
             # post_karma = int(
             #     re.sub('[^\w]', '', bs.find('div', {'class': 'titlebox'}).find('span', {'class': 'karma'}).text)
             # )
-            karma = int(
+            return int(
                 re.search(r'<span>([,\d\s]+)Karma', text).group(1).strip().replace(',', '')
             )
         except (AttributeError, ValueError, IndexError):
-            try:
-                # post_karma = int( re.sub('[^\w]', '', bs.find('div', {'class':
-                # 'ProfileSidebar__counterInfo'}).text.split("Post Karma")[0].strip()) )
-                post_karma = int(
-                    re.search(r'<span class="karma">(-?[,\d\s]+)</span>', text).group(1).strip().replace(',', '')
-                )
-                comment_karma = int(
-                    re.search(r'span class="karma comment-karma">(-?[,\d\s]+)</span>', text).group(1).strip().replace(
-                        ',', '')
-                )
-                karma = post_karma + comment_karma
-            except (AttributeError, ValueError, IndexError):
-                # retry
-                if rec:
-                    time.sleep(3)
-                    return Reddit.scrap_user_karma(user_name, rec=False)
+            pass
+
+        try:
+            # post_karma = int( re.sub('[^\w]', '', bs.find('div', {'class':
+            # 'ProfileSidebar__counterInfo'}).text.split("Post Karma")[0].strip()) )
+            post_karma = int(
+                re.search(r'<span class="karma">(-?[,\d\s]+)</span>', text).group(1).strip().replace(',', '')
+            )
+            comment_karma = int(
+                re.search(r'span class="karma comment-karma">(-?[,\d\s]+)</span>', text).group(1).strip().replace(
+                    ',', '')
+            )
+            return post_karma + comment_karma
+        except (AttributeError, ValueError, IndexError):
+            # reddit sometimes serves page without karma, it is retried by the loader
+            raise RequestError('No karma info in the page')
+
+    @staticmethod
+    def scrap_user_karma(user_name):
+        user_redit_url = 'https://www.reddit.com/user/' + user_name
 
-                logging.error("Unable to get user post karma info for user [{}], retried 2 times".format(user_name))
-                return
+        try:
+            text = load_page_as_text(user_redit_url, validate=Reddit.__parse_karma)
+        except RequestError as e:
+            logging.error("Unable to get user post karma info for user [{}]: {}".format(user_name, str(e)))
+            return
+        except Exception as e:
+            logging.debug(traceback.format_exc())
+            logging.critical("Could not extract data from {} url, the reason is:{}".format(user_redit_url, str(e)))
+            return
 
-        return karma
+        return Reddit.__parse_karma(text)
 
     @staticmethod
     def exctract_reddit(data):
+        configure_source('reddit', 'https://www.reddit.com')
 
         for d in data[:500]:
             reddit_url = d[DataKeys.REDDIT_URL]
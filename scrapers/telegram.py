@@ -7,8 +7,9 @@ import tqdm
 
 from scrapers.data_keys import BOOL_VALUES
 from scrapers.data_keys import DataKeys
-from utilities.proxy_generator import get_paied_proxies
+from utilities.utils import configure_source
 from utilities.utils import load_page_via_proxies_as_text
+from utilities.utils import proxy_pool
 
 # TODO: add config file for this attrs
 __html_parser = 'lxml'
@@ -17,9 +18,11 @@ __logger = logging
 __mutex = Lock()
 __n_a = BOOL_VALUES.NOT_AVAILABLE
 
-__proxies = get_paied_proxies()
-__pr_len = len(__proxies)
-__proxy_id = 0
+
+def subscribers_of(content):
+    tel_subscr_str = re.search('tgme_page_extra">\s*((\d+\s?)+)\s*members', content).group(1)
+    # bs.find('div', {'class': 'tgme_page_extra'}).text
+    return int(''.join(filter(str.isdigit, tel_subscr_str)))
 
 
 def scrape_info(d):
@@ -31,25 +34,14 @@ def scrape_info(d):
         d[DataKeys.TELEGRAM_URL] = __n_a
         d[DataKeys.TELEGRAM_SUBSCRIBERS] = __n_a
 
-    global __proxy_id
     try:
-        ip = __proxies[__proxy_id % __pr_len]
-        with __mutex:
-            __proxy_id += 1
-
-        if __proxy_id > 1000000:
-            with __mutex:
-                __proxy_id = 0
-
-        content = load_page_via_proxies_as_text(url, ip)
+        content = load_page_via_proxies_as_text(url, proxy_pool().get(), proxy_pool().get)
     except:
         __logger.warning('Could not load telegram page')
         return
 
     try:
-        tel_subscr_str = re.search('tgme_page_extra">\s*((\d+\s?)+)\s*members', content).group(1)
-        # bs.find('div', {'class': 'tgme_page_extra'}).text
-        num_tel_sub = int(''.join(filter(str.isdigit, tel_subscr_str)))
+        num_tel_sub = subscribers_of(content)
 
         with __mutex:
             d[DataKeys.TELEGRAM_SUBSCRIBERS] = num_tel_sub
@@ -73,6 +65,8 @@ def extract_telegram_info(data: list, n_a):
     global __n_a
     __n_a = n_a
 
+    configure_source('telegram', 'https://t.me')
+
     pool = ThreadPool(__max_threads)
     tqdm.tqdm(pool.imap(scrape_info, data), total=len(data))
     pool.close()
@@ -1,6 +1,5 @@
 import re
 from multiprocessing.dummy import Lock
-from urllib.request import urljoin
 
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
@@ -11,13 +10,44 @@ from scrapers.dataprocessor import convert_scale
 from scrapers.data_keys import DataKeys
 from scrapers.data_keys import BOOL_VALUES
 from scrapers.data_keys import SOURCES
+from scrapers.field_spec import Field
+from scrapers.field_spec import FieldSpec
+from scrapers.field_spec import Labels
+from scrapers.field_spec import text_of
 from utilities.utils import click
 from utilities.utils import load_page
-from utilities.utils import load_image
 from utilities.utils import setup_browser
 
 
 class TokenTops(ScraperBase):
+    SOC_MAPPING = {'Facebook': DataKeys.FACEBOOK_URL, 'Github': DataKeys.GITHUB_URL,
+                   'Blog': DataKeys.MEDIUM_URL,
+                   'Telegram': DataKeys.TELEGRAM_URL, 'Reddit': DataKeys.REDDIT_URL,
+                   'Bitcoin Talk': DataKeys.BITCOINTALK_URL,
+                   'Website': DataKeys.WEBSITE, 'Linkedin': DataKeys.LINKEDIN_URL,
+                   'Twitter': DataKeys.TWITTER_URL}
+
+    DETAILS_MAPPING = {'START DATE': DataKeys.ICO_START, 'CLOSE DATE': DataKeys.ICO_END,
+                       'TOKEN SYMBOL': DataKeys.TOKEN_NAME,
+                       'SMART CONTRACT BLOCKCHAIN': DataKeys.PLATFORM, 'AMOUNT RAISED': DataKeys.RAISED}
+
+    regions = ('h1.page-details__title', 'img.page-details__logo', 'div.rating_block', 'div.page-details__main',
+               'div.page-details__info-row', 'div.show-more-wrap', 'div#section-review-block')
+
+    # review scores are averaged in parse_profile
+    fields = FieldSpec(
+        Field(DataKeys.NAME, 'h1.page-details__title', name='ICO name'),
+        Field(ScraperBase.LOGO_URL, 'img.page-details__logo', attr='src', name='ICO logo'),
+        Field(DataKeys.OVERALL_SCORE, 'span.rating-text', within='div.rating_block',
+              process=lambda score: score if score != '0' else None, name='Overall score'),
+        Labels('a[title][href]', SOC_MAPPING, within='div.page-details__main', label=lambda a: a['title'],
+               value=lambda a: a['href'], name='social links'),
+        Labels('h3.page-details__info-title', DETAILS_MAPPING, text=True,
+               value=lambda h3: text_of(h3.find_next_sibling('div', {'class': 'page-details__info-descr'}, text=True)),
+               name='detail rows'),
+        Field(DataKeys.DESCRIPTION, 'h2', text=True, within='div.show-more-wrap.show-more--big2', name='Description'),
+    )
+
     def __init__(self, max_threads=1, max_browsers=0):
 
         super(TokenTops, self).__init__(max_threads, max_browsers)
@@ -33,132 +63,35 @@ class TokenTops(ScraperBase):
         self.NOT_FOUND_MSG = "From {}: could not find {}"
 
         # location of listings in website, may be more than one
-        self.urls = ['https://www.tokentops.com/ico/?page=1',
-                     'https://www.tokentops.com/ico/?page=2',
-                     'https://www.tokentops.com/ico/?page=3',
-                     'https://www.tokentops.com/ico/?page=4',
-                     'https://www.tokentops.com/ico/?page=5',
-                     'https://www.tokentops.com/ico/?page=6',
-                     'https://www.tokentops.com/ico/?page=7',
-                     'https://www.tokentops.com/ico/?page=8',
-                     'https://www.tokentops.com/ico/?page=9',
-                     'https://www.tokentops.com/ico/?page=10',
-                     'https://www.tokentops.com/ico/?page=11',
-                     'https://www.tokentops.com/ico/?page=12',
-                     'https://www.tokentops.com/ico/?page=13']
+        self.urls = ['https://www.tokentops.com/ico/']
 
         self.domain = 'https://www.tokentops.com/'
 
-    def scrape_listings(self, url):
+    def scrape_listings_from_page(self, url):
         try:
-            # driver = setup_browser(self.browser_name)
             bs = load_page(url, self.html_parser)
         except:
-            self.logger.critical('Error while scraping listings from %s', url)
+            self.logger.error('Error while scraping listings from %s', url)
             return
 
-        # driver.get(url)
-        # urls = []
-        # wait = WebDriverWait(driver, 5)
-        # try:
-        #     while True:
-        #         elements = driver.find_elements_by_css_selector('.t_wrap.t_line')
-        #         for e in elements:
-        #             urls.append(e.get_attribute('href'))
-        #         next_ = wait.until(EC.presence_of_element_located(
-        #             (By.XPATH, '//a[contains(text(), "»") and @class="pagination__link"]')))
-        #         if next_:
-        #             click(driver, next_)
-        #         else:
-        #             break
-        # except:
-        #     if len(urls) == 0:
-        #         self.logger.critical('Could not extract listings from'.format(url))
-
-        tags = bs.find('div', {'class': 'upcoming-sec__main'}).findAll('a', {'target': '_blank'})
-        urls = []
-        for tag in tags:
-            urls.append(tag['href'])
-
-        # driver.quit()
-
-        return urls
-
-    def scrape_profile(self, url):
+        # pages after the last one have no listings block
+        listings = bs.find('div', {'class': 'upcoming-sec__main'})
+        if listings is None:
+            return []
+        return [tag['href'] for tag in listings.findAll('a', {'target': '_blank'})]
+
+    def scrape_listings(self, url):
+        # number of pages is not shown, it is probed
+        return self.paginate(lambda page: url + '?page={}'.format(page), self.scrape_listings_from_page)
+
+    def parse_profile(self, url, content):
         data = DataKeys.initialize()
         data[DataKeys.PROFILE_URL] = url
         data[DataKeys.SOURCE] = SOURCES.TOKENTOPS
 
-        try:
-            bs = load_page(url, self.html_parser)
-        except:
-            self.logger.error('Could not extract {} page'.format(url))
-            return
-
-        # name
-        try:
-            data[DataKeys.NAME] = bs.find('h1', {'class': 'page-details__title'}).text.strip()
-        except AttributeError:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'ICO name'))
-
-        # logo
-        try:
-            logo_path = bs.find('img', {'class': 'page-details__logo'})['src']
-            data[DataKeys.LOGO_PATH] = load_image(urljoin(self.domain, logo_path), ScraperBase.logo_tmp_path)
-        except AttributeError:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'ICO logo'))
-        except Exception as e:
-            self.logger.error('could not download {} logo with: {}'.format(url, str(e)))
-
-        # overall scores
-        try:
-            score = bs.find('div', {'class': 'rating_block'}).find('span', {'class': 'rating-text'}).text.strip()
-            if score != '0':
-                data[DataKeys.OVERALL_SCORE] = score
-        except (AttributeError, ValueError):
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'Overall score'))
-
-        # social links
-        soc_mapping = {'Facebook': DataKeys.FACEBOOK_URL, 'Github': DataKeys.GITHUB_URL,
-                       'Blog': DataKeys.MEDIUM_URL,
-                       'Telegram': DataKeys.TELEGRAM_URL, 'Reddit': DataKeys.REDDIT_URL,
-                       'Bitcoin Talk': DataKeys.BITCOINTALK_URL,
-                       'Website': DataKeys.WEBSITE, 'Linkedin': DataKeys.LINKEDIN_URL,
-                       'Twitter': DataKeys.TWITTER_URL}
-
-        try:
-            soc_tags = bs.find('div', {'class': 'page-details__main'})
-            if soc_tags:
-                for key, _ in soc_mapping.items():
-                    target = soc_tags.find('a', {'title': key})
-                    if target and target.has_attr('href'):
-                        data[soc_mapping[key]] = target['href']
-        except:
-            self.logger.error('Something went wrong in {}, when scraping social links'.format(url))
+        bs = self.make_soup(content)
 
-        # details
-        details_mapping = {'START DATE': DataKeys.ICO_START, 'CLOSE DATE': DataKeys.ICO_END,
-                           'TOKEN SYMBOL': DataKeys.TOKEN_NAME,
-                           'SMART CONTRACT BLOCKCHAIN': DataKeys.PLATFORM, 'AMOUNT RAISED': DataKeys.RAISED}
-        try:
-            details = bs.findAll('div', {'class': 'page-details__info-row'})
-            for detail in details:
-                title = detail.find('h3', {'class': 'page-details__info-title'}, text=True)
-                if title and title.text.strip().upper() in details_mapping:
-                    value = title.find_next_sibling('div', {'class': 'page-details__info-descr'}, text=True)
-                    if value:
-                        data[details_mapping[title.text.strip().upper()]] = value.text.strip()
-        except:
-            self.logger.error('Something went wrong in {}, when scraping detail rows'.format(url))
-
-        # description
-        try:
-            div_tag = bs.find('div', {'class': 'show-more-wrap show-more--big2'})
-            description_tag = div_tag.find('h2', text=True)
-            if description_tag:
-                data[DataKeys.DESCRIPTION] = description_tag.text.strip()
-        except:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'Description'))
+        self.fields.extract(bs, data, url, self.logger)
 
         # review scores
         try:
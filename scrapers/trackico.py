@@ -1,33 +1,68 @@
-import math
+import logging
 import re
-from multiprocessing.dummy import Lock
-from multiprocessing.pool import ThreadPool
 from urllib.request import URLError
-from urllib.request import urljoin
-
-import tqdm
 
 from scrapers.base_scraper import ScraperBase
 from scrapers.data_keys import BOOL_VALUES
 from scrapers.data_keys import DataKeys
 from scrapers.data_keys import SOURCES
 from scrapers.dataprocessor import convert_scale
-from utilities.proxy_generator import get_paied_proxies
-from utilities.utils import load_page
-from utilities.utils import load_image
+from scrapers.field_spec import Field
+from scrapers.field_spec import FieldSpec
+from scrapers.field_spec import Labels
+from scrapers.field_spec import text_of
 from utilities.utils import load_page_via_proxies
 
 
+def sale_dates(td):
+    dates = td.text.strip().split('-')
+    return dates[0].strip().split()[-1], dates[1].strip().split()[-1]
+
+
+def social_name(link):
+    # social pages are named in onclick handlers, e.g. "ga('send', 'event', 'link-twitter')"
+    candidate_spl = link['onclick'].split('link-')
+    if len(candidate_spl) <= 1:
+        candidate_spl = link['onclick'].split('button-')
+    return re.sub('[^\w]', '', candidate_spl[1]).lower()
+
+
 class TrackIco(ScraperBase):
+    # TODO: maybe will be necessary to add other community types
+    SOCIAL_MAPPING = {'bitcointalk': DataKeys.BITCOINTALK_URL,
+                      'twitter': DataKeys.TWITTER_URL, 'facebook': DataKeys.FACEBOOK_URL,
+                      'telegram': DataKeys.TELEGRAM_URL, 'github': DataKeys.GITHUB_URL,
+                      'reddit': DataKeys.REDDIT_URL, 'linkedin': DataKeys.LINKEDIN_URL,
+                      'homepage': DataKeys.WEBSITE, 'whitepaper': DataKeys.WHITEPAPER,
+                      'slack': DataKeys.SLACK_URL, 'blog': DataKeys.MEDIUM_URL,
+                      'youtube': DataKeys.YOUTUBE_URL, 'instagram': DataKeys.INSTAGRAM_URL}
+
+    # header cells of the details table, values are in the next cells
+    DETAILS_MAPPING = {'Pre-Sale': [(DataKeys.PRE_ICO_START, DataKeys.PRE_ICO_END), sale_dates],
+                       'Token Sale': [(DataKeys.ICO_START, DataKeys.ICO_END), sale_dates],
+                       'Country': [DataKeys.COUNTRY, lambda td: td.find('a').text.strip()],
+                       'Platform': [DataKeys.PLATFORM, lambda td: td.find('a').text.strip()],
+                       'Token': [DataKeys.TOKEN_NAME, text_of]}
+
+    regions = ('h1.h2', 'div.img-thumbnail', 'div.fs-14', 'table', 'div.fs-60', 'div.flexbox')
+
+    fields = FieldSpec(
+        Field(DataKeys.NAME, 'h1.h2', name='ICO name'),
+        Field(ScraperBase.LOGO_URL, 'img', attr='src', within='div.img-thumbnail.align-self-center.m-2',
+              name='ICO logo'),
+        Field(DataKeys.DESCRIPTION, 'div.fs-14', name='ICO description'),
+        Labels('th', DETAILS_MAPPING, label=lambda th: th.string,
+               value=lambda th: th.find_next_sibling('td'), name='ICO details', missing=logging.WARNING),
+        Field(DataKeys.OVERALL_SCORE, 'div.fs-60.fw-400.text-primary', name='ICO overall rating'),
+        Labels('a[onclick]', SOCIAL_MAPPING, within='div.flexbox.flex-wrap', label=social_name,
+               value=lambda a: a['href'].strip(), name='Social pages', missing=logging.WARNING),
+    )
 
     def __init__(self, max_threads=1, max_browsers=0, ):
 
         super(TrackIco, self).__init__(max_threads, max_browsers)
 
-        self.__mutex = Lock()
-        self.__proxies = get_paied_proxies()
-        self.__pr_len = len(self.__proxies)
-        self.__proxy_id = 0
+        self.use_proxies = True
 
         # should be 'firefox', 'chrome' or 'phantomjs'(headless)
         self.browser_name = None
@@ -41,185 +76,47 @@ class TrackIco(ScraperBase):
         self.urls = ['https://www.trackico.io']
         self.domain = 'https://www.trackico.io'
 
-    def scrape_listings_from_page(self, url):
-        # next page url from 'Next 'pagination tag
-
-        ip = self.__proxies[self.__proxy_id % self.__pr_len]
-        with self.__mutex:
-            self.__proxy_id += 1
+    def listings_of(self, bs):
+        return [self.urls[0] + a['href'] for a in bs.find('div', {'class': 'row equal-height'}).find_all('a')]
 
-        if self.__proxy_id > 1000000:
-            with self.__mutex:
-                self.__proxy_id = 0
+    def scrape_listings_from_page(self, url):
         try:
-            bs = load_page_via_proxies(url, self.html_parser, ip)
+            bs = load_page_via_proxies(url, self.html_parser, self.next_proxy(), self.next_proxy)
         except:
             self.logger.error('Error while scraping listings from %s', url)
             return
 
         try:
-            listings = bs.find('div', {'class': 'row equal-height'}).find_all('a')
+            return self.listings_of(bs)
         except AttributeError:
             self.logger.critical('Error while scraping listings from %s', url)
             return
 
-        listings_urls = []
-        for i in listings:
-            listings_urls.append(self.urls[0] + i['href'])
-
-        return listings_urls
-
-    def scrape_listings_via_queries(self, urls):
-        pool = ThreadPool(25)
-        print('Scraping listings')
-        listings_urls = list(tqdm.tqdm(pool.imap(self.scrape_listings_from_page, urls), total=len(urls)))
-        flat_list = [item for sublist in listings_urls for item in sublist]
-
-        pool.close()
-        pool.join()
-
-        return flat_list
-
     def scrape_listings(self, url):
-
-        # next page url from 'Next 'pagination tag
-        ip = self.__proxies[self.__proxy_id % self.__pr_len]
-        with self.__mutex:
-            self.__proxy_id += 1
-
-        if self.__proxy_id > 1000000:
-            with self.__mutex:
-                self.__proxy_id = 0
-
         try:
-            bs = load_page_via_proxies(url, self.html_parser, ip)
-            # bs = load_page(url, self.html_parser)
+            bs = load_page_via_proxies(url, self.html_parser, self.next_proxy(), self.next_proxy)
         except URLError:
             self.logger.critical('Timeout error while scraping listings from %s', url)
             return
 
-        pages_urls = [url]
-
         listings_count = int(
             bs.find('span', {'class': 'flex-grow text-right text-lighter pr-2'}).text.split('of')[1].strip()
         )
-        pages_count = int(math.ceil(listings_count / 24))  # because there is 24 listings in every page
-
-        for i in range(2, pages_count + 1):
-            pages_urls.append(url + '/{}/'.format(i))
 
-        return self.scrape_listings_via_queries(pages_urls)
+        # there are 24 listings in every page
+        return self.paginate(lambda page: url if page == 1 else url + '/{}/'.format(page),
+                             self.scrape_listings_from_page, total=listings_count, per_page=24,
+                             loaded={1: self.listings_of(bs)})
 
-    def scrape_profile(self, url):
+    def parse_profile(self, url, content):
 
         data = DataKeys.initialize()
         data[DataKeys.PROFILE_URL] = url
         data[DataKeys.SOURCE] = SOURCES.TRACKICO
 
-        ip = self.__proxies[self.__proxy_id % self.__pr_len]
-        with self.__mutex:
-            self.__proxy_id += 1
-
-        if self.__proxy_id > 1000000:
-            with self.__mutex:
-                self.__proxy_id = 0
-
-        try:
-            # bs = load_page(url, self.html_parser)
-            bs = load_page_via_proxies(url, self.html_parser, proxy=ip)
-        except:
-            self.logger.warning('Could not scrape profile {}'.format(url))
-            return
-
-        # ICO NAME
-        try:
-            data[DataKeys.NAME] = bs.select_one('h1.h2').text.strip()
-        except AttributeError:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'ICO name'))
-
-        # ICO Logo
-        try:
-            logo = bs.select_one('div.img-thumbnail.align-self-center.m-2').find('img')['src']
-            if 'data:image' not in logo:
-                data[DataKeys.LOGO_PATH] = load_image(urljoin(self.domain, logo), ScraperBase.logo_tmp_path)
-            else:
-                data[DataKeys.LOGO_PATH] = load_image(logo, ScraperBase.logo_tmp_path)
-
-        except AttributeError:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'ICO logo'))
-        except Exception as e:
-            self.logger.error('could not download {} logo with: {}'.format(url, str(e)))
-
-        try:
-            data[DataKeys.DESCRIPTION] = bs.select_one('div.fs-14').text.strip()
-        except AttributeError:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'ICO description'))
-
-        try:
-            pre_ico_dates = bs.find('th', text='Pre-Sale').findNextSibling('td').text.strip()
-            data[DataKeys.PRE_ICO_START] = pre_ico_dates.split('-')[0].strip().split()[-1]
-            data[DataKeys.PRE_ICO_END] = pre_ico_dates.split('-')[1].strip().split()[-1]
-        except (AttributeError, IndexError):
-            self.logger.debug(self.NOT_FOUND_MSG.format(url, 'Pre ICO dates'))
-
-        try:
-            ico_dates = bs.find('th', text='Token Sale').findNextSibling('td').text.strip()
-            data[DataKeys.ICO_START] = ico_dates.split('-')[0].strip().split()[-1]
-            data[DataKeys.ICO_END] = ico_dates.split('-')[1].strip().split()[-1]
-        except (AttributeError, IndexError):
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'ICO dates'))
-
-        try:
-            data[DataKeys.COUNTRY] = bs.find('th', text='Country').findNextSibling('td').find('a').text.strip()
-        except AttributeError:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'ICO country'))
-
-        try:
-            data[DataKeys.PLATFORM] = bs.find('th', text='Platform').findNextSibling('td').find('a').text.strip()
-        except AttributeError:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'ICO platform'))
-
-        try:
-            data[DataKeys.TOKEN_NAME] = bs.find('th', text='Token').findNextSibling('td').text.strip()
-        except AttributeError:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'ICO token name'))
-
-        try:
-            data[DataKeys.OVERALL_SCORE] = bs.select_one('div.fs-60.fw-400.text-primary').text.strip()
-        except AttributeError:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'ICO overall rating'))
-
-        # getting social pages
-        # TODO: maybe will be necessary to add other community types
-        map_ = {'bitcointalk': DataKeys.BITCOINTALK_URL,
-                'twitter': DataKeys.TWITTER_URL, 'facebook': DataKeys.FACEBOOK_URL,
-                'telegram': DataKeys.TELEGRAM_URL, 'github': DataKeys.GITHUB_URL,
-                'reddit': DataKeys.REDDIT_URL, 'linkedin': DataKeys.LINKEDIN_URL,
-                'homepage': DataKeys.WEBSITE, 'whitepaper': DataKeys.WHITEPAPER,
-                'slack': DataKeys.SLACK_URL, 'blog': DataKeys.MEDIUM_URL,
-                'youtube': DataKeys.YOUTUBE_URL, 'instagram': DataKeys.INSTAGRAM_URL}
-
-        social_pages_div = bs.select_one('div.flexbox.flex-wrap')
-        if social_pages_div:
-            social_pages_ = social_pages_div.find_all('a')
-            for page_ in social_pages_:
-                if page_.has_attr('onclick'):
-                    candidate_spl = page_['onclick'].split('link-')
-
-                    if len(candidate_spl) <= 1:
-                        candidate_spl = page_['onclick'].split('button-')
-
-                    if len(candidate_spl) > 1:
-                        cand = candidate_spl[1]
-                        soc_ = re.sub('[^\w]', '', cand).lower()
-                        if soc_ in map_:
-                            value_ = page_['href'].strip()
-                            key_ = map_[soc_]
-                            data[key_] = value_
-
-        else:
-            self.logger.warning(self.NOT_FOUND_MSG.format(url, 'Social pages div'))
+        bs = self.make_soup(content)
 
+        self.fields.extract(bs, data, url, self.logger)
 
         # try:
         #     social_pages = bs.find('div', {'class': 'card card-body text-center'}).find_all('a')
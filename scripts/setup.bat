@@ -9,3 +9,6 @@ pip3 install Flask-MySQLDb
 pip3 install tqdm
 pip3 install pycountry
 pip3 install cfscrape
+pip3 install aiohttp
+pip3 install selectolax
+pip3 install psutil
@@ -18,6 +18,9 @@ Flask-MySQLDb
 tqdm
 pycountry
 cfscrape
+aiohttp
+selectolax
+psutil
 "
 
 install_python_dependencies() 
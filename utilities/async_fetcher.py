@@ -0,0 +1,152 @@
+import asyncio
+import logging
+from urllib.parse import urlsplit
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from utilities.http_client import split_proxy
+from utilities.retry import RequestError
+from utilities.utils import concurrency_controller
+from utilities.utils import is_good_status
+from utilities.utils import page_archive
+from utilities.utils import raw_page
+from utilities.utils import rand_user_agnet
+from utilities.utils import report_proxy
+from utilities.utils import response_cache
+from utilities.utils import request_scheduler
+from utilities.utils import retry_policy
+
+
+class AsyncFetcher:
+    """Loads many pages concurrently on a single event loop.
+
+    Every downloaded page is handed to `handle(url, content)` which runs in the given executor, so parsing does not
+    block the loop and the loop keeps hundreds of requests in flight with a handful of threads.
+    """
+
+    def __init__(self, concurrency=200, domain_concurrency=50, timeout=15, max_body_size=-1):
+        # max_body_size: max size of decoded page in bytes, -1 for unlimited
+        self.concurrency = concurrency
+        self.domain_concurrency = domain_concurrency
+        self.timeout = timeout
+        self.max_body_size = max_body_size
+
+        self.__domains = {}
+
+    @staticmethod
+    def available():
+        return aiohttp is not None
+
+    def __domain_semaphore(self, url):
+        domain = urlsplit(url).netloc
+        if domain not in self.__domains:
+            self.__domains[domain] = asyncio.Semaphore(self.domain_concurrency)
+        return self.__domains[domain]
+
+    async def __read(self, response, url):
+        # aiohttp decompresses gzip and deflate (and br with brotli) bodies itself
+        data = bytearray()
+        async for chunk in response.content.iter_chunked(65536):
+            data += chunk
+            if self.max_body_size != -1 and len(data) > self.max_body_size:
+                raise RequestError('Page is larger than {} bytes: {}'.format(self.max_body_size, url),
+                                   retryable=False)
+        return bytes(data)
+
+    async def __fetch(self, session, url, proxy):
+        loop = asyncio.get_event_loop()
+        kwargs = {'headers': {'user-agent': rand_user_agnet(proxy)}}
+        if proxy is not None:
+            ip, port, auth = split_proxy(proxy)
+            kwargs['proxy'] = 'http://' + ip + ':' + port
+            if auth:
+                kwargs['proxy_auth'] = aiohttp.BasicAuth(*auth.split(':', 1))
+
+        # cached pages are revalidated as in page loaders of threads, files are read outside of the loop
+        cache = response_cache()
+        cached = None if cache is None else await loop.run_in_executor(None, cache.get, url)
+        if cached:
+            kwargs['headers'].update(cache.conditional_headers(cached[0]))
+
+        # adaptive limit of the domain, 'domain_concurrency' of the source is its upper bound, see configure_source
+        limiter = await concurrency_controller().acquire_async(url)
+        try:
+            status, headers, data = await self.__send(session, url, proxy, kwargs, loop, cached)
+        finally:
+            if limiter is not None:
+                limiter.release()
+
+        if cache is not None:
+            status, headers, data = await loop.run_in_executor(None, cache.resolve, url, cached, status, headers, data)
+
+        archive = page_archive()
+        if archive is not None:
+            archive.record(url, headers.get('Content-Type'), data)
+
+        return raw_page(data, headers.get('Content-Type'))
+
+    async def __send(self, session, url, proxy, kwargs, loop, cached):
+        # returns (status, headers, body), body is None for 304 response to revalidation of cached page
+        async with self.__domain_semaphore(url):
+            delay = request_scheduler().delay(url, proxy)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            started = loop.time()
+            try:
+                async with session.get(url, **kwargs) as response:
+                    latency = loop.time() - started
+                    concurrency_controller().record(url, latency, is_good_status(response.status))
+                    report_proxy(proxy, is_good_status(response.status), latency, response.status)
+                    if response.status == 304 and cached:
+                        return response.status, response.headers, None
+                    if response.status != 200:
+                        raise RequestError('Bad request status {} from: {}'.format(response.status, url),
+                                           response.status, response.status not in (404, 410))
+                    return response.status, response.headers, await self.__read(response, url)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                concurrency_controller().record(url, ok=False)
+                report_proxy(proxy, ok=False)
+                raise RequestError('Timeout error while requesting: {}'.format(url))
+
+    async def __process(self, session, executor, handle, url, proxy, next_proxy, progress):
+        loop = asyncio.get_event_loop()
+        try:
+            content = await retry_policy().call_async(url, lambda attempt: self.__fetch(
+                session, url, proxy if attempt == 0 or next_proxy is None else next_proxy()))
+            return await loop.run_in_executor(executor, handle, url, content)
+        except Exception as e:
+            logging.error('Could not scrape {}: {}'.format(url, str(e)))
+        finally:
+            if progress:
+                progress.update()
+
+    async def __run(self, requests, handle, executor, next_proxy, progress):
+        self.__domains = {}
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.domain_concurrency, ssl=False)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            loop = asyncio.get_event_loop()
+            tasks = []
+            requests = iter(requests)
+            while True:
+                # requests may be given while listings are scraped, they are waited for outside of the loop
+                request = await loop.run_in_executor(None, next, requests, None)
+                if request is None:
+                    break
+                url, proxy = request
+                tasks.append(asyncio.ensure_future(
+                    self.__process(session, executor, handle, url, proxy, next_proxy, progress)))
+            return await asyncio.gather(*tasks)
+
+    def run(self, requests, handle, executor, next_proxy=None, progress=None):
+        # requests: iterable of (url, proxy) pairs, proxy may be None, failed requests are retried through next_proxy()
+        # returns list of handle results in the order of requests, None for failed ones
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self.__run(requests, handle, executor, next_proxy, progress))
+        finally:
+            loop.close()
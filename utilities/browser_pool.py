@@ -0,0 +1,160 @@
+import atexit
+import contextlib
+import logging
+import threading
+
+
+class BrowserPool:
+    """Pool of running WebDriver browsers shared by all scrapers.
+
+    Starting a browser takes seconds, so browsers are kept running and reused instead of being started for every
+    page. At most `size` browsers of all kinds run at once, callers wait for a free one. A browser is checked before it
+    is given out and replaced if it does not respond, its cookies and storage are cleared when it is returned and it is
+    restarted after `max_pages` uses to keep memory of long running browsers bounded.
+    """
+
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    def __init__(self, create, size=2, max_pages=50):
+        # create(name) starts a browser by its name, e.g. 'firefox' or 'phantomjs'
+        self.create = create
+        self.size = size
+        self.max_pages = max_pages
+
+        # name -> idle browsers
+        self.__idle = {}
+        # number of running browsers, idle and checked out
+        self.__running = 0
+        self.__condition = threading.Condition()
+
+        self.started = 0
+
+    @classmethod
+    def instance(cls, *args, **kwargs):
+        # options are taken only from the first call, all later callers share the same pool
+        if cls.__instance is None:
+            with cls.__instance_lock:
+                if cls.__instance is None:
+                    cls.__instance = cls(*args, **kwargs)
+                    # browsers are separate processes which outlive the scraper if they are not closed
+                    atexit.register(cls.__instance.close)
+        return cls.__instance
+
+    @staticmethod
+    def __quit(driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    @staticmethod
+    def is_healthy(driver):
+        try:
+            driver.execute_script('return 1')
+            return True
+        except Exception:
+            return False
+
+    def __take(self, name):
+        # returns (idle browser of the name, True if a new one may be started or None if the caller has to wait,
+        # idle browser of another kind to quit); called with the condition held
+        idle = self.__idle.get(name)
+        if idle:
+            return idle.pop(), None
+
+        if self.__running < self.size:
+            self.__running += 1
+            return True, None
+
+        # all places are taken, an idle browser of another kind gives its place
+        for other in self.__idle.values():
+            if other:
+                return True, other.pop()
+        return None, None
+
+    def checkout(self, name):
+        with self.__condition:
+            driver, evicted = self.__take(name)
+            while driver is None:
+                self.__condition.wait()
+                driver, evicted = self.__take(name)
+
+        if evicted is not None:
+            self.__quit(evicted)
+
+        if driver is not True:
+            if self.is_healthy(driver):
+                return driver
+            logging.debug('{} browser does not respond, restarting it'.format(name))
+            self.__quit(driver)
+
+        try:
+            driver = self.create(name)
+        except Exception:
+            self.__release()
+            raise
+
+        driver.pool_name = name
+        driver.pool_pages = 0
+        with self.__condition:
+            self.started += 1
+        return driver
+
+    def __reset(self, driver):
+        # state of the last page should not leak to the next user, e.g. sessions or consent cookies
+        driver.delete_all_cookies()
+        try:
+            driver.execute_script('window.localStorage.clear(); window.sessionStorage.clear();')
+        except Exception:
+            # storage is not available on some pages, e.g. about:blank or file urls
+            pass
+        driver.get('about:blank')
+
+    def checkin(self, driver):
+        driver.pool_pages += 1
+        if driver.pool_pages >= self.max_pages:
+            self.discard(driver)
+            return
+
+        try:
+            self.__reset(driver)
+        except Exception:
+            self.discard(driver)
+            return
+
+        with self.__condition:
+            self.__idle.setdefault(driver.pool_name, []).append(driver)
+            self.__condition.notify()
+
+    def __release(self):
+        with self.__condition:
+            self.__running -= 1
+            self.__condition.notify()
+
+    def discard(self, driver):
+        self.__quit(driver)
+        self.__release()
+
+    @contextlib.contextmanager
+    def browser(self, name):
+        # with pool.browser('firefox') as driver: ..., the browser is replaced if the block fails as its state is
+        # not known then
+        driver = self.checkout(name)
+        try:
+            yield driver
+        except BaseException:
+            self.discard(driver)
+            raise
+        self.checkin(driver)
+
+    def close(self):
+        # quits idle browsers, the pool starts new ones if it is used again
+        with self.__condition:
+            drivers = [driver for idle in self.__idle.values() for driver in idle]
+            self.__idle.clear()
+            self.__running -= len(drivers)
+            self.__condition.notify_all()
+
+        for driver in drivers:
+            self.__quit(driver)
@@ -0,0 +1,188 @@
+import asyncio
+import collections
+import threading
+import time
+from contextlib import contextmanager
+
+from utilities.rate_limiter import domain_of
+
+
+class AimdLimiter:
+    """Adaptive limit of requests in flight to one site.
+
+    Every successful request raises the limit by 1/limit, i.e. by one per round of requests, while errors, bot
+    rejections and bad statuses halve it. Successes much slower than the fastest seen latency keep the limit as is,
+    so the limit settles at the point where the site starts to slow down instead of where it starts to ban.
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=50, decrease=0.5, latency_factor=3.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.limit = float(min(max(initial, minimum), maximum))
+
+        self.__in_flight = 0
+        self.__min_latency = None
+        self.__last_decrease = 0.0
+        self.__condition = threading.Condition()
+        # (loop, future) of coroutines waiting in acquire_async
+        self.__waiters = collections.deque()
+
+        self.successes = 0
+        self.failures = 0
+
+    def acquire(self):
+        with self.__condition:
+            while self.__in_flight >= int(self.limit):
+                self.__condition.wait()
+            self.__in_flight += 1
+
+    async def acquire_async(self):
+        # as acquire, but waits on the event loop instead of blocking it; when the limit is lowered new requests wait
+        # until the ones in flight go below it
+        loop = asyncio.get_event_loop()
+        while True:
+            with self.__condition:
+                if self.__in_flight < int(self.limit):
+                    self.__in_flight += 1
+                    return
+                waiter = loop.create_future()
+                self.__waiters.append((loop, waiter))
+
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self.__condition:
+                    if (loop, waiter) in self.__waiters:
+                        self.__waiters.remove((loop, waiter))
+                    else:
+                        # the wake up was meant for this coroutine, it is passed to the next one
+                        self.__wake(1)
+                raise
+
+    def __wake(self, count=None):
+        # wakes up coroutines waiting in acquire_async, called with the condition held
+        while self.__waiters and (count is None or count > 0):
+            loop, waiter = self.__waiters.popleft()
+            loop.call_soon_threadsafe(lambda w=waiter: w.done() or w.set_result(None))
+            if count is not None:
+                count -= 1
+
+    def set_maximum(self, maximum):
+        # the limit is clamped at once, not on the next recorded request
+        with self.__condition:
+            self.maximum = maximum
+            self.limit = max(float(self.minimum), min(self.limit, float(maximum)))
+
+    def release(self):
+        with self.__condition:
+            self.__in_flight -= 1
+            self.__condition.notify()
+            self.__wake(1)
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def record(self, latency=None, ok=True):
+        with self.__condition:
+            if ok:
+                self.successes += 1
+                if latency is not None:
+                    if self.__min_latency is None or latency < self.__min_latency:
+                        self.__min_latency = latency
+                    if latency > self.latency_factor * self.__min_latency:
+                        return
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            else:
+                self.failures += 1
+                # requests sent before the previous decrease fail together, count them as one congestion signal
+                now = time.monotonic()
+                if now - self.__last_decrease < (self.__min_latency or 1.0):
+                    return
+                self.__last_decrease = now
+                self.limit = max(self.minimum, self.limit * self.decrease)
+
+            self.__condition.notify_all()
+            self.__wake()
+
+
+class ConcurrencyController:
+    """Keeps one AimdLimiter per domain, shared by scrapers and page loaders."""
+
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    def __init__(self, initial=4, minimum=1, enabled=True, maximum=50):
+        self.initial = initial
+        self.minimum = minimum
+        self.enabled = enabled
+        # upper bound of limits of domains which are not configured
+        self.maximum = maximum
+
+        self.__limiters = {}
+        # domain -> upper bound of its limit, see configure
+        self.__maxima = {}
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def instance(cls, *args, **kwargs):
+        # options are taken only from the first call, all later callers share the same controller
+        if cls.__instance is None:
+            with cls.__instance_lock:
+                if cls.__instance is None:
+                    cls.__instance = cls(*args, **kwargs)
+        return cls.__instance
+
+    def configure(self, url, maximum):
+        # sets upper bound of the limit of the domain of url, the same for all engines and callers
+        domain = domain_of(url)
+        with self.__lock:
+            self.__maxima[domain] = maximum
+            limiter = self.__limiters.get(domain)
+        if limiter is not None:
+            limiter.set_maximum(maximum)
+
+    def limiter(self, url):
+        domain = domain_of(url)
+        with self.__lock:
+            limiter = self.__limiters.get(domain)
+            if limiter is None:
+                limiter = self.__limiters[domain] = AimdLimiter(self.initial, self.minimum,
+                                                                self.__maxima.get(domain, self.maximum))
+            return limiter
+
+    @contextmanager
+    def slot(self, url):
+        # limits number of tasks working with the domain of url at the same time
+        if not self.enabled:
+            yield
+            return
+
+        with self.limiter(url).slot():
+            yield
+
+    async def acquire_async(self, url):
+        # slot for coroutines, returns the limiter to release or None if the limit is disabled
+        if not self.enabled:
+            return None
+
+        limiter = self.limiter(url)
+        await limiter.acquire_async()
+        return limiter
+
+    def record(self, url, latency=None, ok=True):
+        self.limiter(url).record(latency, ok)
+
+    def report_blocked(self, url):
+        self.limiter(url).record(ok=False)
+
+    def stats(self):
+        with self.__lock:
+            return {domain: {'limit': round(limiter.limit, 1), 'successes': limiter.successes,
+                             'failures': limiter.failures} for domain, limiter in self.__limiters.items()}
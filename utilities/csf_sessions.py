@@ -0,0 +1,117 @@
+import threading
+import time
+
+import cfscrape
+
+from utilities.rate_limiter import domain_of
+
+
+class CsfSessions:
+    """Pool of cfscrape sessions which already passed the Cloudflare challenge, kept per domain.
+
+    Creating a scraper for every request solves the challenge and opens new connections every time. Pooled sessions
+    keep their clearance cookies and connections, a session is replaced only when its clearance expires, it is older
+    than `ttl` seconds or the site challenges it again.
+    """
+
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    def __init__(self, size=4, ttl=1800):
+        # size: max number of sessions per domain, requests wait for a free session when all are busy
+        self.size = size
+        self.ttl = ttl
+
+        # domain -> [idle sessions, number of sessions, condition]
+        self.__domains = {}
+        self.__lock = threading.Lock()
+
+        self.created = 0
+
+    @classmethod
+    def instance(cls, *args, **kwargs):
+        # options are taken only from the first call, all later callers share the same pool
+        if cls.__instance is None:
+            with cls.__instance_lock:
+                if cls.__instance is None:
+                    cls.__instance = cls(*args, **kwargs)
+        return cls.__instance
+
+    def __domain(self, url):
+        domain = domain_of(url)
+        with self.__lock:
+            if domain not in self.__domains:
+                self.__domains[domain] = [[], 0, threading.Condition()]
+            return self.__domains[domain]
+
+    def __expired(self, session):
+        if time.time() - session.created > self.ttl:
+            return True
+        return any(c.name == 'cf_clearance' and c.is_expired() for c in session.cookies)
+
+    def __create(self):
+        session = cfscrape.create_scraper()
+        session.created = time.time()
+        with self.__lock:
+            self.created += 1
+        return session
+
+    def checkout(self, url):
+        pool = self.__domain(url)
+        idle, _, condition = pool
+        with condition:
+            while True:
+                while idle:
+                    session = idle.pop()
+                    if not self.__expired(session):
+                        return session
+                    session.close()
+                    pool[1] -= 1
+
+                if pool[1] < self.size:
+                    pool[1] += 1
+                    break
+                condition.wait()
+
+        try:
+            return self.__create()
+        except Exception:
+            self.discard(url, None)
+            raise
+
+    def checkin(self, url, session):
+        idle, _, condition = self.__domain(url)
+        with condition:
+            idle.append(session)
+            condition.notify()
+
+    def discard(self, url, session):
+        pool = self.__domain(url)
+        if session is not None:
+            session.close()
+        with pool[2]:
+            pool[1] -= 1
+            pool[2].notify()
+
+    @staticmethod
+    def is_challenge(response):
+        return cfscrape.CloudflareScraper.is_cloudflare_iuam_challenge(response) or \
+            cfscrape.CloudflareScraper.is_cloudflare_captcha_challenge(response)
+
+    def get(self, url, **kwargs):
+        # the request is repeated once with new session if the site challenges the pooled one
+        for attempt in range(2):
+            session = self.checkout(url)
+            try:
+                response = session.get(url, **kwargs)
+            except Exception:
+                self.discard(url, session)
+                raise
+
+            if not self.is_challenge(response):
+                self.checkin(url, session)
+                return response
+
+            self.discard(url, session)
+            if attempt == 1:
+                return response
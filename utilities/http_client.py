@@ -0,0 +1,190 @@
+import logging
+import threading
+from collections import OrderedDict
+
+import urllib3
+from urllib3 import make_headers
+
+urllib3.disable_warnings()
+
+# 'gzip,deflate' and 'br' if brotli is installed, urllib3 decodes all of them
+ACCEPT_ENCODING = make_headers(accept_encoding=True)['accept-encoding']
+
+
+class BodyTooLargeError(Exception):
+    pass
+
+
+def split_proxy(proxy):
+    # proxies are stored as 'ip:port:user:password' or 'ip:port'
+    proxy_prop = proxy.split(':')
+    auth = proxy_prop[2] + ':' + proxy_prop[3] if len(proxy_prop) >= 4 else None
+    return proxy_prop[0], proxy_prop[1], auth
+
+
+class ProxyManagers:
+    """Registry which keeps one long-lived urllib3.ProxyManager per proxy endpoint.
+
+    The opened CONNECT tunnels stay in the manager pools and are reused by the next requests through the same proxy.
+    Proxies failing `max_failures` times in a row are evicted together with their connections.
+    """
+
+    def __init__(self, maxsize=2, max_proxies=200, max_failures=3):
+        # maxsize: number of idle connections kept per proxy and target host
+        # max_proxies: number of proxy managers kept at the same time, least recently used are closed first
+        self.maxsize = maxsize
+        self.max_proxies = max_proxies
+        self.max_failures = max_failures
+
+        self.__managers = OrderedDict()
+        self.__failures = {}
+        # counters of already closed managers: proxy -> [requests, connections]
+        self.__retired = {}
+        self.evicted = 0
+
+        self.__lock = threading.Lock()
+
+    def __create(self, proxy):
+        ip, port, auth = split_proxy(proxy)
+        proxy_headers = make_headers(proxy_basic_auth=auth) if auth else None
+        # proxy_headers are sent both with CONNECT requests and with plain http requests forwarded by proxy
+        return urllib3.ProxyManager('http://' + ip + ':' + port, num_pools=10, maxsize=self.maxsize, block=False,
+                                    proxy_headers=proxy_headers)
+
+    @staticmethod
+    def __count(manager):
+        requests = connections = 0
+        for key in manager.pools.keys():
+            pool = manager.pools.get(key)
+            if pool:
+                requests += pool.num_requests
+                connections += pool.num_connections
+        return requests, connections
+
+    def __retire(self, proxy, manager):
+        requests, connections = self.__count(manager)
+        retired = self.__retired.setdefault(proxy, [0, 0])
+        retired[0] += requests
+        retired[1] += connections
+        manager.clear()
+
+    def get(self, proxy):
+        with self.__lock:
+            manager = self.__managers.get(proxy)
+            if manager is None:
+                manager = self.__managers[proxy] = self.__create(proxy)
+                if len(self.__managers) > self.max_proxies:
+                    self.__retire(*self.__managers.popitem(last=False))
+            else:
+                self.__managers.move_to_end(proxy)
+        return manager
+
+    def report_success(self, proxy):
+        self.__failures[proxy] = 0
+
+    def report_failure(self, proxy):
+        with self.__lock:
+            failures = self.__failures[proxy] = self.__failures.get(proxy, 0) + 1
+            if failures >= self.max_failures and proxy in self.__managers:
+                self.__retire(proxy, self.__managers.pop(proxy))
+                self.__failures[proxy] = 0
+                self.evicted += 1
+                logging.debug('Proxy {} evicted after {} failures in a row'.format(proxy, failures))
+
+    def stats(self):
+        with self.__lock:
+            stats = {proxy: list(counts) for proxy, counts in self.__retired.items()}
+            for proxy, manager in self.__managers.items():
+                requests, connections = self.__count(manager)
+                counts = stats.setdefault(proxy, [0, 0])
+                counts[0] += requests
+                counts[1] += connections
+
+        return {proxy: {'requests': requests, 'tunnels': connections, 'reused': max(requests - connections, 0)}
+                for proxy, (requests, connections) in stats.items()}
+
+    def log_stats(self):
+        stats = self.stats()
+        requests = sum(s['requests'] for s in stats.values())
+        tunnels = sum(s['tunnels'] for s in stats.values())
+        if requests:
+            logging.info('Proxies: {} requests through {} proxies, {} tunnels opened, {:.1f}% reused, {} evicted'.format(
+                requests, len(stats), tunnels, 100.0 * max(requests - tunnels, 0) / requests, self.evicted))
+
+    def clear(self):
+        with self.__lock:
+            for proxy, manager in self.__managers.items():
+                self.__retire(proxy, manager)
+            self.__managers.clear()
+
+
+class HttpClient:
+    """Process-wide HTTP client shared by all page loaders.
+
+    Keeps a keep-alive connection pool per host, so consecutive requests to the same site reuse already opened
+    TCP/TLS connections instead of paying a handshake for every page. Proxied requests go through `ProxyManagers`
+    which does the same for proxy tunnels.
+    """
+
+    __instance = None
+    __lock = threading.Lock()
+
+    # failed requests are retried by page loaders, urllib3 only follows redirects
+    retries = urllib3.Retry(total=10, connect=0, read=0, redirect=10)
+
+    def __init__(self, num_pools=50, maxsize=25, proxy_maxsize=2, max_proxy_failures=3, max_body_size=-1):
+        # num_pools: number of hosts kept open at the same time
+        # maxsize: number of keep-alive connections per host, should be close to number of threads
+        # max_body_size: max size of decoded response body in bytes, -1 for unlimited
+        self.num_pools = num_pools
+        self.maxsize = maxsize
+        self.max_body_size = max_body_size
+        self.__manager = urllib3.PoolManager(num_pools=num_pools, maxsize=maxsize, block=False)
+        self.proxies = ProxyManagers(maxsize=proxy_maxsize, max_failures=max_proxy_failures)
+
+    @classmethod
+    def instance(cls, *args, **kwargs):
+        # pool sizes are taken only from the first call, all later callers share the same client
+        if cls.__instance is None:
+            with cls.__lock:
+                if cls.__instance is None:
+                    cls.__instance = cls(*args, **kwargs)
+        return cls.__instance
+
+    def __read(self, response, url):
+        # reads compressed body in chunks, so too large pages are dropped before they are loaded completely
+        body = bytearray()
+        try:
+            for chunk in response.stream(65536, decode_content=True):
+                body += chunk
+                if self.max_body_size != -1 and len(body) > self.max_body_size:
+                    # connection with unread body can not be reused
+                    response.close()
+                    raise BodyTooLargeError('Page is larger than {} bytes: {}'.format(self.max_body_size, url))
+        finally:
+            response.release_conn()
+        return bytes(body)
+
+    def request(self, url, headers=None, timeout=15, proxy=None):
+        # returns (status, headers, body), body is decompressed
+        headers = dict({'accept-encoding': ACCEPT_ENCODING}, **(headers or {}))
+        if proxy is None:
+            response = self.__manager.urlopen('GET', url, headers=headers, timeout=timeout, retries=self.retries,
+                                              preload_content=False)
+            return response.status, response.headers, self.__read(response, url)
+
+        manager = self.proxies.get(proxy)
+        try:
+            response = manager.urlopen('GET', url, headers=headers, timeout=timeout, retries=self.retries,
+                                       preload_content=False)
+            body = self.__read(response, url)
+        except urllib3.exceptions.HTTPError:
+            self.proxies.report_failure(proxy)
+            raise
+
+        self.proxies.report_success(proxy)
+        return response.status, response.headers, body
+
+    def clear(self):
+        self.__manager.clear()
+        self.proxies.clear()
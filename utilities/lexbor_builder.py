@@ -0,0 +1,101 @@
+import codecs
+
+from bs4.builder import HTMLTreeBuilder
+from bs4.builder import PERMISSIVE
+from bs4.builder import builder_registry
+from bs4.dammit import UnicodeDammit
+from bs4.element import Comment
+from bs4.element import Doctype
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+
+class LexborTreeBuilder(HTMLTreeBuilder):
+    """BeautifulSoup tree builder which parses pages with lexbor (selectolax).
+
+    Lexbor is a HTML5 parser written in C, so it builds the same tree as html5lib many times faster. The tree is then
+    converted to usual bs4 objects, so scrapers work with it as with any other parser: BeautifulSoup(html, 'lexbor').
+    With PageRegions as parse_only only the regions are converted, which is most of the time of a parse.
+    """
+
+    NAME = 'lexbor'
+    ALTERNATE_NAMES = ['selectolax']
+    features = [NAME, 'selectolax', PERMISSIVE, 'html', 'fast']
+
+    def prepare_markup(self, markup, user_specified_encoding=None, document_declared_encoding=None,
+                       exclude_encodings=None):
+        if isinstance(markup, str):
+            yield markup, None, None, False
+            return
+
+        # lexbor reads utf-8 bytes itself, so the page is not decoded to a str first
+        if user_specified_encoding and codecs.lookup(user_specified_encoding).name == 'utf-8':
+            yield markup, 'utf-8', None, False
+            return
+
+        known_encodings = [user_specified_encoding] if user_specified_encoding else []
+        dammit = UnicodeDammit(markup, known_encodings, is_html=True, exclude_encodings=exclude_encodings)
+        yield dammit.unicode_markup, dammit.original_encoding, dammit.declared_html_encoding, \
+            dammit.contains_replacement_characters
+
+    def feed(self, markup):
+        parser = LexborHTMLParser(markup)
+        # PageRegions strainer, only the regions are converted to bs4 objects then
+        selectors = getattr(self.soup.parse_only, 'selectors', None)
+        if not selectors:
+            self.__build(parser.root.parent.child, False)
+            return
+
+        regions = set()
+        for node in parser.css(', '.join(selectors)):
+            # nested regions are already built with their outer region
+            parent = node.parent
+            while parent is not None and parent.mem_id not in regions:
+                parent = parent.parent
+            if parent is None:
+                regions.add(node.mem_id)
+                self.__build(node, True)
+
+    def __build(self, node, subtree):
+        # depth first walk without recursion, stack keeps open tags; with subtree only the node itself is built,
+        # without it all its next siblings too
+        soup = self.soup
+        stack = []
+        while node is not None or stack:
+            if node is None:
+                parent = stack.pop()
+                soup.handle_endtag(parent.tag)
+                node = parent.next if stack or not subtree else None
+                continue
+
+            tag = node.tag
+            if tag == '-text':
+                soup.handle_data(node.text_content)
+            elif tag == '-comment':
+                soup.endData()
+                soup.handle_data(node.html[len('<!--'):-len('-->')])
+                soup.endData(Comment)
+            elif tag == '-doctype':
+                soup.endData()
+                soup.handle_data(node.html[len('<!DOCTYPE '):-1])
+                soup.endData(Doctype)
+            elif not tag.startswith('-'):
+                attrs = {name: '' if value is None else value for name, value in node.attributes.items()}
+                soup.handle_starttag(tag, None, None, attrs)
+                if node.child is not None:
+                    stack.append(node)
+                    node = node.child
+                    continue
+                soup.handle_endtag(tag)
+
+            node = node.next if stack or not subtree else None
+
+    def test_fragment_to_document(self, fragment):
+        return '<html><body>{}</body></html>'.format(fragment)
+
+
+if LexborHTMLParser is not None:
+    builder_registry.register(LexborTreeBuilder)
@@ -0,0 +1,109 @@
+import gzip
+import json
+import os
+import threading
+from urllib.parse import urlsplit
+
+
+class PageArchive:
+    """Append-only archive of raw loaded pages.
+
+    Every domain gets its own segment: '<domain>.pages.gz' with one gzip member per page, and '<domain>.index' with
+    one json line per page holding its url, offset and length in the segment. Profile urls requested by each scraper
+    are kept in 'profiles/<scraper>.txt', so the scrapers can be replayed against the archive without network.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        self.__segments = {}
+        self.__index = None
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def segment_name(url):
+        return urlsplit(url).netloc.lower().replace(':', '_') or 'unknown'
+
+    def __segment(self, name):
+        # returns [pages file, index file, lock] of the segment opened for appending
+        with self.__lock:
+            if name not in self.__segments:
+                os.makedirs(self.path, exist_ok=True)
+                self.__segments[name] = [open(self.path + os.sep + name + '.pages.gz', 'ab'),
+                                         open(self.path + os.sep + name + '.index', 'a'),
+                                         threading.Lock()]
+            return self.__segments[name]
+
+    def record(self, url, content_type, body):
+        pages, index, lock = self.__segment(self.segment_name(url))
+        data = gzip.compress(body)
+        with lock:
+            pages.seek(0, os.SEEK_END)
+            offset = pages.tell()
+            pages.write(data)
+            pages.flush()
+            index.write(json.dumps({'url': url, 'offset': offset, 'length': len(data),
+                                    'content_type': content_type}) + '\n')
+            index.flush()
+
+    def record_profiles(self, scraper, urls):
+        folder = self.path + os.sep + 'profiles'
+        os.makedirs(folder, exist_ok=True)
+        with self.__lock, open(folder + os.sep + scraper + '.txt', 'a') as f:
+            for url in urls:
+                f.write(url + '\n')
+
+    def profiles(self, scraper):
+        filename = self.path + os.sep + 'profiles' + os.sep + scraper + '.txt'
+        if not os.path.exists(filename):
+            return []
+
+        # list keeps the order of listings, set finds duplicates
+        urls = []
+        seen = set()
+        with open(filename) as f:
+            for line in f:
+                line = line.strip()
+                if line and line not in seen:
+                    seen.add(line)
+                    urls.append(line)
+        return urls
+
+    def __load_index(self):
+        index = {}
+        for name in os.listdir(self.path):
+            if not name.endswith('.index'):
+                continue
+            segment = name[:-len('.index')]
+            with open(self.path + os.sep + name) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # last line may be cut if the run was killed while writing
+                        continue
+                    # the latest copy of the page wins
+                    index[entry['url']] = (segment, entry['offset'], entry['length'], entry['content_type'])
+        return index
+
+    def load(self, url):
+        # returns (content type, body) of the archived page or None
+        with self.__lock:
+            if self.__index is None:
+                self.__index = self.__load_index()
+
+        entry = self.__index.get(url)
+        if entry is None:
+            return None
+
+        segment, offset, length, content_type = entry
+        with open(self.path + os.sep + segment + '.pages.gz', 'rb') as f:
+            f.seek(offset)
+            return content_type, gzip.decompress(f.read(length))
+
+    def close(self):
+        with self.__lock:
+            for pages, index, _ in self.__segments.values():
+                pages.close()
+                index.close()
+            self.__segments.clear()
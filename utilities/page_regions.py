@@ -0,0 +1,66 @@
+import re
+
+from bs4 import SoupStrainer
+
+# one compound selector: tag, classes, id and attributes, e.g. div.rating, div#main or img[itemprop=url]
+COMPOUND = re.compile(r'^(?P<name>[a-zA-Z][\w-]*)?(?P<rest>(?:\.[\w-]+|#[\w-]+|\[[\w-]+(?:=[^\]]*)?\])*)$')
+PART = re.compile(r'\.([\w-]+)|#([\w-]+)|\[([\w-]+)(?:=([^\]]*))?\]')
+
+
+def compile_compound(compound):
+    match = COMPOUND.match(compound)
+    if not match or not compound:
+        raise ValueError('Unsupported region selector: {}'.format(compound))
+
+    classes = set()
+    attrs = []
+    for cls, id_, attr, value in PART.findall(match.group('rest')):
+        if cls:
+            classes.add(cls)
+        elif id_:
+            attrs.append(('id', id_))
+        else:
+            attrs.append((attr, value.strip('\'"') if value else None))
+    name = match.group('name')
+    return name.lower() if name else None, classes, attrs
+
+
+class PageRegions(SoupStrainer):
+    """SoupStrainer which keeps only the regions of a page given by css selectors, with all their content.
+
+    lxml and html.parser build only elements matching the rightmost compound of the selectors (e.g. 'div.rating'
+    for 'div.main div.rating') and everything inside them, the rest of the page is skipped while parsing. The lexbor
+    builder reads `selectors` and matches them exactly. html5lib does not support parse_only.
+    """
+
+    def __init__(self, *selectors):
+        super(PageRegions, self).__init__()
+        self.selectors = selectors
+        self.__compounds = [compile_compound(selector.split()[-1].split('>')[-1]) for selector in selectors]
+
+    def matches(self, name, attrs):
+        attrs = attrs or {}
+        for tag_name, classes, required in self.__compounds:
+            if tag_name and tag_name != name:
+                continue
+            if classes:
+                value = attrs.get('class') or ''
+                if not classes.issubset(value.split() if isinstance(value, str) else value):
+                    continue
+            if all(attr in attrs if value is None else attrs.get(attr) == value for attr, value in required):
+                return True
+        return False
+
+    # bs4 4.13+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        return self.matches(name, attrs)
+
+    def allow_string_creation(self, string):
+        return False
+
+    # earlier bs4 versions
+    def search_tag(self, markup_name=None, markup_attrs={}):
+        return self.matches(markup_name, markup_attrs)
+
+    def __str__(self):
+        return ', '.join(self.selectors)
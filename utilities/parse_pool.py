@@ -0,0 +1,66 @@
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+
+def init_worker(log_queue, level):
+    # records of workers are sent to the main process and written by its handlers
+    logger = logging.getLogger()
+    logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+    logger.setLevel(level)
+
+
+class ParsePool:
+    """Process pool shared by all scrapers for parsing pages on all cores.
+
+    Parsing in threads is serialized by the GIL, so one core does all parsing while the others are idle. Workers are
+    spawned, not forked, as the pool may be started while fetching threads hold locks. Logs of workers go to the
+    handlers of the main process.
+    """
+
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    def __init__(self, workers=0):
+        # workers: number of processes, 0 for one per core
+        self.workers = workers or os.cpu_count() or 1
+
+        self.__executor = None
+        self.__listener = None
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def instance(cls, *args, **kwargs):
+        # options are taken only from the first call, all later callers share the same pool
+        if cls.__instance is None:
+            with cls.__instance_lock:
+                if cls.__instance is None:
+                    cls.__instance = cls(*args, **kwargs)
+        return cls.__instance
+
+    def __start(self):
+        context = multiprocessing.get_context('spawn')
+        log_queue = context.Queue()
+        self.__listener = logging.handlers.QueueListener(log_queue, *logging.getLogger().handlers,
+                                                         respect_handler_level=True)
+        self.__listener.start()
+        return ProcessPoolExecutor(self.workers, mp_context=context, initializer=init_worker,
+                                   initargs=(log_queue, logging.getLogger().level))
+
+    def submit(self, fn, *args):
+        # fn and args are pickled, so fn must be a module level function
+        if self.__executor is None:
+            with self.__lock:
+                if self.__executor is None:
+                    self.__executor = self.__start()
+        return self.__executor.submit(fn, *args)
+
+    def shutdown(self):
+        with self.__lock:
+            if self.__executor is not None:
+                self.__executor.shutdown()
+                self.__listener.stop()
+                self.__executor = None
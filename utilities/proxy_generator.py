@@ -1,10 +1,17 @@
 # calling main function...
+import json
+import logging
 import os
+import random
+import re
 import sys
+import threading
 import time
+from multiprocessing.pool import ThreadPool
 
-from utilities.utils import setup_browser
-from utilities.utils import load_page_via_proxies_as_text
+from utilities.utils import http_client
+from utilities.utils import rand_user_agnet
+from utilities.utils import browser_pool
 
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -15,6 +22,18 @@ main_url_socks4 = "https://incloak.com/proxy-list/?maxtime=1500&type=4&anon=4#li
 main_url_http = "https://incloak.com/proxy-list/?maxtime=1500&type=h&anon=4#list"
 main_url_htts = "https://incloak.com/proxy-list/?maxtime=1500&type=s&anon=4#list"
 
+# echo services returning json with 'origin' ip and 'headers' of the request, used to check proxies
+test_url_http = "http://httpbin.org/get"
+test_url_https = "https://httpbin.org/get"
+
+paid_proxies_file = 'utilities/proxies.txt'
+# paid proxies checked by validate_paid_proxies, best first
+proxy_pool_file = 'data/proxy_pool.json'
+
+# headers added by proxies which do not hide that request is proxied
+proxy_headers = ('Via', 'X-Forwarded-For', 'Forwarded', 'X-Real-Ip', 'Proxy-Connection')
+anonymity_levels = ('elite', 'anonymous', 'unknown', 'transparent')
+
 dir_path = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(dir_path, "drivers"))
 
@@ -34,46 +53,268 @@ def request(driver, proxy_type):
         raise Exception("bad proxy type")
 
 
-def get_paied_proxies():
-    with open('utilities/proxies.txt') as f:
+def read_proxy_pool(filename=proxy_pool_file):
+    # checked pool if it is not older than proxies.txt, None if there is no usable one
+    if not os.path.exists(filename) or os.path.getmtime(filename) < os.path.getmtime(paid_proxies_file):
+        return None
+
+    try:
+        with open(filename) as f:
+            pool = json.load(f)
+        proxies = [p for p in pool if p.get('proxy')]
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        logging.warning('Could not read {}, using {}: {}'.format(filename, paid_proxies_file, str(e)))
+        return None
+
+    return proxies or None
+
+
+def get_paied_proxies(metadata=False):
+    # checked pool is used if it is not older than proxies.txt, with metadata returns list of probe_proxy results
+    pool = read_proxy_pool()
+    if pool is not None:
+        return pool if metadata else [p['proxy'] for p in pool]
+
+    with open(paid_proxies_file) as f:
         content = f.readlines()
 
     # you may also want to remove whitespace characters like `\n` at the end of each line
-    content = [x.strip() for x in content]
-    return content
+    content = [x.strip() for x in content if x.strip()]
+    return [{'proxy': x} for x in content] if metadata else content
 
 
-def get_new_proxies(proxy_type):
-    print("Obtaining new proxies")
-    driver = setup_browser('phantomjs')
-    # driver = setup_browser('firefox')
-    request(driver, proxy_type)
-    wait = WebDriverWait(driver, 15)
-    proxy_table = wait.until(EC.presence_of_element_located((By.CLASS_NAME, "proxy__t"))).find_element_by_tag_name(
-        "tbody")
-    proxy_lines = proxy_table.find_elements_by_tag_name("tr")
-
-    proxies = []
-    for line in proxy_lines:
+def __echo(url, proxy, timeout):
+    # returns (latency, json of echo service or None)
+    started = time.time()
+    status, _, body = http_client().request(url, headers={'user-agent': rand_user_agnet(proxy)}, timeout=timeout,
+                                            proxy=proxy)
+    latency = time.time() - started
+    if status != 200:
+        raise Exception('Bad request status {} from: {}'.format(status, url))
+
+    try:
+        return latency, json.loads(body.decode('utf-8'))
+    except ValueError:
+        return latency, None
+
+
+def real_ip(test_url=test_url_http, timeout=10):
+    try:
+        _, echo = __echo(test_url, None, timeout)
+        return echo.get('origin') if echo else None
+    except Exception:
+        return None
+
+
+def probe_proxy(proxy, test_url=test_url_http, https_test_url=test_url_https, timeout=10, ip=None):
+    # ip: real ip of this machine, proxies showing it are transparent
+    result = {'proxy': proxy, 'ok': False, 'latency': None, 'protocols': [], 'anonymity': 'unknown'}
+    for protocol, url in (('http', test_url), ('https', https_test_url)):
+        if not url:
+            continue
         try:
-            td_tags = line.find_elements_by_tag_name("td")
-            proxy = ("{}:{}\n".format(td_tags[0].text, td_tags[1].text))
-            proxies.append(proxy.strip())
-        except:
-            pass
+            latency, echo = __echo(url, proxy, timeout)
+        except Exception:
+            continue
 
-    driver.quit()
+        result['ok'] = True
+        result['protocols'].append(protocol)
+        result['latency'] = latency if result['latency'] is None else min(result['latency'], latency)
 
-    working_proxies = []
-    with open('proxies.txt', 'w') as file_:
-        for prox in proxies:
+        # only plain http requests can be changed by proxy, https ones are tunneled as is
+        if protocol == 'http' and echo is not None:
+            headers = echo.get('headers', {})
+            seen = re.split(r'[\s,;=]+', ' '.join([str(echo.get('origin', ''))] + [str(v) for v in headers.values()]))
+            if ip and ip in seen:
+                result['anonymity'] = 'transparent'
+            elif any(h in headers for h in proxy_headers):
+                result['anonymity'] = 'anonymous'
+            else:
+                result['anonymity'] = 'elite'
+
+    return result
+
+
+def probe_proxies(proxies, test_url=test_url_http, https_test_url=test_url_https, timeout=10, threads=100):
+    # checks proxies in parallel, returns working ones, best first
+    if not proxies:
+        return []
+
+    ip = real_ip(test_url, timeout)
+    pool = ThreadPool(min(threads, len(proxies)))
+    results = pool.map(lambda p: probe_proxy(p, test_url, https_test_url, timeout, ip), proxies)
+    pool.close()
+    pool.join()
+
+    working = [r for r in results if r['ok']]
+    working.sort(key=lambda r: ('https' not in r['protocols'], anonymity_levels.index(r['anonymity']), r['latency']))
+    return working
+
+
+def write_proxy_pool(probes, filename=proxy_pool_file):
+    folder = os.path.dirname(filename)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    # write to temporary file first, so a crash does not leave half written pool
+    with open(filename + '.tmp', 'w') as f:
+        json.dump(probes, f, indent=2)
+    os.replace(filename + '.tmp', filename)
+
+
+def validate_paid_proxies(test_url=test_url_http, https_test_url=test_url_https, timeout=10, threads=100):
+    with open(paid_proxies_file) as f:
+        proxies = [x.strip() for x in f if x.strip()]
+
+    started = time.time()
+    probes = probe_proxies(proxies, test_url, https_test_url, timeout, threads)
+    logging.info('{} of {} paid proxies are working, checked in {:.1f} sec'.format(
+        len(probes), len(proxies), time.time() - started))
+    if not probes:
+        # usually network is down, not all proxies, so the proxies are not dropped for later runs
+        logging.warning('No working proxies found, {} is not updated'.format(proxy_pool_file))
+        return probes
+
+    write_proxy_pool(probes)
+    return probes
+
+
+class ProxyPool:
+    """Shared pool of paid proxies which picks proxies by their health.
+
+    Every proxy keeps moving averages of its success rate and latency, the next proxy is chosen randomly with weight
+    success / latency, so slow and failing proxies get little traffic. Bans and `max_failures` failures in a row put
+    the proxy in quarantine for `quarantine` seconds, doubled on each next quarantine up to `max_quarantine`.
+    Proxies can be bound to a session key (sticky sessions) until they fail.
+    """
+
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    # weight of the last request in moving averages
+    smoothing = 0.2
+
+    def __init__(self, proxies=None, max_failures=3, quarantine=300, max_quarantine=3600):
+        # proxies: list of proxies or of probe_proxy results, paid proxies by default
+        self.max_failures = max_failures
+        self.quarantine = quarantine
+        self.max_quarantine = max_quarantine
+
+        # proxy -> [success rate, latency, failures in a row, quarantined until, quarantine count, requests]
+        self.__health = {}
+        for proxy in get_paied_proxies(metadata=True) if proxies is None else proxies:
+            # checked proxies come with their latency
+            if isinstance(proxy, dict):
+                self.__health.setdefault(proxy['proxy'], [1.0, proxy.get('latency') or 1.0, 0, 0.0, 0, 0])
+            else:
+                self.__health.setdefault(proxy, [1.0, 1.0, 0, 0.0, 0, 0])
+        self.__sessions = {}
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def instance(cls, *args, **kwargs):
+        # options are taken only from the first call, all later callers share the same pool
+        if cls.__instance is None:
+            with cls.__instance_lock:
+                if cls.__instance is None:
+                    cls.__instance = cls(*args, **kwargs)
+        return cls.__instance
+
+    def __len__(self):
+        return len(self.__health)
+
+    def get(self, session=None):
+        # returns proxy for the next request, the same proxy for the same session while it works
+        with self.__lock:
+            if not self.__health:
+                raise Exception('No proxies in the pool, please check utilities/proxies.txt')
+
+            if session is not None:
+                proxy = self.__sessions.get(session)
+                if proxy is not None and self.__health[proxy][3] <= time.monotonic():
+                    return proxy
+
+            now = time.monotonic()
+            available = [(proxy, h) for proxy, h in self.__health.items() if h[3] <= now]
+            if available:
+                proxy = random.choices([proxy for proxy, _ in available],
+                                       [max(h[0], 0.01) / max(h[1], 0.01) for _, h in available])[0]
+            else:
+                # all proxies are in quarantine, the one released first is the best bet
+                proxy = min(self.__health, key=lambda p: self.__health[p][3])
+
+            if session is not None:
+                self.__sessions[session] = proxy
+            return proxy
+
+    def report(self, proxy, ok=True, latency=None, banned=False):
+        with self.__lock:
+            health = self.__health.get(proxy)
+            if health is None:
+                return
+
+            health[5] += 1
+            health[0] += self.smoothing * ((1.0 if ok else 0.0) - health[0])
+            if latency is not None:
+                health[1] += self.smoothing * (latency - health[1])
+
+            if ok:
+                health[2] = 0
+                return
+
+            health[2] += 1
+            # failed proxy is not sticky anymore
+            for session in [s for s, p in self.__sessions.items() if p == proxy]:
+                del self.__sessions[session]
+
+            if banned or health[2] >= self.max_failures:
+                cool_down = min(self.max_quarantine, self.quarantine * 2 ** health[4])
+                health[2] = 0
+                health[3] = time.monotonic() + cool_down
+                health[4] += 1
+                logging.debug('Proxy {} is quarantined for {} sec'.format(proxy, cool_down))
+
+    def release(self, session):
+        with self.__lock:
+            self.__sessions.pop(session, None)
+
+    def stats(self):
+        now = time.monotonic()
+        with self.__lock:
+            return {proxy: {'success': round(h[0], 2), 'latency': round(h[1], 2), 'requests': h[5],
+                            'quarantined': h[3] > now, 'quarantines': h[4]} for proxy, h in self.__health.items()}
+
+    def log_stats(self):
+        stats = self.stats()
+        used = [s for s in stats.values() if s['requests']]
+        if used:
+            logging.info('Proxy pool: {} of {} proxies used, {} quarantined now, {} quarantines in total'.format(
+                len(used), len(stats), sum(s['quarantined'] for s in stats.values()),
+                sum(s['quarantines'] for s in stats.values())))
+
+
+def get_new_proxies(proxy_type):
+    print("Obtaining new proxies")
+    # with browser_pool().browser('firefox') as driver:
+    with browser_pool().browser('phantomjs') as driver:
+        request(driver, proxy_type)
+        wait = WebDriverWait(driver, 15)
+        proxy_table = wait.until(EC.presence_of_element_located((By.CLASS_NAME, "proxy__t"))).find_element_by_tag_name(
+            "tbody")
+        proxy_lines = proxy_table.find_elements_by_tag_name("tr")
+
+        proxies = []
+        for line in proxy_lines:
             try:
-                load_page_via_proxies_as_text('https://www.york.ac.uk/teaching/cws/wws/webpage1.html', prox)
-                print('Good proxy: {}'.format(prox))
-                working_proxies.append(prox)
-                file_.write(prox)
+                td_tags = line.find_elements_by_tag_name("td")
+                proxy = ("{}:{}\n".format(td_tags[0].text, td_tags[1].text))
+                proxies.append(proxy.strip())
             except:
-                print('Bad proxy: {}'.format(prox))
                 pass
 
+    working_proxies = [p['proxy'] for p in probe_proxies(proxies)]
+    print('{} of {} proxies are working'.format(len(working_proxies), len(proxies)))
+    with open('proxies.txt', 'w') as file_:
+        for prox in working_proxies:
+            file_.write(prox + '\n')
+
     return working_proxies
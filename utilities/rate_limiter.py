@@ -0,0 +1,101 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def domain_of(url):
+    netloc = urlsplit(url).netloc.lower()
+    return netloc[4:] if netloc.startswith('www.') else netloc
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average with bursts of up to `burst` requests.
+
+    Callers reserve a token and sleep for the returned delay, so concurrent callers are spread evenly in time
+    instead of all waking up at the same moment.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1.0)
+
+        self.__tokens = self.burst
+        self.__updated = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def reserve(self):
+        # takes one token and returns number of seconds to wait before using it
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(self.burst, self.__tokens + (now - self.__updated) * self.rate)
+            self.__updated = now
+            self.__tokens -= 1
+            if self.__tokens >= 0:
+                return 0.0
+            return -self.__tokens / self.rate
+
+
+class RequestScheduler:
+    """Paces requests with one token bucket per domain and one per proxy.
+
+    Domains without configured rate use `default_rate`, 0 disables the limit.
+    """
+
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    def __init__(self, default_rate=0, default_burst=1, proxy_rate=0, proxy_burst=1):
+        self.default_rate = default_rate
+        self.default_burst = default_burst
+        self.proxy_rate = proxy_rate
+        self.proxy_burst = proxy_burst
+
+        self.__rates = {}
+        self.__domains = {}
+        self.__proxies = {}
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def instance(cls, *args, **kwargs):
+        # options are taken only from the first call, all later callers share the same scheduler
+        if cls.__instance is None:
+            with cls.__instance_lock:
+                if cls.__instance is None:
+                    cls.__instance = cls(*args, **kwargs)
+        return cls.__instance
+
+    def configure(self, url, rate, burst=1):
+        domain = domain_of(url)
+        with self.__lock:
+            if self.__rates.get(domain) == (rate, burst):
+                return
+            self.__rates[domain] = (rate, burst)
+            self.__domains.pop(domain, None)
+
+    def __bucket(self, buckets, key, rate, burst):
+        with self.__lock:
+            if key not in buckets:
+                buckets[key] = TokenBucket(rate, burst) if rate else None
+            return buckets[key]
+
+    def delay(self, url, proxy=None):
+        # reserves request to url through proxy and returns number of seconds to wait before sending it
+        domain = domain_of(url)
+        rate, burst = self.__rates.get(domain, (self.default_rate, self.default_burst))
+
+        delay = 0.0
+        bucket = self.__bucket(self.__domains, domain, rate, burst)
+        if bucket is not None:
+            delay = bucket.reserve()
+
+        if proxy is not None:
+            bucket = self.__bucket(self.__proxies, proxy, self.proxy_rate, self.proxy_burst)
+            if bucket is not None:
+                delay = max(delay, bucket.reserve())
+
+        return delay
+
+    def wait(self, url, proxy=None):
+        delay = self.delay(url, proxy)
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,29 @@
+class RawPage:
+    """Body of a loaded page as received, with the encoding detected from its headers or <meta> tags.
+
+    Parsers decode the bytes themselves while building the tree (lxml and lexbor without intermediate strings), so
+    the page is not decoded to a str first. make_soup takes the bytes out of the page, the buffer is freed as soon as
+    the tree is built even if the page itself is still referenced by the thread or the task which loaded it.
+    """
+
+    __slots__ = ('data', 'encoding')
+
+    def __init__(self, data, encoding):
+        self.data = data
+        self.encoding = encoding
+
+    def take(self):
+        data, self.data = self.data, None
+        if data is None:
+            raise ValueError('Page is already parsed')
+        return data
+
+    def copy(self):
+        # the copy shares the buffer, e.g. to parse the same page more than once
+        return RawPage(self.data, self.encoding)
+
+    def text(self):
+        return self.data.decode(self.encoding, errors='replace')
+
+    def __len__(self):
+        return len(self.data or b'')
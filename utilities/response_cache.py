@@ -0,0 +1,218 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import parse_qsl
+from urllib.parse import urlencode
+from urllib.parse import urlsplit
+from urllib.parse import urlunsplit
+
+
+def canonical_url(url):
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme == 'http' and netloc.endswith(':80')) or (scheme == 'https' and netloc.endswith(':443')):
+        netloc = netloc.rsplit(':', 1)[0]
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, parts.path or '/', query, ''))
+
+
+class ResponseCache:
+    """Persistent cache of page responses which have ETag or Last-Modified validators.
+
+    Cached pages are revalidated with If-None-Match/If-Modified-Since, so unchanged pages cost a 304 response
+    instead of a full download. Entries not validated for `ttl` seconds are dropped, and the least recently used
+    entries are removed when the cache grows over `max_size` bytes.
+    """
+
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    def __init__(self, path, ttl=7 * 24 * 3600, max_size=1024 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+
+        # key -> [size, last access time], loaded on first use
+        self.__entries = None
+        self.__size = 0
+        self.__lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def instance(cls, *args, **kwargs):
+        # options are taken only from the first call, all later callers share the same cache
+        if cls.__instance is None:
+            with cls.__instance_lock:
+                if cls.__instance is None:
+                    cls.__instance = cls(*args, **kwargs)
+        return cls.__instance
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha1(canonical_url(url).encode('utf-8')).hexdigest()
+
+    def __files(self, key):
+        folder = self.path + os.sep + key[:2]
+        return folder + os.sep + key + '.json', folder + os.sep + key + '.body'
+
+    def __load_entries(self):
+        if self.__entries is not None:
+            return
+
+        self.__entries = {}
+        self.__size = 0
+        if not os.path.exists(self.path):
+            return
+
+        for folder, _, files in os.walk(self.path):
+            for name in files:
+                if name.endswith('.body'):
+                    stat = os.stat(folder + os.sep + name)
+                    self.__entries[name[:-len('.body')]] = [stat.st_size, stat.st_mtime]
+                    self.__size += stat.st_size
+
+    def __forget(self, key):
+        # drops entry from the index, called with the lock held, files are removed by __remove_files
+        entry = self.__entries.pop(key, None)
+        if entry:
+            self.__size -= entry[0]
+
+    def __remove_files(self, key):
+        for name in self.__files(key):
+            try:
+                os.remove(name)
+            except OSError:
+                pass
+
+    def __discard(self, key):
+        with self.__lock:
+            self.__forget(key)
+        self.__remove_files(key)
+
+    def __evict(self):
+        # returns keys of removed entries, called with the lock held; some space is freed at once, so eviction does
+        # not run on every store
+        if self.__size <= self.max_size:
+            return []
+
+        evicted = []
+        for key, _ in sorted(self.__entries.items(), key=lambda e: e[1][1]):
+            self.__forget(key)
+            evicted.append(key)
+            if self.__size <= self.max_size * 0.9:
+                break
+        return evicted
+
+    @staticmethod
+    def __replace(filename, write, mode):
+        # temporary file of the thread, so readers and other writers of the same page never see half written files
+        temporary = '{}.{}.tmp'.format(filename, threading.get_ident())
+        with open(temporary, mode) as f:
+            write(f)
+        os.replace(temporary, filename)
+
+    def get(self, url):
+        # returns (meta, body) for url or None if it is not cached; the lock is held only for the index, not for
+        # reading of files
+        key = self.key(url)
+        meta_file, body_file = self.__files(key)
+        with self.__lock:
+            self.__load_entries()
+            if key not in self.__entries:
+                return None
+
+        try:
+            with open(meta_file, 'r') as f:
+                meta = json.load(f)
+            if time.time() - meta['validated_at'] > self.ttl:
+                self.__discard(key)
+                return None
+
+            with open(body_file, 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError, KeyError):
+            self.__discard(key)
+            return None
+
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry:
+                entry[1] = time.time()
+
+        return meta, body
+
+    @staticmethod
+    def conditional_headers(meta):
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def store(self, url, headers, body):
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+
+        key = self.key(url)
+        meta_file, body_file = self.__files(key)
+        meta = {'url': url,
+                'etag': etag,
+                'last_modified': last_modified,
+                'content_type': headers.get('Content-Type'),
+                'validated_at': time.time()}
+
+        # body is replaced before meta, so a reader never gets validators of a newer body than it reads
+        try:
+            os.makedirs(os.path.dirname(body_file), exist_ok=True)
+            self.__replace(body_file, lambda f: f.write(body), 'wb')
+            self.__replace(meta_file, lambda f: json.dump(meta, f), 'w')
+        except OSError as e:
+            logging.warning('Could not cache {}: {}'.format(url, str(e)))
+            return
+
+        with self.__lock:
+            self.__load_entries()
+            self.__forget(key)
+            self.__entries[key] = [len(body), time.time()]
+            self.__size += len(body)
+            evicted = self.__evict()
+
+        for key in evicted:
+            self.__remove_files(key)
+
+    def refresh(self, url, meta):
+        # page was not modified, keep it for another ttl period
+        meta['validated_at'] = time.time()
+        meta_file, _ = self.__files(self.key(url))
+        try:
+            self.__replace(meta_file, lambda f: json.dump(meta, f), 'w')
+        except OSError:
+            pass
+
+    def cached_get(self, url, send):
+        # send(headers) makes the request and returns (status, headers, body)
+        cached = self.get(url)
+        return self.resolve(url, cached, *send(self.conditional_headers(cached[0]) if cached else {}))
+
+    def resolve(self, url, cached, status, headers, body):
+        # response to a request with conditional headers of cached entry (or None), 304 gives the cached page
+        if status == 304 and cached:
+            with self.__lock:
+                self.hits += 1
+            self.refresh(url, cached[0])
+            return 200, {'Content-Type': cached[0].get('content_type')}, cached[1]
+
+        with self.__lock:
+            self.misses += 1
+        if status == 200:
+            self.store(url, headers, body)
+        return status, headers, body
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+
+from utilities.rate_limiter import domain_of
+
+
+class RequestError(Exception):
+    """Failed page request, `status` is None for network errors and timeouts."""
+
+    def __init__(self, message, status=None, retryable=True):
+        super(RequestError, self).__init__(message)
+        self.status = status
+        self.retryable = retryable
+
+
+class RetryPolicy:
+    """Single retry engine for all page loaders.
+
+    Failed attempts are retried after exponential backoff with full jitter, so clients failing together do not
+    come back together. Retries are limited per attempt, per run and per domain, so an outage of a site costs a
+    bounded number of requests instead of a retry storm.
+    """
+
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    def __init__(self, attempts=3, backoff=0.5, max_backoff=30.0, budget=-1, domain_budget=-1):
+        # budget, domain_budget: max number of retries per run and per domain, -1 for unlimited
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget
+        self.domain_budget = domain_budget
+
+        self.__domain_attempts = {}
+        self.__retries = 0
+        # domain -> [failed attempts, retries, requests given up]
+        self.__stats = {}
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def instance(cls, *args, **kwargs):
+        # options are taken only from the first call, all later callers share the same policy
+        if cls.__instance is None:
+            with cls.__instance_lock:
+                if cls.__instance is None:
+                    cls.__instance = cls(*args, **kwargs)
+        return cls.__instance
+
+    def configure(self, url, attempts):
+        self.__domain_attempts[domain_of(url)] = attempts
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def __retry_allowed(self, domain, attempt, error):
+        # counts failed attempt and decides if it should be retried
+        with self.__lock:
+            stats = self.__stats.setdefault(domain, [0, 0, 0])
+            stats[0] += 1
+
+            allowed = isinstance(error, RequestError) and error.retryable and \
+                attempt + 1 < self.__domain_attempts.get(domain, self.attempts)
+            if allowed and self.budget != -1 and self.__retries >= self.budget:
+                logging.warning('Retry budget of the run is exhausted, giving up {}'.format(domain))
+                allowed = False
+            if allowed and self.domain_budget != -1 and stats[1] >= self.domain_budget:
+                logging.warning('Retry budget of {} is exhausted'.format(domain))
+                allowed = False
+
+            if allowed:
+                self.__retries += 1
+                stats[1] += 1
+            else:
+                stats[2] += 1
+            return allowed
+
+    def call(self, url, attempt_fn):
+        # attempt_fn(attempt) makes one attempt, attempt is 0 for the first one
+        domain = domain_of(url)
+        attempt = 0
+        while True:
+            try:
+                return attempt_fn(attempt)
+            except Exception as e:
+                if not self.__retry_allowed(domain, attempt, e):
+                    raise
+                delay = self.delay(attempt)
+                logging.debug('Attempt {} of {} failed: {}, retrying in {:.1f} sec'.format(attempt + 1, url, e, delay))
+                time.sleep(delay)
+                attempt += 1
+
+    async def call_async(self, url, attempt_fn):
+        # same as call, attempt_fn(attempt) returns coroutine
+        domain = domain_of(url)
+        attempt = 0
+        while True:
+            try:
+                return await attempt_fn(attempt)
+            except Exception as e:
+                if not self.__retry_allowed(domain, attempt, e):
+                    raise
+                delay = self.delay(attempt)
+                logging.debug('Attempt {} of {} failed: {}, retrying in {:.1f} sec'.format(attempt + 1, url, e, delay))
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def stats(self):
+        with self.__lock:
+            return {domain: {'failed_attempts': s[0], 'retries': s[1], 'given_up': s[2]}
+                    for domain, s in self.__stats.items()}
+
+    def log_stats(self):
+        for domain, stats in sorted(self.stats().items()):
+            logging.info('Retries of {}: {} failed attempts, {} retried, {} given up'.format(
+                domain, stats['failed_attempts'], stats['retries'], stats['given_up']))
@@ -0,0 +1,90 @@
+import json
+import logging
+import os
+import random
+import threading
+
+
+class UserAgentProvider:
+    """Pool of desktop, non-bot user agents built once and saved to `path`.
+
+    Building the pool parses a few hundred random agents, so it is done on the first request only and later runs just
+    read the saved file. Agents can be pinned to proxies, so a site sees the same browser from the same ip.
+    """
+
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    def __init__(self, path, size=200, pin_to_proxy=True):
+        self.path = path
+        self.size = size
+        self.pin_to_proxy = pin_to_proxy
+
+        self.__agents = None
+        self.__pinned = {}
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def instance(cls, *args, **kwargs):
+        # options are taken only from the first call, all later callers share the same provider
+        if cls.__instance is None:
+            with cls.__instance_lock:
+                if cls.__instance is None:
+                    cls.__instance = cls(*args, **kwargs)
+        return cls.__instance
+
+    def __build(self):
+        from fake_useragent import UserAgent
+        from user_agents import parse
+
+        ua = UserAgent()
+        # fake_useragent 1.2+ exposes its whole data set, older versions can only be sampled by ua.random
+        candidates = [b['useragent'] for b in getattr(ua, 'data_browsers', [])]
+        random.shuffle(candidates)
+        if not candidates:
+            candidates = set(ua.random for _ in range(self.size * 5))
+
+        agents = set()
+        for agent in candidates:
+            parsed = parse(agent)
+            if parsed.is_pc and not parsed.is_bot:
+                agents.add(agent)
+                if len(agents) >= self.size:
+                    break
+
+        if not agents:
+            raise Exception('Too much bad user agents')
+        return sorted(agents)
+
+    def __load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    agents = json.load(f)
+                if agents:
+                    return agents
+            except ValueError:
+                logging.warning('Broken user agents file {}, building new one'.format(self.path))
+
+        agents = self.__build()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w') as f:
+            json.dump(agents, f, indent=2)
+        return agents
+
+    def agents(self):
+        if self.__agents is None:
+            with self.__lock:
+                if self.__agents is None:
+                    self.__agents = self.__load()
+        return self.__agents
+
+    def get(self, proxy=None):
+        agents = self.agents()
+        if proxy is None or not self.pin_to_proxy:
+            return random.choice(agents)
+
+        agent = self.__pinned.get(proxy)
+        if agent is None:
+            agent = self.__pinned.setdefault(proxy, random.choice(agents))
+        return agent
@@ -1,9 +1,12 @@
+import codecs
 import csv
 import json
 import logging
 import os
 import platform
+import re
 import sys
+import threading
 import time
 import traceback
 import uuid
@@ -11,29 +14,47 @@ from urllib.parse import urlsplit
 import copy
 
 import bs4
-import cfscrape
+import requests
 import urllib3
 from configobj import ConfigObj, flatten_errors
-from fake_useragent import UserAgent
 from openpyxl import Workbook
 from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
 from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.common.action_chains import ActionChains
+from selenium.webdriver.common.by import By
 from selenium.webdriver.firefox.options import Options
-from urllib3 import make_headers
-from user_agents import parse
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.support.ui import WebDriverWait
 from validate import Validator
 from validate import VdtValueError
 
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
 from scrapers.data_keys import BOOL_VALUES
+from utilities.browser_pool import BrowserPool
+from utilities.concurrency import ConcurrencyController
+from utilities.csf_sessions import CsfSessions
+from utilities.http_client import BodyTooLargeError
+from utilities.http_client import HttpClient
+from utilities.lexbor_builder import LexborHTMLParser
 from utilities.mysql_wrapper import MySQL
+from utilities.page_regions import PageRegions
+from utilities.parse_pool import ParsePool
+from utilities.raw_page import RawPage
+from utilities.page_archive import PageArchive
+from utilities.rate_limiter import RequestScheduler
+from utilities.retry import RequestError
+from utilities.retry import RetryPolicy
+from utilities.response_cache import ResponseCache
+from utilities.ua_provider import UserAgentProvider
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(dir_path, "drivers"))
 
-urllib3.disable_warnings()
-ua = UserAgent()  # From here we generate a random user agent
-
 
 class Configs:
     spec = '''[scraper]
@@ -41,6 +62,49 @@ class Configs:
     max_items = integer(min=-1, max=5000, default=50)
     logging_handler = options('stream', 'file', default='stream')
     output_format = options('excel', 'json', default='excel')
+    pool_connections = integer(min=1, default=50)
+    pool_maxsize = integer(min=1, default=25)
+    proxy_pool_maxsize = integer(min=1, default=2)
+    max_proxy_failures = integer(min=1, default=3)
+    proxy_quarantine = integer(min=0, default=300)
+    proxy_max_quarantine = integer(min=0, default=3600)
+    validate_proxies = boolean(default=False)
+    proxy_check_timeout = integer(min=1, default=10)
+    user_agents = integer(min=1, default=200)
+    pin_user_agents = boolean(default=True)
+    csf_sessions = integer(min=1, default=4)
+    csf_session_ttl = integer(min=1, default=1800)
+    max_browsers = integer(min=1, max=29, default=2)
+    browser_max_pages = integer(min=1, default=50)
+    page_load_strategy = options('normal', 'eager', 'none', default='eager')
+    browser_block = string_list(default=list('image', 'font', 'media', 'tracker'))
+    browser_wait_timeout = integer(min=1, default=10)
+    max_body_size = integer(min=-1, default=20)
+    parse_regions = boolean(default=True)
+    async_concurrency = integer(min=1, default=200)
+    parse_pool = options('thread', 'process', default='thread')
+    parse_workers = integer(min=0, default=0)
+    parse_queue = integer(min=1, default=100)
+    stream_listings = boolean(default=True)
+    parallel_sources = integer(min=1, default=3)
+    total_threads = integer(min=1, default=60)
+    memory_budget = integer(min=0, default=0)
+    domain_concurrency = integer(min=1, default=50)
+    http_cache = boolean(default=True)
+    http_cache_ttl = integer(min=0, default=604800)
+    http_cache_size = integer(min=1, default=1024)
+    archive_pages = boolean(default=False)
+    domain_rate = float(min=0, default=0)
+    domain_burst = integer(min=1, default=5)
+    proxy_rate = float(min=0, default=0)
+    proxy_burst = integer(min=1, default=2)
+    adaptive_concurrency = boolean(default=True)
+    initial_concurrency = integer(min=1, default=4)
+    retry_attempts = integer(min=1, default=3)
+    retry_backoff = float(min=0, default=0.5)
+    retry_max_backoff = float(min=0, default=30)
+    retry_budget = integer(min=-1, default=5000)
+    retry_domain_budget = integer(min=-1, default=1000)
     '''
 
     file = r"configs.ini"
@@ -80,6 +144,54 @@ class Configs:
         Configs.config['port'] = int(config_parser['scraper']['port'])
         Configs.config['password'] = config_parser['scraper']['password']
         Configs.config['db'] = config_parser['scraper']['db']
+        Configs.config['pool_connections'] = int(config_parser['scraper']['pool_connections'])
+        Configs.config['pool_maxsize'] = int(config_parser['scraper']['pool_maxsize'])
+        Configs.config['proxy_pool_maxsize'] = int(config_parser['scraper']['proxy_pool_maxsize'])
+        Configs.config['max_proxy_failures'] = int(config_parser['scraper']['max_proxy_failures'])
+        Configs.config['proxy_quarantine'] = int(config_parser['scraper']['proxy_quarantine'])
+        Configs.config['proxy_max_quarantine'] = int(config_parser['scraper']['proxy_max_quarantine'])
+        Configs.config['validate_proxies'] = bool(config_parser['scraper']['validate_proxies'])
+        Configs.config['proxy_check_timeout'] = int(config_parser['scraper']['proxy_check_timeout'])
+        Configs.config['user_agents'] = int(config_parser['scraper']['user_agents'])
+        Configs.config['pin_user_agents'] = bool(config_parser['scraper']['pin_user_agents'])
+        Configs.config['csf_sessions'] = int(config_parser['scraper']['csf_sessions'])
+        Configs.config['csf_session_ttl'] = int(config_parser['scraper']['csf_session_ttl'])
+        Configs.config['max_browsers'] = int(config_parser['scraper']['max_browsers'])
+        Configs.config['browser_max_pages'] = int(config_parser['scraper']['browser_max_pages'])
+        Configs.config['page_load_strategy'] = config_parser['scraper']['page_load_strategy']
+        Configs.config['browser_block'] = list(config_parser['scraper']['browser_block'])
+        Configs.config['browser_wait_timeout'] = int(config_parser['scraper']['browser_wait_timeout'])
+        Configs.config['max_body_size'] = int(config_parser['scraper']['max_body_size'])
+        Configs.config['parse_regions'] = bool(config_parser['scraper']['parse_regions'])
+        Configs.config['async_concurrency'] = int(config_parser['scraper']['async_concurrency'])
+        Configs.config['parse_pool'] = config_parser['scraper']['parse_pool']
+        Configs.config['parse_workers'] = int(config_parser['scraper']['parse_workers'])
+        Configs.config['parse_queue'] = int(config_parser['scraper']['parse_queue'])
+        Configs.config['stream_listings'] = bool(config_parser['scraper']['stream_listings'])
+        Configs.config['parallel_sources'] = int(config_parser['scraper']['parallel_sources'])
+        Configs.config['total_threads'] = int(config_parser['scraper']['total_threads'])
+        Configs.config['memory_budget'] = int(config_parser['scraper']['memory_budget'])
+        Configs.config['domain_concurrency'] = int(config_parser['scraper']['domain_concurrency'])
+        Configs.config['http_cache'] = bool(config_parser['scraper']['http_cache'])
+        Configs.config['http_cache_ttl'] = int(config_parser['scraper']['http_cache_ttl'])
+        Configs.config['http_cache_size'] = int(config_parser['scraper']['http_cache_size'])
+        Configs.config['archive_pages'] = bool(config_parser['scraper']['archive_pages'])
+        Configs.config['domain_rate'] = float(config_parser['scraper']['domain_rate'])
+        Configs.config['domain_burst'] = int(config_parser['scraper']['domain_burst'])
+        Configs.config['proxy_rate'] = float(config_parser['scraper']['proxy_rate'])
+        Configs.config['proxy_burst'] = int(config_parser['scraper']['proxy_burst'])
+        Configs.config['adaptive_concurrency'] = bool(config_parser['scraper']['adaptive_concurrency'])
+        Configs.config['initial_concurrency'] = int(config_parser['scraper']['initial_concurrency'])
+        Configs.config['retry_attempts'] = int(config_parser['scraper']['retry_attempts'])
+        Configs.config['retry_backoff'] = float(config_parser['scraper']['retry_backoff'])
+        Configs.config['retry_max_backoff'] = float(config_parser['scraper']['retry_max_backoff'])
+        Configs.config['retry_budget'] = int(config_parser['scraper']['retry_budget'])
+        Configs.config['retry_domain_budget'] = int(config_parser['scraper']['retry_domain_budget'])
+
+        # per source options from [sources] section, e.g. [[icobench]] engine = 'async'
+        Configs.config['sources'] = {}
+        for source, options in config_parser.get('sources', {}).items():
+            Configs.config['sources'][source.lower()] = dict(options)
 
         Configs.parsed = True
 
@@ -96,6 +208,13 @@ class Configs:
 
         return cfg
 
+    @staticmethod
+    def get_source(source, key, default=None):
+        if not Configs.parsed:
+            Configs.parse_config_file()
+
+        return Configs.config['sources'].get(source.lower(), {}).get(key, default)
+
 
 def get_domain(url):
     print(url)
@@ -126,22 +245,41 @@ def setup_browser(browser=""):
     return driver
 
 
+# url patterns of resources which scrapers do not need, blocked in chrome by 'browser_block' option
+BLOCKED_URLS = {'image': ['*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.svg*', '*.webp*', '*.ico*'],
+                'stylesheet': ['*.css*'],
+                'font': ['*.woff*', '*.ttf*', '*.otf*', '*.eot*'],
+                'media': ['*.mp4*', '*.webm*', '*.mp3*', '*.ogg*'],
+                'tracker': ['*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+                            '*connect.facebook.net*', '*mc.yandex.ru*', '*hotjar.com*']}
+
+# firefox preferences which block the same resources
+FIREFOX_BLOCK_PREFS = {'image': {'permissions.default.image': 2},
+                       'stylesheet': {'permissions.default.stylesheet': 2},
+                       'font': {'browser.display.use_document_fonts': 0, 'gfx.downloadable_fonts.enabled': False},
+                       'media': {'media.autoplay.default': 5, 'media.autoplay.blocking_policy': 2},
+                       'tracker': {'privacy.trackingprotection.enabled': True}}
+
+
 def setup_chrome(bpath, maximize=True):
     opt = webdriver.ChromeOptions()
 
     opt.add_argument("--start-maximized")
-    # disable images
-    # disable_all = {#"profile.managed_default_content_settings.images": 2,
-    # "profile.managed_default_content_settings.javascript": 2,
-    # "profile.managed_default_content_settings.plugin": 2,
-    # "profile.managed_default_content_settings.popups": 2,
-    # "profile.managed_default_content_settings.automaticDownloads": 2}
-
-    # opt.add_experimental_option("prefs", disable_all)
-    # not sure that this work
+    # get() returns when the document is parsed, scrapers wait for elements they need, see wait_for
+    opt.set_capability('pageLoadStrategy', Configs.get('page_load_strategy'))
+    blocked = Configs.get('browser_block')
+    if 'image' in blocked:
+        opt.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+
     driver = webdriver.Chrome(bpath, chrome_options=opt)
     driver.delete_all_cookies()
 
+    urls = [url for kind in blocked for url in BLOCKED_URLS.get(kind, [])]
+    if urls:
+        # requests matching the patterns fail before they are sent
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': urls})
+
     # maximize browser
     # if maximize:
     #   driver.maximize_window()
@@ -149,21 +287,18 @@ def setup_chrome(bpath, maximize=True):
 
 
 def setup_firefox(bpath, maximize=True):
-    firefox_profile = webdriver.FirefoxProfile()
-
     options = Options()
     options.add_argument("--headless")
+    options.set_capability('pageLoadStrategy', Configs.get('page_load_strategy'))
 
-    # disable css
-    firefox_profile.set_preference('permissions.default.stylesheet', 2)
-    # disable images
-    firefox_profile.set_preference('permissions.default.image', 2)
+    # preferences of the profile of the browser
+    for kind in Configs.get('browser_block'):
+        for name, value in FIREFOX_BLOCK_PREFS.get(kind, {}).items():
+            options.set_preference(name, value)
     # disable flash
-    firefox_profile.set_preference('dom.ipc.plugins.enabled.libflashplayer.so', 'false')
-    # disable javascript
-    firefox_profile.set_preference('permissions.default.image', 2)
+    options.set_preference('dom.ipc.plugins.enabled.libflashplayer.so', 'false')
 
-    driver = webdriver.Firefox(options=options, executable_path=bpath)  # , firefox_profile=firefox_profile)
+    driver = webdriver.Firefox(options=options, executable_path=bpath)
 
     # maximize browser
     if maximize:
@@ -212,30 +347,265 @@ def write_to_csv(filename, toCSV):
         dict_writer.writerows(toCSV)
 
 
-def load_page_with_selenium(url, parser):
-    driver = setup_browser('firefox')
-    driver.get(url)
-    bs = bs4.BeautifulSoup(driver.page_source, parser)
-    driver.close()
-    return bs
+def memory_usage():
+    # resident memory of the scraper with its child processes (parse pool, browsers) in megabytes, None without psutil
+    if psutil is None:
+        return None
+
+    process = psutil.Process()
+    total = process.memory_info().rss
+    for child in process.children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            # the child exited meanwhile
+            pass
+    return total / 2 ** 20
+
+
+def browser_pool():
+    return BrowserPool.instance(setup_browser, Configs.get('max_browsers'), Configs.get('browser_max_pages'))
+
+
+def wait_for(driver, selector, timeout=None):
+    # pages are loaded 'eager' (see page_load_strategy in configs.ini), content added by scripts may be not there yet
+    WebDriverWait(driver, timeout or Configs.get('browser_wait_timeout')).until(
+        expected_conditions.presence_of_element_located((By.CSS_SELECTOR, selector)))
+
+
+def load_page_with_selenium(url, parser, wait=None):
+    # wait: css selector of an element which the page is not complete without
+    with browser_pool().browser('firefox') as driver:
+        driver.get(url)
+        if wait:
+            try:
+                wait_for(driver, wait)
+            except TimeoutException:
+                logging.warning('{} did not appear in {}, parsing what is loaded'.format(wait, url))
+        page = driver.page_source
+    return make_soup(page, parser)
+
+
+def make_soup(content, parser, regions=None):
+    # parser: 'lexbor' (needs selectolax), 'lxml', 'html5lib' or 'html.parser', scrapers work the same with all of them
+    if parser in ('lexbor', 'selectolax') and LexborHTMLParser is None:
+        # html5lib builds the same tree as lexbor
+        parser = 'html5lib'
+
+    # regions: css selectors of the parts of the page to parse, html5lib can parse only whole pages
+    parse_only = PageRegions(*regions) if regions and parser != 'html5lib' else None
+    if isinstance(content, RawPage):
+        # bytes go to the parser with their encoding, the buffer is released when the tree is built
+        encoding = content.encoding
+        return bs4.BeautifulSoup(content.take(), parser, parse_only=parse_only, from_encoding=encoding)
+    return bs4.BeautifulSoup(content, parser, parse_only=parse_only)
+
+
+def source_parser(source, default):
+    # 'parser' option of the source from configs.ini
+    return Configs.get_source(source, 'parser', default)
+
+
+def user_agent_provider():
+    return UserAgentProvider.instance(os.getcwd() + os.sep + 'data' + os.sep + 'user_agents.json',
+                                      Configs.get('user_agents'), Configs.get('pin_user_agents'))
+
+
+def rand_user_agnet(proxy=None):
+    # the same agent is returned for the same proxy if 'pin_user_agents' is enabled
+    return user_agent_provider().get(proxy)
+
+
+def parse_pool():
+    return ParsePool.instance(Configs.get('parse_workers'))
+
+
+def http_client():
+    max_body_size = Configs.get('max_body_size')
+    return HttpClient.instance(Configs.get('pool_connections'), Configs.get('pool_maxsize'),
+                               Configs.get('proxy_pool_maxsize'), Configs.get('max_proxy_failures'),
+                               max_body_size * 1024 * 1024 if max_body_size != -1 else -1)
+
+
+def proxy_pool():
+    # imported here as proxy_generator depends on this module
+    from utilities.proxy_generator import ProxyPool
+    return ProxyPool.instance(max_failures=Configs.get('max_proxy_failures'),
+                              quarantine=Configs.get('proxy_quarantine'),
+                              max_quarantine=Configs.get('proxy_max_quarantine'))
+
+
+def report_proxy(proxy, ok=True, latency=None, status=None):
+    # feeds result of request through proxy to the proxy pool, 403 and 429 are treated as bans
+    if proxy is not None:
+        proxy_pool().report(proxy, ok, latency, banned=status in (403, 429))
+
+
+def csf_sessions():
+    return CsfSessions.instance(Configs.get('csf_sessions'), Configs.get('csf_session_ttl'))
+
+
+def response_cache():
+    # None if http cache is disabled in configs.ini
+    if not Configs.get('http_cache'):
+        return None
+
+    return ResponseCache.instance(os.getcwd() + os.sep + 'data' + os.sep + 'http_cache',
+                                  Configs.get('http_cache_ttl'), Configs.get('http_cache_size') * 1024 * 1024)
+
+
+def request_scheduler():
+    return RequestScheduler.instance(Configs.get('domain_rate'), Configs.get('domain_burst'),
+                                     Configs.get('proxy_rate'), Configs.get('proxy_burst'))
+
+
+def retry_policy():
+    return RetryPolicy.instance(Configs.get('retry_attempts'), Configs.get('retry_backoff'),
+                                Configs.get('retry_max_backoff'), Configs.get('retry_budget'),
+                                Configs.get('retry_domain_budget'))
+
+
+def configure_source(source, url):
+    # applies 'rate', 'burst', 'retry_attempts' and 'domain_concurrency' options of the source from configs.ini to the
+    # domain of url
+    rate = Configs.get_source(source, 'rate', Configs.get('domain_rate'))
+    burst = Configs.get_source(source, 'burst', Configs.get('domain_burst'))
+    request_scheduler().configure(url, rate, burst)
+    retry_policy().configure(url, Configs.get_source(source, 'retry_attempts', Configs.get('retry_attempts')))
+    concurrency_controller().configure(url, Configs.get_source(source, 'domain_concurrency',
+                                                               Configs.get('domain_concurrency')))
+
+
+def concurrency_controller():
+    return ConcurrencyController.instance(Configs.get('initial_concurrency'),
+                                          enabled=Configs.get('adaptive_concurrency'),
+                                          maximum=Configs.get('domain_concurrency'))
+
+
+def is_good_status(status):
+    # statuses which do not signal that site is overloaded or blocks us
+    return status < 400 or status == 404
+
 
+def cached_request(url, send):
+    # send(headers) makes the request with given extra headers and returns (status, headers, body)
+    cache = response_cache()
+    if cache is None:
+        return send({})
 
-def rand_user_agnet():
-    u = ua.random
-    pu = parse(u)
+    return cache.cached_get(url, send)
 
-    i = 0
-    while not pu.is_pc or pu.is_bot:
-        i += 1
-        u = ua.random
-        pu = parse(u)
-        if i > 1000:
-            raise Exception('Too much bad user agents')
 
-    return u
+__archive = None
+__replay_archive = None
+__archive_lock = threading.Lock()
 
 
-def load_image(url, path, rec=True, anti_bot=False):
+def page_archive():
+    # archive of the current run, None if 'archive_pages' is disabled in configs.ini
+    global __archive
+    if not Configs.get('archive_pages') or __replay_archive is not None:
+        return None
+
+    with __archive_lock:
+        if __archive is None:
+            __archive = PageArchive(os.getcwd() + os.sep + 'data' + os.sep + 'archive' + os.sep +
+                                    time.strftime("%Y_%b_%d-%H%M%S"))
+    return __archive
+
+
+def set_replay_archive(path):
+    # after this call all page loaders read pages from the archive in path instead of network
+    global __replay_archive
+    __replay_archive = PageArchive(path) if path else None
+    return __replay_archive
+
+
+def request_page(url, send):
+    if __replay_archive is not None:
+        page = __replay_archive.load(url)
+        if page is None:
+            raise Exception('Page is not archived: {}'.format(url))
+        return 200, {'Content-Type': page[0]}, page[1]
+
+    status, headers, body = cached_request(url, send)
+
+    archive = page_archive()
+    if archive is not None and status == 200:
+        archive.record(url, headers.get('Content-Type'), body)
+
+    return status, headers, body
+
+
+def http_get(url, headers, timeout=15, proxy=None):
+    def send(conditional_headers):
+        request_scheduler().wait(url, proxy)
+        started = time.time()
+        try:
+            status, headers_, body = http_client().request(url, headers=dict(headers, **conditional_headers),
+                                                           timeout=timeout, proxy=proxy)
+        except urllib3.exceptions.HTTPError:
+            concurrency_controller().record(url, ok=False)
+            report_proxy(proxy, ok=False)
+            raise
+
+        latency = time.time() - started
+        concurrency_controller().record(url, latency, is_good_status(status))
+        report_proxy(proxy, is_good_status(status), latency, status)
+        return status, headers_, body
+
+    return request_page(url, send)
+
+
+def csf_get(url):
+    def send(conditional_headers):
+        request_scheduler().wait(url)
+        started = time.time()
+        try:
+            response = csf_sessions().get(url, headers=conditional_headers)
+        except Exception:
+            concurrency_controller().record(url, ok=False)
+            raise
+
+        concurrency_controller().record(url, time.time() - started, is_good_status(response.status_code))
+        return response.status_code, response.headers, response.content
+
+    return request_page(url, send)
+
+
+def fetch_page(url, timeout=15, proxy=None):
+    # single request without retries, returns (headers, body)
+    user_agent = {'user-agent': rand_user_agnet(proxy)}
+    try:
+        # adaptive limit of the domain is taken for the request only, not for the backoff between retries
+        with concurrency_controller().slot(url):
+            status, headers, data = http_get(url, user_agent, timeout=timeout, proxy=proxy)
+    except urllib3.exceptions.HTTPError:
+        raise RequestError('Timeout error while requesting: {}'.format(url))
+    except BodyTooLargeError as e:
+        raise RequestError(str(e), retryable=False)
+
+    if status != 200:
+        raise RequestError('Bad request status {} from: {}'.format(status, url), status, status not in (404, 410))
+
+    return headers, data
+
+
+def fetch_page_via_csf(url):
+    # as fetch_page, but through Cloudflare session
+    try:
+        with concurrency_controller().slot(url):
+            status, headers, data = csf_get(url)
+    except requests.exceptions.RequestException:
+        raise RequestError('Timeout error while requesting: {}'.format(url))
+
+    if status != 200:
+        raise RequestError('Bad request status {} from: {}'.format(status, url), status, status not in (404, 410))
+
+    return headers, data
+
+
+def load_image(url, path, anti_bot=False):
     type_ = url.split('/')[-1].split('.')[-1]
     name = str(uuid.uuid4())
     filename = '{}.{}'.format(name, type_)
@@ -245,100 +615,108 @@ def load_image(url, path, rec=True, anti_bot=False):
     if not os.path.exists(path):
         os.makedirs(path)
 
-    if anti_bot:
-        html = cfscrape.create_scraper().get(url)
-        with open(full_path, 'wb') as f:
-            f.write(html.content)
-    else:
-        user_agent = {'user-agent': rand_user_agnet()}
-        req = urllib3.PoolManager(1, headers=user_agent)
-        try:
-            html = req.urlopen('GET', url, timeout=15)
-            if html.status != 200:
-                if rec:
-                    return load_image(url, path, rec=False)
-                raise Exception('Bad request status from: {}'.format(url))
-        except urllib3.exceptions.MaxRetryError:
-            raise Exception('Timeout error while requesting: {}'.format(url))
+    fetch = (lambda attempt: fetch_page_via_csf(url)[1]) if anti_bot else \
+        (lambda attempt: fetch_page(url, timeout=15)[1])
+    content = retry_policy().call(url, fetch)
 
-        with open(full_path, 'wb') as f:
-            f.write(html.data)
+    with open(full_path, 'wb') as f:
+        f.write(content)
 
     return filename
 
 
-def load_page_as_text(url, rec=True):
-    user_agent = {'user-agent': rand_user_agnet()}
-    req = urllib3.PoolManager(10, headers=user_agent)
+CHARSET_RE = re.compile(r'charset=["\']?([\w.:-]+)', re.I)
+META_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?([\w.:-]+)', re.I)
 
-    try:
-        html = req.urlopen('GET', url, timeout=15)
-        if html.status != 200:
-            if rec:
-                return load_page_as_text(url, rec=False)
-            raise Exception('Bad request status from: {}'.format(url))
-    except urllib3.exceptions.MaxRetryError:
-        raise Exception('Timeout error while requesting: {}'.format(url))
-
-    content_type = html.headers.get('Content-Type')
-    if not content_type:
-        print('Could not find encoding from {}, using default \'utf-8\' instead '.format(url))
-        encoding = 'utf-8'
-    else:
-        encoding = content_type.split('charset=')[-1]
+
+def page_encoding(data, content_type):
+    # charset from Content-Type header, then from <meta> tags in the beginning of the page, 'utf-8' by default
+    match = CHARSET_RE.search(content_type or '')
+    if match is None:
+        match = META_CHARSET_RE.search(data[:4096])
+    encoding = match.group(1) if match else 'utf-8'
+    if isinstance(encoding, bytes):
+        encoding = encoding.decode('ascii')
 
     try:
-        html_content = html.data.decode(encoding)
+        return codecs.lookup(encoding).name
     except LookupError:
-        html_content = html.data.decode('utf-8')
+        return 'utf-8'
+
+
+def decode_page(data, content_type):
+    # pages are decoded once, broken characters are replaced instead of failing the whole page
+    return data.decode(page_encoding(data, content_type), errors='replace')
+
+
+def raw_page(data, content_type):
+    return RawPage(data, page_encoding(data, content_type))
+
+
+def load_text(url, timeout=15, proxy=None, next_proxy=None, validate=None):
+    # retries go through next_proxy() if it is given, validate(text) may raise RequestError to retry the page
+    def attempt(n):
+        proxy_ = proxy if n == 0 or next_proxy is None else next_proxy()
+        headers, data = fetch_page(url, timeout, proxy_)
+        text = decode_page(data, headers.get('Content-Type'))
+        if validate is not None:
+            try:
+                validate(text)
+            except RequestError:
+                # rejected page usually means that the site detected the proxy
+                report_proxy(proxy_, ok=False)
+                raise
+        return text
 
-    return html_content
+    return retry_policy().call(url, attempt)
+
+
+def load_raw(url, timeout=15, proxy=None, next_proxy=None):
+    # as load_text, but the page is not decoded, see RawPage
+    def attempt(n):
+        proxy_ = proxy if n == 0 or next_proxy is None else next_proxy()
+        headers, data = fetch_page(url, timeout, proxy_)
+        return raw_page(data, headers.get('Content-Type'))
+
+    return retry_policy().call(url, attempt)
+
+
+def load_page_as_text(url, validate=None):
+    return load_text(url, timeout=15, validate=validate)
+
+
+def load_page_raw(url):
+    return load_raw(url, timeout=15)
 
 
 def load_page(url, parser):
-    html_content = load_page_as_text(url)
-    return bs4.BeautifulSoup(html_content, parser)
+    return make_soup(load_page_raw(url), parser)
 
 
-def load_page_via_proxies_as_text(url, proxy, rec=True):
-    proxy_prop = proxy.split(':')
+def load_page_via_proxies_as_text(url, proxy, next_proxy=None, validate=None):
+    return load_text(url, timeout=10, proxy=proxy, next_proxy=next_proxy, validate=validate)
 
-    header = make_headers(user_agent=rand_user_agnet(), proxy_basic_auth=proxy_prop[2] + ':' + proxy_prop[3])
-    req = urllib3.ProxyManager('https://' + proxy_prop[0] + ':' + proxy_prop[1], headers=header)
 
-    try:
-        html = req.urlopen('GET', url, timeout=10)
-        if html.status != 200:
-            if rec:
-                # print('Bad status {}, retrying'.format(url))
-                return load_page_as_text(url, rec=False)
-            raise Exception('Bad request status from: {}'.format(url))
-    except urllib3.exceptions.MaxRetryError:
-        raise Exception('Timeout error while requesting: {}'.format(url))
-
-    content_type = html.headers.get('Content-Type')
-    if not content_type:
-        print('Could not find encoding from {}, using default \'utf-8\' instead '.format(url))
-        encoding = 'utf-8'
-    else:
-        encoding = content_type.split('charset=')[-1]
+def load_page_via_proxies_raw(url, proxy, next_proxy=None):
+    return load_raw(url, timeout=10, proxy=proxy, next_proxy=next_proxy)
+
+
+def load_page_via_proxies(url, parser, proxy, next_proxy=None):
+    return make_soup(load_page_via_proxies_raw(url, proxy, next_proxy), parser)
 
-    try:
-        html_content = html.data.decode(encoding)
-    except LookupError:
-        html_content = html.data.decode('utf-8')
 
-    return html_content
+def load_page_via_csf_as_text(url):
+    headers, content = retry_policy().call(url, lambda attempt: fetch_page_via_csf(url))
+    return decode_page(content, headers.get('Content-Type'))
 
 
-def load_page_via_proxies(url, parser, proxy):
-    html = load_page_via_proxies_as_text(url, proxy)
-    return bs4.BeautifulSoup(html, parser)
+def load_page_via_csf_raw(url):
+    headers, content = retry_policy().call(url, lambda attempt: fetch_page_via_csf(url))
+    return raw_page(content, headers.get('Content-Type'))
 
 
 def load_page_via_csf(url, parser):
-    content = cfscrape.create_scraper().get(url).content
-    return bs4.BeautifulSoup(content, parser)
+    return make_soup(load_page_via_csf_raw(url), parser)
 
 
 def move_to_element(driver, element):